@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк масштабирования fix_mermaid_complete
+
+Генерирует документы растущего размера с большим количеством различных
+заголовков graph TD и проверяет, что время обработки растет линейно с размером
+документа. Завершается с кодом 1, если показатель роста заметно больше 1.
+
+Запуск: python benchmarks/bench_complete_scaling.py
+"""
+
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fix_mermaid_complete import fix_mermaid_complete
+
+SECTION = '''## Раздел {n}
+
+Обычный текст раздела с описанием показателей образования в регионе {n}.
+
+graph TD %% диаграмма {n}
+    %% Начало процесса
+    USER_QUERY[Запрос пользователя]
+    USER_QUERY --> EMBEDDING
+
+Еще немного текста после диаграммы.
+'''
+
+# Максимально допустимый показатель степени в зависимости time ~ size^k
+MAX_EXPONENT = 1.3
+
+
+def make_document(sections):
+    return '\n'.join(SECTION.format(n=n) for n in range(sections))
+
+
+def measure(content, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fix_mermaid_complete(content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    sizes = [250, 500, 1000, 2000, 4000]
+    results = []
+    
+    print(f"{'секций':>8} {'строк':>8} {'КБ':>8} {'время, с':>10} {'мкс/строка':>12}")
+    for sections in sizes:
+        content = make_document(sections)
+        lines = content.count('\n') + 1
+        elapsed = measure(content)
+        results.append((len(content), elapsed))
+        print(f"{sections:>8} {lines:>8} {len(content) // 1024:>8} {elapsed:>10.4f} {elapsed / lines * 1e6:>12.2f}")
+    
+    (size_small, time_small), (size_large, time_large) = results[0], results[-1]
+    exponent = math.log(time_large / time_small) / math.log(size_large / size_small)
+    print(f"\nПоказатель роста: {exponent:.2f} (линейный рост = 1.00)")
+    
+    if exponent > MAX_EXPONENT:
+        print(f"Ошибка: рост сверхлинейный (больше {MAX_EXPONENT})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк масштабирования на враждебных документах с незакрытыми блоками кода
+
+Генерирует документы растущего размера, в которых много открывающих ```
+и нет ни одних закрывающих (или они все в конце документа), и проверяет,
+что время каждого этапа растет линейно с размером документа: поиск блоков
+регулярным выражением с (.*?) до закрывающих ``` просматривал бы остаток
+текста от каждой открывающей строки. Завершается с кодом 1, если
+показатель роста какого-либо этапа заметно больше 1.
+
+Запуск: python benchmarks/bench_fence_scaling.py [--sizes 64 128 256 512]
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mermaid_fixer import advanced, basic, complete
+from mermaid_fixer.library import get_library
+
+# Повторяющиеся части враждебных документов
+DOCUMENTS = {
+    # ```mermaid в конце строки текста: каждая такая строка открывает блок
+    'незакрытые ```mermaid': 'Описание схемы```mermaid\n    A --> B\n',
+    # ``` в конце строки перед заголовком диаграммы
+    'незакрытые ``` с диаграммой': 'Пример```\ngraph TD\n    A --> B\n',
+    # Один незакрытый блок ```mermaid в начале, дальше только текст и ```python
+    'незакрытый блок до конца': 'Текст раздела\n\n```python\nprint(1)\n',
+    # Заголовки диаграмм подряд после ```mermaid без закрывающих ```
+    'заголовки без блоков': '```mermaid x\ngraph TD\nA --> B\n\n',
+}
+
+# Максимально допустимый показатель степени в зависимости time ~ size^k
+MAX_EXPONENT = 1.3
+
+
+def make_document(name, size):
+    """Документ вида name размером около size байт"""
+    part = DOCUMENTS[name]
+    document = part * max(1, size // len(part.encode('utf-8')))
+    if name == 'незакрытый блок до конца':
+        document = '```mermaid\ngraph TD\n' + document
+    return document
+
+
+def stages():
+    library = get_library()
+    return (
+        ('basic.fix_content', basic.fix_content),
+        ('basic.fix_existing_code_blocks', basic.fix_existing_code_blocks),
+        ('advanced.fix_content', advanced.fix_content),
+        ('advanced.fix_mermaid_diagrams', advanced.fix_mermaid_diagrams),
+        ('advanced.escape_mermaid_content', advanced.escape_mermaid_content),
+        ('complete.fix_content', lambda content: complete.fix_content(content, library)),
+    )
+
+
+def measure(function, content, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк масштабирования на незакрытых блоках кода')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 128, 256, 512],
+                        help='размеры документов, КБ (по умолчанию: 64 128 256 512)')
+    args = parser.parse_args()
+
+    header = ''.join(f"{f'{size} КБ, мс':>12}" for size in args.sizes)
+    print(f"{'документ / этап':<62}{header}{'рост':>8}")
+    failures = []
+    functions = stages()
+    for name in DOCUMENTS:
+        documents = [make_document(name, size * 1024) for size in args.sizes]
+        for stage, function in functions:
+            timings = [measure(function, document) for document in documents]
+            exponent = math.log(max(timings[-1], 1e-6) / max(timings[0], 1e-6)) / math.log(
+                len(documents[-1]) / len(documents[0]))
+            row = ''.join(f"{timing * 1000:>12.2f}" for timing in timings)
+            print(f"{name + ': ' + stage:<62}{row}{exponent:>8.2f}")
+            if exponent > MAX_EXPONENT:
+                failures.append(f"{name}: {stage}: показатель роста {exponent:.2f}")
+
+    if failures:
+        print(f"\nОшибка: рост сверхлинейный (больше {MAX_EXPONENT}):")
+        for failure in failures:
+            print(f"- {failure}")
+        sys.exit(1)
+    print("\nВремя всех этапов растет линейно")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк режима --staged на большом дереве документов
+
+Создает во временном каталоге репозиторий git с множеством Markdown
+файлов с диаграммами, индексирует правку нескольких из них и сравнивает
+проверку только измененного (gitdiff.changed_files, одно чтение
+содержимого через git cat-file --batch, исправление областей с
+измененными строками) с проверкой всех файлов дерева. Завершается с
+кодом 1, если проверка изменений не быстрее полной в MIN_SPEEDUP раз.
+
+Запуск: python benchmarks/bench_git_changes.py [--files 2000] [--changed 3]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mermaid_fixer import basic, batch, gitdiff
+
+# Во сколько раз проверка изменений должна быть быстрее полной
+MIN_SPEEDUP = 10.0
+
+
+def make_document(n):
+    """Документ с диаграммой в блоке и диаграммой без блока"""
+    return (f'# Раздел {n}\n\n' + 'Текст раздела.\n\n' * 20 +
+            f'```mermaid\ngraph TD\n    A{n}[Начало] --> B{n}[Конец]\n```\n\n' + 'Еще текст.\n\n' * 20 +
+            f'flowchart LR\n    C{n} --> D{n}\n\nКонец документа.\n')
+
+
+def git(directory, *args):
+    subprocess.run(('git',) + args, cwd=directory, check=True, stdout=subprocess.DEVNULL)
+
+
+def check_changed():
+    found = 0
+    files = gitdiff.changed_files(staged=True, extensions=batch.EXTENSIONS)
+    with gitdiff.CatFile() as blobs:
+        for changed in files:
+            data = blobs.read(changed.spec)
+            found += sum(1 for _ in basic.file_changes(changed.path, lines=changed.lines, data=data))
+    return len(files), found
+
+
+def check_all(directory):
+    found = 0
+    files = batch.collect_markdown_files([directory])
+    for path in files:
+        found += sum(1 for _ in basic.file_changes(path))
+    return len(files), found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк режима --staged')
+    parser.add_argument('--files', type=int, default=2000, help='число файлов (по умолчанию: 2000)')
+    parser.add_argument('--changed', type=int, default=3, help='число измененных файлов (по умолчанию: 3)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for n in range(args.files):
+            with open(os.path.join(directory, f'doc{n:05d}.md'), 'w', encoding='utf-8') as f:
+                f.write(make_document(n))
+        git(directory, 'init', '-q')
+        git(directory, 'add', '-A')
+        git(directory, '-c', 'user.name=bench', '-c', 'user.email=bench@localhost', 'commit', '-q', '-m', 'init')
+        for n in range(args.changed):
+            path = os.path.join(directory, f'doc{n * (args.files // args.changed):05d}.md')
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text.replace('--> B', '--> X[Новый узел] --> B'))
+        git(directory, 'add', '-A')
+
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            start = time.perf_counter()
+            changed_files, changed_found = check_changed()
+            changed_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            all_files, all_found = check_all('.')
+            all_time = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+
+    print(f"Только изменения: {changed_files} файлов, изменений {changed_found}, {changed_time * 1000:.1f} мс")
+    print(f"Все файлы:        {all_files} файлов, изменений {all_found}, {all_time * 1000:.1f} мс")
+    speedup = all_time / changed_time
+    print(f"Ускорение: x{speedup:.1f}")
+    if changed_found != 0 or speedup < MIN_SPEEDUP:
+        print(f"\nОшибка: ожидались 0 изменений в блоках с правками и ускорение не меньше x{MIN_SPEEDUP}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк поиска в библиотеке эталонных диаграмм
+
+Регистрирует растущее число синтетических диаграмм и измеряет среднее
+время сопоставления разорванного фрагмента (половины узлов одной из
+диаграмм). Время поиска не должно заметно расти с размером библиотеки;
+также проверяется, что фрагмент сопоставляется со своей диаграммой.
+
+Запуск: python benchmarks/bench_library_lookup.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mermaid_fixer.library import DiagramLibrary, diagram_features
+
+# Во сколько раз может вырасти время поиска при росте библиотеки в 100 раз
+MAX_SLOWDOWN = 5.0
+
+
+def make_diagram(rng, n):
+    nodes = [f'N{n}_{k}' for k in range(rng.randint(8, 20))]
+    # Часть узлов общая для многих диаграмм, как A, B, LLM в реальных документах
+    nodes += rng.sample(['A', 'B', 'C', 'LLM', 'DATA', 'ETL'], 3)
+    lines = ['graph TD']
+    for k, node in enumerate(nodes):
+        lines.append(f'    {node}[Узел {k}]')
+    for source, target in zip(nodes, nodes[1:]):
+        lines.append(f'    {source} --> {target}')
+    return '\n'.join(lines)
+
+
+def main():
+    rng = random.Random(1)
+    sizes = [100, 1000, 10000]
+    queries = 200
+    timings = []
+    
+    print(f"{'диаграмм':>10} {'поиск, мкс':>12} {'точность':>10}")
+    for size in sizes:
+        library = DiagramLibrary()
+        texts = []
+        for n in range(size):
+            text = make_diagram(rng, n)
+            library.add(f'd{n}', text)
+            texts.append(text)
+        
+        correct = 0
+        elapsed = 0.0
+        for _ in range(queries):
+            target = rng.randrange(size)
+            lines = texts[target].split('\n')
+            fragment = [lines[0]] + rng.sample(lines[1:], len(lines) // 2)
+            features = diagram_features(fragment)
+            start = time.perf_counter()
+            found = library.match(features)
+            elapsed += time.perf_counter() - start
+            correct += found == f'd{target}'
+        
+        per_query = elapsed / queries
+        timings.append(per_query)
+        print(f"{size:>10} {per_query * 1e6:>12.1f} {correct / queries:>10.1%}")
+    
+    slowdown = timings[-1] / timings[0]
+    print(f"\nРост времени поиска: x{slowdown:.2f} при росте библиотеки x{sizes[-1] // sizes[0]}")
+    if slowdown > MAX_SLOWDOWN:
+        print(f"Ошибка: поиск замедлился больше чем в {MAX_SLOWDOWN} раз")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк проверки диаграмм правилами (mermaid_fixer.lint)
+
+Проверяет документы с растущим числом flowchart диаграмм всеми правилами
+и одним правилом. Время должно расти линейно с числом диаграмм, а набор
+правил - добавлять к обходу немного: правила работают в одном обходе, а
+не каждое своим. Завершается с кодом 1, если показатель роста заметно
+больше 1 или все правила медленнее одного больше чем в MAX_RULES_RATIO раз.
+
+Запуск: python benchmarks/bench_lint_scaling.py [--counts 2500 5000 10000 20000]
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mermaid_fixer.lint import RULES, InvalidStatement, Linter
+
+# Максимально допустимый показатель степени в зависимости time ~ count^k
+MAX_EXPONENT = 1.3
+
+# Во сколько раз все правила могут быть медленнее одного
+MAX_RULES_RATIO = 3.0
+
+
+def make_document(count):
+    """Markdown с count диаграммами по образцу graph_tb_architecture"""
+    diagram = '\n'.join((
+        '```mermaid',
+        'graph TB',
+        '    subgraph "Интерфейсы"',
+        '        BOT[Telegram Bot<br/>Запросы]',
+        '        WEB[Web Dashboard]',
+        '    end',
+        '    BOT --> LLM[LLM интеграция]',
+        '    WEB --> VIZ[Визуализация] --> DB[(Neo4j)]',
+        '    LLM -->|Cypher| DB',
+        '    classDef interface fill:#e3f2fd,stroke:#2196f3',
+        '    class BOT,WEB interface',
+        '    class DB storage',
+        '```',
+        '',
+        'Текст между диаграммами.',
+        '',
+    ))
+    return '\n'.join([diagram] * count)
+
+
+def measure(linter, text, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        linter.lint_text(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк проверки диаграмм правилами')
+    parser.add_argument('--counts', type=int, nargs='+', default=[2500, 5000, 10000, 20000],
+                        help='числа диаграмм в документе (по умолчанию: 2500 5000 10000 20000)')
+    args = parser.parse_args()
+
+    documents = [make_document(count) for count in args.counts]
+    header = ''.join(f"{f'{count}, мс':>12}" for count in args.counts)
+    print(f"{'правила':<24}{header}{'рост':>8}")
+    failures = []
+    results = {}
+    for name, rules in (('все правила', RULES), ('одно правило', (InvalidStatement,))):
+        linter = Linter(rules)
+        timings = [measure(linter, document) for document in documents]
+        exponent = math.log(max(timings[-1], 1e-6) / max(timings[0], 1e-6)) / math.log(
+            args.counts[-1] / args.counts[0])
+        results[name] = timings[-1]
+        row = ''.join(f"{timing * 1000:>12.2f}" for timing in timings)
+        print(f"{name:<24}{row}{exponent:>8.2f}")
+        if exponent > MAX_EXPONENT:
+            failures.append(f"{name}: показатель роста {exponent:.2f}")
+
+    ratio = results['все правила'] / results['одно правило']
+    print(f"\nВсе правила ({len(RULES)}) / одно правило: {ratio:.2f}")
+    if ratio > MAX_RULES_RATIO:
+        failures.append(f"все правила медленнее одного в {ratio:.2f} раза")
+
+    if failures:
+        print("\nОшибка:")
+        for failure in failures:
+            print(f"- {failure}")
+        sys.exit(1)
+    print(f"Диаграмм в секунду: {args.counts[-1] / results['все правила']:.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк задержки сервера LSP на нажатие клавиши
+
+Для синтетических документов разного размера открывает документ
+(mermaid_fixer.lsp.Document) и измеряет время обработки правок, которые
+присылает редактор при наборе: символ в абзаце, символ в лейбле диаграммы,
+новая строка и ``` (открытие и сразу закрытие блока кода), - вместе с
+подготовкой диагностик к публикации. Число диаграмм во всех документах
+одинаково (публикация стоит пропорционально числу диагностик), растет
+только объем текста между ними. Задержка не должна расти с размером
+документа: завершается с кодом 1, если медиана на самом большом документе
+больше медианы на самом маленьком с учетом допуска.
+
+Запуск: python benchmarks/bench_lsp_latency.py [--sizes 0.1 1 10]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import make_document
+from mermaid_fixer.lsp import Document
+
+
+def _insert(line, character, text):
+    position = {'line': line, 'character': character}
+    return {'range': {'start': position, 'end': position}, 'text': text}
+
+
+def _delete(line, character, length):
+    return {'range': {'start': {'line': line, 'character': character},
+                      'end': {'line': line, 'character': character + length}}, 'text': ''}
+
+
+def keystrokes(document):
+    """
+    Правки посередине документа: (название, [правка, обратная правка])
+
+    Каждая пара возвращает документ в исходное состояние, поэтому правки
+    можно повторять сколько угодно раз.
+    """
+    lines = document.lines
+    middle = len(lines) // 2
+    paragraph = next(i for i in range(middle, len(lines)) if lines[i].startswith('Пок'))
+    label = next(i for i in range(middle, len(lines)) if '-->' in lines[i] and '[' in lines[i])
+    column = lines[label].index('[') + 1
+    return (
+        ('символ в абзаце', [_insert(paragraph, 5, 'ы'), _delete(paragraph, 5, 1)]),
+        ('символ в лейбле', [_insert(label, column, '<'), _delete(label, column, 1)]),
+        ('новая строка', [_insert(paragraph, 0, '\n'),
+                          {'range': {'start': {'line': paragraph, 'character': 0},
+                                     'end': {'line': paragraph + 1, 'character': 0}}, 'text': ''}]),
+        ('открытие блока ```', [_insert(paragraph, 0, '```\n'),
+                                {'range': {'start': {'line': paragraph, 'character': 0},
+                                           'end': {'line': paragraph + 1, 'character': 0}}, 'text': ''}]),
+    )
+
+
+def measure(document, changes, repeat):
+    """Медиана времени одной правки вместе с диагностиками, мс"""
+    timings = []
+    for _ in range(repeat):
+        for change in changes:
+            start = time.perf_counter()
+            document.apply_change(change)
+            document.diagnostics()
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк задержки сервера LSP на нажатие клавиши')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[0.1, 1, 10],
+                        help='размеры документов, МБ (по умолчанию: 0.1 1 10)')
+    parser.add_argument('--diagrams', type=int, default=20, help='количество диаграмм (по умолчанию: 20)')
+    parser.add_argument('--repeat', type=int, default=200, help='число повторов правки (по умолчанию: 200)')
+    parser.add_argument('--tolerance', type=float, default=2.0,
+                        help='допустимый рост задержки на самом большом документе (по умолчанию: 2.0)')
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        text = make_document(int(size * 1024 * 1024), args.diagrams, 0.3, 0)
+        start = time.perf_counter()
+        document = Document(text)
+        opened = time.perf_counter() - start
+        print(f"Документ {size:g} МБ: {len(document.lines)} строк, открытие {opened * 1000:.1f} мс")
+        for name, changes in keystrokes(document):
+            results.setdefault(name, []).append(measure(document, changes, args.repeat))
+        if document.text != text:
+            print("Ошибка: правки изменили документ")
+            sys.exit(1)
+
+    header = ''.join(f"{f'{size:g} МБ, мс':>14}" for size in args.sizes)
+    print(f"\n{'правка':<22}{header}")
+    regressions = []
+    for name, timings in results.items():
+        print(f"{name:<22}" + ''.join(f"{timing:>14.3f}" for timing in timings))
+        if timings[-1] > timings[0] * (1 + args.tolerance):
+            regressions.append(f"{name}: {timings[0]:.3f} мс -> {timings[-1]:.3f} мс")
+
+    if regressions:
+        print("\nОшибка: задержка растет с размером документа:")
+        for regression in regressions:
+            print(f"- {regression}")
+        sys.exit(1)
+    print("\nЗадержка не зависит от размера документа")
+
+
+if __name__ == "__main__":
+    main()
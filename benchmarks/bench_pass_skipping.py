@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк планировщика проходов (mermaid_fixer.passes)
+
+Исправляет документы без диаграмм, с исправными диаграммами и с
+испорченными каждой стратегией дважды: как обычно (проходы без признаков
+в тексте пропускаются) и всеми проходами подряд. Результаты должны
+совпадать, на документах без диаграмм и с исправными диаграммами
+стратегии basic и advanced должны пропускать не меньше проходов, чем
+указано в MIN_SKIPPED, а advanced - быть быстрее хотя бы в MIN_SPEEDUP
+раз. Оба варианта запускаются поочередно по REPEAT раз, и сравнивается
+лучшее время каждого, чтобы шум машины не влиял на ускорение. Завершается
+с кодом 1, если это не так.
+
+Запуск: python benchmarks/bench_pass_skipping.py [--size 2]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import make_document
+from mermaid_fixer import advanced, basic, complete
+from mermaid_fixer.metrics import Metrics
+
+# Во сколько раз advanced с пропуском проходов должна быть быстрее на
+# документах, которым не нужно исправление структуры и сборка
+MIN_SPEEDUP = 1.5
+
+# Сколько проходов должно пропускаться на таких документах
+MIN_SKIPPED = {'basic': 1, 'advanced': 2}
+
+# Сколько раз запускается каждый вариант
+REPEAT = 10
+
+STRATEGIES = (('basic', basic), ('advanced', advanced), ('complete', complete))
+
+
+def run_all(module, content):
+    """Все проходы стратегии подряд, без предварительного просмотра"""
+    result = content
+    lines = False
+    for pass_ in module.PASSES:
+        if pass_.lines != lines:
+            result = result.split('\n') if pass_.lines else '\n'.join(result)
+            lines = pass_.lines
+        result = pass_.function(result)
+    return '\n'.join(result) if lines else result
+
+
+def measure(functions, content, repeat=REPEAT):
+    """Лучшее время каждой из функций; функции запускаются поочередно"""
+    best = [float('inf')] * len(functions)
+    for _ in range(repeat):
+        for number, function in enumerate(functions):
+            start = time.perf_counter()
+            function(content)
+            best[number] = min(best[number], time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк планировщика проходов')
+    parser.add_argument('--size', type=float, default=2.0, help='размер документов, МБ (по умолчанию: 2)')
+    args = parser.parse_args()
+
+    size = int(args.size * 1024 * 1024)
+    documents = (
+        ('без диаграмм', make_document(size, diagrams=0)),
+        ('исправный', make_document(size, diagrams=40, broken=0.0)),
+        ('испорченный', make_document(size, diagrams=40, broken=0.3)),
+    )
+
+    print(f"{'документ':<14}{'стратегия':<11}{'с пропуском, мс':>17}{'все проходы, мс':>17}"
+          f"{'ускорение':>11}{'пропущено':>11}")
+    failures = []
+    for name, content in documents:
+        for strategy, module in STRATEGIES:
+            metrics = Metrics()
+            if module.fix_content(content, metrics=metrics) != run_all(module, content):
+                failures.append(f"{name}, {strategy}: результат отличается от всех проходов подряд")
+            scheduled, full = measure((module.fix_content, lambda text, module=module: run_all(module, text)),
+                                      content)
+            speedup = full / scheduled
+            skipped = metrics.counters.get('passes_skipped', 0)
+            print(f"{name:<14}{strategy:<11}{scheduled * 1000:>17.2f}{full * 1000:>17.2f}"
+                  f"{speedup:>10.1f}x{skipped:>6} из {len(module.PASSES)}")
+            if name == 'испорченный':
+                continue
+            if skipped < MIN_SKIPPED.get(strategy, 0):
+                failures.append(f"{name}, {strategy}: пропущено проходов {skipped}, меньше {MIN_SKIPPED[strategy]}")
+            if strategy == 'advanced' and speedup < MIN_SPEEDUP:
+                failures.append(f"{name}, {strategy}: ускорение x{speedup:.1f} меньше x{MIN_SPEEDUP}")
+
+    if failures:
+        print("\nОшибка:")
+        for failure in failures:
+            print(f"- {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк сборки разрозненных частей диаграмм (mermaid_fixer.reassemble)
+
+Собирает документы с растущим числом диаграмм, у каждой из которых часть
+строк оказалась вне блока (через абзац после него), и одной связью без
+общих узлов, для которой создается новый блок. Время должно расти линейно с числом диаграмм: строки
+просматриваются один раз, а ближайшая диаграмма ищется двоичным поиском.
+Завершается с кодом 1, если показатель роста заметно больше 1 или части
+собраны не так, как ожидается.
+
+Запуск: python benchmarks/bench_reassemble_scaling.py [--counts 1000 2000 4000 8000]
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mermaid_fixer.metrics import Metrics
+from mermaid_fixer.reassemble import reassemble
+
+# Максимально допустимый показатель степени в зависимости time ~ count^k
+MAX_EXPONENT = 1.3
+
+# Разрозненных строк на одну диаграмму в make_document
+FRAGMENTS_PER_DIAGRAM = 3
+
+
+def _suffix(n):
+    """Суффикс идентификаторов n-й диаграммы из заглавных букв"""
+    letters = ''
+    while True:
+        n, digit = divmod(n, 26)
+        letters += chr(ord('A') + digit)
+        if not n:
+            return letters
+
+
+def make_document(count):
+    """Строки документа с count диаграммами и их частями вне блоков"""
+    lines = []
+    for number in range(count):
+        n = _suffix(number)
+        lines.extend((
+            '```mermaid',
+            'graph TD',
+            f'    A_{n}[Начало] --> B_{n}[Проверка]',
+            '```',
+            '',
+            'Текст после диаграммы.',
+            '',
+            f'B_{n} --> C_{n}[Конец]',
+            f'C_{n} --> A_{n}',
+            '',
+            'Еще текст.',
+            '',
+            f'Z_{n}[Отдельный узел] --> Y_{n}',
+            '',
+        ))
+    return lines
+
+
+def measure(lines, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        reassemble(lines)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк сборки разрозненных частей диаграмм')
+    parser.add_argument('--counts', type=int, nargs='+', default=[1000, 2000, 4000, 8000],
+                        help='числа диаграмм в документе (по умолчанию: 1000 2000 4000 8000)')
+    args = parser.parse_args()
+
+    documents = [make_document(count) for count in args.counts]
+    timings = [measure(document) for document in documents]
+    exponent = math.log(max(timings[-1], 1e-6) / max(timings[0], 1e-6)) / math.log(
+        args.counts[-1] / args.counts[0])
+
+    print(f"{'диаграмм':>10}{'строк':>10}{'мс':>10}")
+    for count, document, timing in zip(args.counts, documents, timings):
+        print(f"{count:>10}{len(document):>10}{timing * 1000:>10.2f}")
+    print(f"\nПоказатель роста: {exponent:.2f}")
+
+    metrics = Metrics()
+    reassemble(documents[0], metrics)
+    reassembled = metrics.counters.get('fragments_reassembled', 0)
+    synthesized = metrics.counters.get('blocks_synthesized', 0)
+    print(f"Собрано строк: {reassembled}, новых блоков: {synthesized}")
+
+    expected = args.counts[0] * FRAGMENTS_PER_DIAGRAM, args.counts[0]
+    if exponent > MAX_EXPONENT or (reassembled, synthesized) != expected:
+        print(f"\nОшибка: ожидались показатель роста не больше {MAX_EXPONENT}, "
+              f"{expected[0]} собранных строк и {expected[1]} новых блоков")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк записи исправленных файлов частями исходного файла (mermaid_fixer.spans)
+
+Исправляет через быстрый путь (стратегия basic) большой документ с
+несколькими испорченными диаграммами и документ, где испорчены тысячи
+диаграмм. Результат должен совпадать с исправлением текста целиком, из
+исправленных строк (не из отображения файла) должна записываться лишь
+малая доля байт, а пиковая память (tracemalloc, без отображения файла) -
+оставаться малой долей размера файла. Завершается с кодом 1, если это не
+так.
+
+Запуск: python benchmarks/bench_span_writer.py [--size 16]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import make_document
+from mermaid_fixer import basic
+from mermaid_fixer.metrics import Metrics
+
+# Наибольшая допустимая пиковая память исправления, в долях размера файла
+MAX_PEAK = 0.15
+
+# Наибольшая допустимая доля байт из исправленных строк в документе с
+# несколькими испорченными диаграммами
+MAX_REPLACED = 0.01
+
+
+def fix_file(path, content):
+    """Исправляет файл с содержимым content: (секунды, пиковая память, Metrics)"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+    metrics = Metrics()
+    tracemalloc.start()
+    start = time.perf_counter()
+    basic.fix_file(path, metrics=metrics)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк записи исправленных файлов частями исходного файла')
+    parser.add_argument('--size', type=float, default=16.0, help='размер документов, МБ (по умолчанию: 16)')
+    args = parser.parse_args()
+
+    size = int(args.size * 1024 * 1024)
+    documents = (
+        ('мало правок', make_document(size, diagrams=20, broken=0.5, seed=1)),
+        ('много правок', make_document(size, diagrams=4000, broken=1.0, seed=2)),
+    )
+
+    print(f"{'документ':<14}{'мс':>8}{'память':>9}{'скопировано, байт':>20}{'из правок, байт':>18}")
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'document.md')
+        for name, content in documents:
+            elapsed, peak, metrics = fix_file(path, content)
+            copied = metrics.counters.get('bytes_copied', 0)
+            replaced = metrics.counters.get('bytes_replaced', 0)
+            print(f"{name:<14}{elapsed * 1000:>8.0f}{peak / size:>8.3f}x{copied:>20}{replaced:>18}")
+
+            with open(path, encoding='utf-8', newline='') as f:
+                if f.read() != basic.fix_content(content):
+                    failures.append(f"{name}: файл отличается от исправления текста целиком")
+            if peak > MAX_PEAK * size:
+                failures.append(f"{name}: пиковая память {peak / size:.3f}x больше {MAX_PEAK}x размера файла")
+            if name == 'мало правок' and replaced > MAX_REPLACED * size:
+                failures.append(f"{name}: из правок записано {replaced} байт, больше {MAX_REPLACED:.0%} файла")
+
+    if failures:
+        print("\nОшибка:")
+        for failure in failures:
+            print(f"- {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
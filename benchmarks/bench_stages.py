@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк отдельных этапов исправления на синтетическом документе
+
+Каждый этап получает на вход результат предыдущих этапов своего скрипта,
+как при реальном запуске. Для каждого этапа печатается пропускная
+способность (МБ/с и строк/с) и пиковая память (tracemalloc), а результаты
+сравниваются с сохраненными базовыми значениями (benchmarks/baseline.json).
+Завершается с кодом 1, если этап стал медленнее или требует больше памяти,
+чем базовое значение с учетом допуска.
+
+Скорость сравнивается не в МБ/с, а относительно калибровочной нагрузки
+(простой проход по строкам документа), замеры которой чередуются с
+замерами этапа: так базовые значения не зависят от машины и меньше
+страдают от колебаний ее скорости.
+
+Запуск: python benchmarks/bench_stages.py [--size 2] [--save-baseline]
+"""
+
+import argparse
+import json
+import statistics
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import make_document
+from mermaid_fixer import advanced, basic, complete
+from mermaid_fixer.library import get_library
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Этапы: (имя, функция, имя этапа, результат которого подается на вход).
+# Имена этапов - по скриптам, функции которых измеряются
+STAGES = (
+    ('fix_mermaid.fix_mermaid_diagrams', basic.fix_mermaid_diagrams, None),
+    ('fix_mermaid.fix_existing_code_blocks', basic.fix_existing_code_blocks,
+     'fix_mermaid.fix_mermaid_diagrams'),
+    ('fix_mermaid_advanced.fix_mermaid_diagrams', advanced.fix_mermaid_diagrams, None),
+    ('fix_mermaid_advanced.clean_broken_diagrams', advanced.clean_broken_diagrams,
+     'fix_mermaid_advanced.fix_mermaid_diagrams'),
+    ('fix_mermaid_advanced.escape_mermaid_content', advanced.escape_mermaid_content,
+     'fix_mermaid_advanced.clean_broken_diagrams'),
+    ('fix_mermaid_advanced.fix_content', advanced.fix_content, None),
+    ('fix_mermaid_complete.fix_mermaid_complete', complete.fix_mermaid_complete, None),
+)
+
+
+# Минимальная длительность одного замера, с: быстрые этапы выполняются
+# несколько раз подряд, чтобы шум таймера не давал ложных регрессий
+MIN_ROUND = 0.2
+
+
+def _calls_per_round(function, content):
+    """Число вызовов, за которое один замер длится не меньше MIN_ROUND"""
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function(content)
+        if time.perf_counter() - start >= MIN_ROUND:
+            return calls
+        calls *= 2
+
+
+def _round(function, content, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        function(content)
+    return (time.perf_counter() - start) / calls
+
+
+def measure_time(function, content, repeat):
+    """
+    Возвращает (лучшее время одного вызова, медиана отношения ко времени
+    калибровочной нагрузки)
+
+    Замеры этапа и калибровки чередуются, поэтому изменение скорости
+    машины во время измерения затрагивает обе величины отношения.
+    """
+    calls = _calls_per_round(function, content)
+    reference_calls = _calls_per_round(calibration, content)
+    best = None
+    ratios = []
+    for _ in range(repeat):
+        reference = _round(calibration, content, reference_calls)
+        elapsed = _round(function, content, calls)
+        best = elapsed if best is None else min(best, elapsed)
+        ratios.append(elapsed / reference)
+    return best, statistics.median(ratios)
+
+
+def calibration(content):
+    """Эталонная нагрузка: один проход по строкам документа на Python"""
+    count = 0
+    for line in content.split('\n'):
+        if line.strip().startswith('```'):
+            count += 1
+    return count
+
+
+def measure_memory(function, content):
+    tracemalloc.start()
+    try:
+        function(content)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(document, repeat, selected, memory=True):
+    """
+    Выполняет этапы и возвращает {имя: {'mb_s', 'lines_s', 'relative', 'peak_ratio'}}
+
+    relative - время этапа относительно калибровочной нагрузки на том же
+    входе, peak_ratio - пиковая память этапа относительно размера входа.
+    """
+    # Библиотека эталонов загружается один раз, а не в первом замере
+    get_library()
+
+    outputs = {}
+    results = {}
+    for name, function, source in STAGES:
+        content = document if source is None else outputs[source]
+        outputs[name] = function(content)
+        if selected and not any(part in name for part in selected):
+            continue
+
+        size = len(content.encode('utf-8'))
+        lines = content.count('\n') + 1
+        elapsed, relative = measure_time(function, content, repeat)
+        result = {
+            'mb_s': size / 1024 / 1024 / elapsed,
+            'lines_s': lines / elapsed,
+            'relative': relative,
+        }
+        if memory:
+            result['peak_ratio'] = measure_memory(function, content) / size
+        results[name] = result
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Возвращает список регрессий относительно базовых значений
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['relative'] > base['relative'] * (1 + tolerance):
+            regressions.append(f"{name}: время {result['relative']:.2f} калибровочных, "
+                               f"базовое значение {base['relative']:.2f}")
+        if 'peak_ratio' in result and 'peak_ratio' in base and \
+                result['peak_ratio'] > base['peak_ratio'] * (1 + tolerance):
+            regressions.append(f"{name}: пиковая память {result['peak_ratio']:.2f}x входа, "
+                               f"базовое значение {base['peak_ratio']:.2f}x")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк этапов исправления Mermaid диаграмм')
+    parser.add_argument('--size', type=float, default=2.0, help='размер документа, МБ (по умолчанию: 2)')
+    parser.add_argument('--diagrams', type=int, default=40, help='количество диаграмм (по умолчанию: 40)')
+    parser.add_argument('--broken', type=float, default=0.3, help='доля испорченных диаграмм (по умолчанию: 0.3)')
+    parser.add_argument('--seed', type=int, default=0, help='зерно генератора документа (по умолчанию: 0)')
+    parser.add_argument('--repeat', type=int, default=5, help='число повторов замера времени (по умолчанию: 5)')
+    parser.add_argument('--stage', action='append', default=[], metavar='ИМЯ',
+                        help='измерять только этапы, в имени которых есть эта строка (можно повторять)')
+    parser.add_argument('--no-memory', action='store_true', help='не измерять пиковую память')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, metavar='ФАЙЛ',
+                        help='файл базовых значений (по умолчанию: benchmarks/baseline.json)')
+    parser.add_argument('--save-baseline', action='store_true', help='записать результаты как базовые значения')
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='допустимое ухудшение относительно базовых значений (по умолчанию: 0.3)')
+    args = parser.parse_args()
+
+    params = {'size': args.size, 'diagrams': args.diagrams, 'broken': args.broken, 'seed': args.seed}
+    document = make_document(int(args.size * 1024 * 1024), args.diagrams, args.broken, args.seed)
+    print(f"Документ: {len(document.encode('utf-8')) / 1024 / 1024:.2f} МБ, "
+          f"{document.count(chr(10)) + 1} строк, {args.diagrams} диаграмм\n")
+
+    results = run(document, args.repeat, args.stage, memory=not args.no_memory)
+
+    print(f"{'этап':<46} {'МБ/с':>8} {'строк/с':>10} {'отн.':>7} {'память':>8}")
+    for name, result in results.items():
+        peak = f"{result['peak_ratio']:.2f}x" if 'peak_ratio' in result else '-'
+        print(f"{name:<46} {result['mb_s']:>8.2f} {result['lines_s']:>10.0f} "
+              f"{result['relative']:>7.2f} {peak:>8}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'params': params, 'stages': results}, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nБазовые значения записаны в {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nФайл базовых значений {args.baseline} не найден, сравнение пропущено")
+        return
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('params') != params:
+        print("\nПараметры документа отличаются от базовых, сравнение пропущено")
+        return
+
+    regressions = compare(results, baseline['stages'], args.tolerance)
+    if regressions:
+        print("\nОшибка: регрессия относительно базовых значений:")
+        for regression in regressions:
+            print(f"- {regression}")
+        sys.exit(1)
+    print("\nРегрессий относительно базовых значений нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Генератор синтетических Markdown документов для бенчмарков
+
+Документ похож на readme.md: разделы с русским текстом, списками, таблицами
+и блоками кода, между которыми расставлены Mermaid диаграммы. Часть
+диаграмм испорчена так, как это встречается в реальных документах: без
+блока кода, в блоке ``` без указания mermaid, с незакрытым блоком или
+разорванная текстом на части.
+
+Запуск: python benchmarks/corpus.py out.md --size 5 --diagrams 50 --broken 0.3
+"""
+
+import argparse
+import random
+
+PARAGRAPHS = (
+    'Показатели образования в регионе рассчитываются по данным официальной '
+    'статистики и дополняются результатами опросов выпускников.',
+    'Для прогнозирования используется ансамбль моделей: градиентный бустинг, '
+    'байесовские структурные модели временных рядов и нейронные сети.',
+    'Пропущенные значения восстанавливаются интерполяцией, после чего ряды '
+    'агрегируются по уровням иерархии и нормализуются.',
+    'Результаты валидации показывают, что ошибка прогноза (MAPE) не превышает '
+    '7% для большинства субъектов.',
+    'Система поиска по базе знаний строит эмбеддинги документов и выбирает '
+    'наиболее релевантные фрагменты для ответа пользователю.',
+)
+
+LIST = '''- Сбор данных из открытых источников
+- Очистка и нормализация рядов
+- Построение признаков: лаги, скользящие средние, сезонность
+- Обучение и валидация моделей'''
+
+TABLE = '''| Показатель | 2021 | 2022 | 2023 |
+|------------|------|------|------|
+| Охват, % | 91.2 | 92.5 | 93.1 |
+| Выпускники, тыс. | 715 | 731 | 744 |'''
+
+CODE = '''```python
+def forecast(series, horizon=12):
+    model = fit_model(series)
+    return model.predict(horizon)
+```'''
+
+# Диаграммы: {n} - номер диаграммы, чтобы идентификаторы узлов различались
+DIAGRAMS = (
+    '''graph TD
+    USER_{n}[Запрос пользователя] --> EMBED_{n}[Эмбеддинг запроса]
+    EMBED_{n} --> SEARCH_{n}[Поиск по индексу]
+    SEARCH_{n} --"Топ-k документов"--> RERANK_{n}[Переранжирование]
+    RERANK_{n} --> LLM_{n}[Генерация ответа]
+    LLM_{n} --> ANSWER_{n}[Ответ <b>пользователю</b>]''',
+    '''flowchart LR
+    RAW_{n}[Сырые ряды] --"Методы: интерполяция, Kalman filter"--> CLEAN_{n}[Пропуски обработаны]
+    CLEAN_{n} --"Агрегация <3 уровней"--> AGG_{n}[Агрегированные ряды]
+    AGG_{n} --> FEAT_{n}[Инженерия признаков]
+    FEAT_{n} --> MODEL_{n}[Обучение моделей]
+    classDef stage_{n} fill:#eef,stroke:#99c
+    class RAW_{n},CLEAN_{n} stage_{n}''',
+    '''graph TB
+    subgraph INPUT_{n}[Источники]
+        STAT_{n}[Росстат]
+        SURVEY_{n}[Опросы]
+    end
+    STAT_{n} --> ETL_{n}[ETL]
+    SURVEY_{n} --> ETL_{n}
+    ETL_{n} --> DWH_{n}[Хранилище]
+    %% Витрина для отчетов
+    DWH_{n} --> REPORT_{n}[Отчеты]''',
+)
+
+# Виды испорченных диаграмм
+BROKEN_KINDS = ('bare', 'untagged', 'unterminated', 'split')
+
+
+def _diagram(rng, n, kind):
+    body = rng.choice(DIAGRAMS).format(n=n)
+    if kind == 'fenced':
+        return f'```mermaid\n{body}\n```'
+    if kind == 'bare':
+        return body
+    if kind == 'untagged':
+        return f'```\n{body}\n```'
+    if kind == 'unterminated':
+        return f'```mermaid\n{body}'
+    # split: диаграмма разорвана текстом, вторая половина оказалась вне блока
+    lines = body.split('\n')
+    middle = len(lines) // 2
+    head = '\n'.join(lines[:middle])
+    tail = '\n'.join(lines[middle:])
+    return f'```mermaid\n{head}\n```\n\n{rng.choice(PARAGRAPHS)}\n\n{tail}'
+
+
+def make_document(size, diagrams=20, broken=0.3, seed=0):
+    """
+    Генерирует документ размером не меньше size байт (в UTF-8)
+
+    diagrams - количество диаграмм, равномерно распределенных по документу;
+    broken - доля испорченных диаграмм (виды выбираются из BROKEN_KINDS).
+    """
+    rng = random.Random(seed)
+    kinds = ['fenced'] * diagrams
+    for k in rng.sample(range(diagrams), round(diagrams * broken)):
+        kinds[k] = rng.choice(BROKEN_KINDS)
+
+    blocks = []
+    length = 0
+    section = 0
+    # Размер текста между диаграммами, чтобы они распределились по документу
+    gap = size // (diagrams + 1) if diagrams else size
+    next_diagram = gap
+    placed = 0
+    while length < size or placed < diagrams:
+        if placed < diagrams and length >= next_diagram:
+            block = _diagram(rng, placed, kinds[placed])
+            placed += 1
+            next_diagram += gap
+        elif rng.random() < 0.1:
+            section += 1
+            block = f'## Раздел {section}'
+        else:
+            block = rng.choice(PARAGRAPHS + PARAGRAPHS + (LIST, TABLE, CODE))
+        blocks.append(block)
+        length += len(block.encode('utf-8')) + 2
+    return '\n\n'.join(blocks) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Генератор синтетических Markdown документов')
+    parser.add_argument('output', help='путь к создаваемому файлу')
+    parser.add_argument('--size', type=float, default=1.0, help='размер документа, МБ (по умолчанию: 1)')
+    parser.add_argument('--diagrams', type=int, default=20, help='количество диаграмм (по умолчанию: 20)')
+    parser.add_argument('--broken', type=float, default=0.3, help='доля испорченных диаграмм (по умолчанию: 0.3)')
+    parser.add_argument('--seed', type=int, default=0, help='зерно генератора (по умолчанию: 0)')
+    args = parser.parse_args()
+
+    content = make_document(int(args.size * 1024 * 1024), args.diagrams, args.broken, args.seed)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        f.write(content)
+    print(f"Создан {args.output}: {len(content.encode('utf-8')) / 1024 / 1024:.2f} МБ, "
+          f"{content.count(chr(10))} строк, {args.diagrams} диаграмм")
+
+
+if __name__ == "__main__":
+    main()
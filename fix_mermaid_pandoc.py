@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+"""
+Фильтр pandoc для исправления Mermaid диаграмм при конвертации документа
+
+Исправляет диаграммы прямо в AST, который pandoc передает фильтру, без
+исправления Markdown на диске и повторного разбора:
+
+pandoc readme.md --filter fix_mermaid_pandoc.py -o Бизнес-план.docx
+"""
+
+from mermaid_fixer.pandoc import filter_blocks, filter_document, main
+
+if __name__ == "__main__":
+    main()
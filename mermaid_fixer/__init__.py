@@ -0,0 +1,8 @@
+"""
+Общие компоненты скриптов исправления Mermaid диаграмм
+
+Программный интерфейс: fix(text), fix_stream(lines) и fix_file(path)
+с выбором стратегии basic, advanced или complete (см. mermaid_fixer.api).
+"""
+
+from mermaid_fixer.api import STRATEGIES, FixResult, fix, fix_file, fix_stream
@@ -0,0 +1,711 @@
+"""
+Расширенная стратегия: исправление структуры блоков, сборка разрозненных
+частей диаграмм и экранирование специальных символов за один потоковый
+проход (скрипт fix_mermaid_advanced.py)
+"""
+
+import bisect
+import contextlib
+import functools
+import os
+import re
+import tempfile
+
+from mermaid_fixer import docx, edits, fastpath, labels, passes, reassemble
+from mermaid_fixer.cache import DEFAULT_MAX_BYTES, BlockCache
+from mermaid_fixer.classify import diagram_header
+from mermaid_fixer.fences import FenceIndex
+from mermaid_fixer.fileio import ChangeWriter, file_lock
+from mermaid_fixer.flowchart import continues_diagram
+from mermaid_fixer.metrics import Metrics
+
+# Имя и версия инструмента (версия меняется при изменении логики исправления)
+TOOL_NAME = 'fix_mermaid_advanced'
+FIXER_VERSION = '5'
+
+# Резервная копия исправленного файла: путь файла с этим суффиксом
+BACKUP_SUFFIX = '.backup2'
+
+# Начала строк, которые могут быть частями диаграмм (reassemble.is_fragment),
+# по байтам: комментарий, ключевое слово или идентификатор с формой, связью
+# или классом после него (как flowchart.STATEMENT_START)
+_FRAGMENT_STARTS = (rb'%%', rb'(?:end|subgraph|direction|classDef|class|style|linkStyle|click)\b',
+                    rb'(?=(?P<word>[\w\x80-\xff]+))(?P=word)' + fastpath.WS + rb'*(?:[\[({>&\-=~<:;]|[ox][-=])')
+
+# Строки, которые может затронуть исправление (для быстрого пути по байтам):
+# любые ```, заголовки диаграмм и строки, которые могут быть частями диаграмм
+_CANDIDATES = (
+    re.compile(rb'```'),
+    fastpath.line_start(*fastpath.header_keywords(), *_FRAGMENT_STARTS),
+)
+
+# Строки ``` и строки диаграмм: заголовки и возможные части диаграмм, по байтам
+_FENCE = fastpath.line_start(rb'```')
+_MERMAID_FENCE = fastpath.line_start(rb'```mermaid')
+_DIAGRAM_LINE = fastpath.line_start(*fastpath.header_keywords(), *_FRAGMENT_STARTS)
+
+# Сколько байт строк потока копия держит в памяти, прежде чем перейти во
+# временный файл (см. fix_mermaid_stream)
+_SPOOL_BYTES = 1 << 20
+
+# Начало блока ```mermaid с содержимым для экранирования и его конец
+_MERMAID_OPENING = '```mermaid\n'
+_FENCE_LINE = '\n```'
+
+
+def _ends_unclosed_diagram(next_line):
+    """
+    Проверяет, что строка после пустой не относится к незакрытой диаграмме:
+    не заголовок, не ``` и не оператор flowchart
+    """
+    return (next_line and
+            not next_line.startswith(('```', 'graph', 'flowchart')) and
+            not continues_diagram(next_line))
+
+
+def ends_bare_diagram(next_stripped):
+    """
+    Проверяет, что строка после пустой завершает диаграмму без блока кода:
+    она не разбирается как оператор flowchart (см. flowchart.statement)
+    """
+    return bool(next_stripped) and next_stripped != '```' and not continues_diagram(next_stripped)
+
+
+def _interrupts_diagram(stripped):
+    """
+    Проверяет, что строка (другой блок кода, заголовок, изображение)
+    прерывает диаграмму без блока кода
+    """
+    return (stripped.startswith('```') or
+            (stripped.startswith('**') and 
+             stripped.endswith('**') and 
+             len(stripped) > 4) or
+            stripped.startswith('!['))
+
+
+def is_stray_fragment(line):
+    """
+    Проверяет, разбирается ли строка как часть Mermaid диаграммы: связи
+    A --> B, узлы A[Label], комментарии, подграфы, classDef и class (см.
+    reassemble.is_fragment)
+    """
+    return reassemble.is_fragment(line.strip())
+
+
+def truncate_unclosed(diagram_lines):
+    """
+    Обрезает незакрытую диаграмму по ее логическому концу
+    """
+    # Возвращаемся и ищем конец диаграммы по контексту
+    for j, diagram_line in enumerate(diagram_lines):
+        stripped_diagram = diagram_line.strip()
+        
+        # Если встретили пустую строку, проверяем следующую
+        if stripped_diagram == '' and j + 1 < len(diagram_lines):
+            next_line = diagram_lines[j + 1].strip()
+            # Если следующая строка не относится к диаграмме
+            if _ends_unclosed_diagram(next_line):
+                # Обрезаем диаграмму здесь
+                return diagram_lines[:j]
+    
+    return diagram_lines
+
+
+def bare_diagram_end(lines, start):
+    """
+    Возвращает индекс строки после диаграммы без блока кода, заголовок
+    которой - lines[start]
+    
+    Правила те же, что при исправлении структуры: диаграмма заканчивается
+    пустой строкой (включительно), за которой идет не относящаяся к ней
+    строка, или перед строкой, которая ее прерывает.
+    """
+    i = start + 1
+    while i < len(lines):
+        stripped = lines[i].strip()
+        if stripped == '':
+            if i + 1 == len(lines) or ends_bare_diagram(lines[i + 1].strip()):
+                return i + 1
+        elif _interrupts_diagram(stripped):
+            return i
+        i += 1
+    return i
+
+
+def fix_mermaid_diagrams(content):
+    """
+    Исправляет все проблемы с Mermaid диаграммами
+    """
+    lines = content.split('\n')
+    result_lines = []
+    i = 0
+    
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+        
+        # Проверяем начало Mermaid диаграммы
+        if re.match(r'^```mermaid\s*$', stripped):
+            result_lines.append(line)
+            i += 1
+            
+            # Собираем всю диаграмму до закрывающих ```
+            diagram_lines = []
+            diagram_complete = False
+            
+            while i < len(lines):
+                current_line = lines[i]
+                current_stripped = current_line.strip()
+                
+                # Проверяем закрывающие ```
+                if re.match(r'^```\s*$', current_stripped):
+                    diagram_complete = True
+                    break
+                
+                diagram_lines.append(current_line)
+                i += 1
+            
+            # Если диаграмма не была закрыта, ищем логический конец
+            if not diagram_complete:
+                diagram_lines = truncate_unclosed(diagram_lines)
+            
+            # Добавляем строки диаграммы
+            result_lines.extend(diagram_lines)
+            
+            # Добавляем закрывающий блок, если его не было
+            if not diagram_complete:
+                result_lines.append('```')
+            else:
+                result_lines.append(lines[i])  # Добавляем найденный закрывающий блок
+                
+        else:
+            # Проверяем, не начинается ли строка с Mermaid диаграммы без блока кода
+            if diagram_header(stripped):
+                # Начинаем новый блок Mermaid
+                result_lines.append('```mermaid')
+                result_lines.append(line)
+                
+                i += 1
+                
+                # Собираем диаграмму
+                while i < len(lines):
+                    current_line = lines[i]
+                    current_stripped = current_line.strip()
+                    
+                    # Логика определения конца диаграммы
+                    if current_stripped == '':
+                        # Проверяем следующую строку
+                        if i + 1 < len(lines):
+                            next_stripped = lines[i + 1].strip()
+                            if ends_bare_diagram(next_stripped):
+                                # Конец диаграммы
+                                result_lines.append(current_line)
+                                break
+                        else:
+                            # Конец файла
+                            result_lines.append(current_line)
+                            break
+                    elif _interrupts_diagram(current_stripped):
+                        # Встретили другой блок кода, заголовок или изображение -
+                        # не добавляем эту строку в диаграмму
+                        i -= 1  # Вернемся на шаг назад
+                        break
+                    
+                    result_lines.append(current_line)
+                    i += 1
+                
+                # Закрываем блок
+                result_lines.append('```')
+                result_lines.append('')  # Пустая строка после диаграммы
+            else:
+                result_lines.append(line)
+        
+        i += 1
+    
+    return '\n'.join(result_lines)
+
+
+def escape_mermaid_block(mermaid_content):
+    """
+    Экранирует специальные символы в лейблах одного блока mermaid (текст
+    между ```mermaid и ```) за один проход, см. labels.escape_block
+    """
+    return labels.escape_block(mermaid_content)
+
+
+def escape_mermaid_content(content):
+    """
+    Экранирует специальные символы в Mermaid диаграммах
+
+    Блок - текст от ```mermaid и перевода строки до ближайшей строки,
+    которая начинается с ```. Границы ищутся str.find, а в результат
+    копируются только измененные блоки: текст без изменений возвращается
+    как есть.
+    """
+    parts = []
+    copied = 0
+    position = 0
+    while True:
+        opening = content.find(_MERMAID_OPENING, position)
+        if opening == -1:
+            break
+        start = opening + len(_MERMAID_OPENING)
+        end = content.find(_FENCE_LINE, start)
+        if end == -1:
+            break
+        block = content[start:end]
+        escaped = escape_mermaid_block(block)
+        if escaped != block:
+            parts.append(content[copied:start])
+            parts.append(escaped)
+            copied = end
+        position = end + len(_FENCE_LINE)
+    if not parts:
+        return content
+    parts.append(content[copied:])
+    return ''.join(parts)
+
+
+def clean_broken_diagrams(content):
+    """
+    Собирает разорванные диаграммы: части диаграмм, оказавшиеся вне блоков
+    кода, переносятся в диаграммы с теми же узлами или в новые блоки (см.
+    reassemble.reassemble)
+    """
+    return '\n'.join(reassemble.reassemble(content.split('\n')))
+
+
+class _LineReader:
+    """
+    Итератор по строкам с просмотром следующей строки и возвратом строки назад
+    """
+    
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._pending = []
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        if self._pending:
+            return self._pending.pop()
+        return next(self._lines)
+    
+    def peek(self):
+        """Возвращает следующую строку, не забирая ее, или None в конце"""
+        if not self._pending:
+            try:
+                self._pending.append(next(self._lines))
+            except StopIteration:
+                return None
+        return self._pending[-1]
+    
+    def push(self, line):
+        """Возвращает строку обратно, чтобы она была прочитана повторно"""
+        self._pending.append(line)
+
+
+def iter_text_lines(stream):
+    """
+    Построчно читает текстовый поток без завершающих '\n'
+    (те же строки, что дает content.split('\n'))
+    """
+    last = ''
+    for chunk in stream:
+        if chunk.endswith('\n'):
+            yield chunk[:-1]
+            last = ''
+        else:
+            last = chunk
+    yield last
+
+
+def _repair_structure(lines, metrics=None):
+    """
+    Потоковый вариант fix_mermaid_diagrams
+    """
+    reader = _LineReader(lines)
+    
+    for line in reader:
+        stripped = line.strip()
+        
+        # Проверяем начало Mermaid диаграммы
+        if re.match(r'^```mermaid\s*$', stripped):
+            if metrics is not None:
+                metrics.count('blocks_opened')
+            yield line
+            
+            # Буферизуем только текущую диаграмму до закрывающих ```
+            diagram_lines = []
+            for current_line in reader:
+                if re.match(r'^```\s*$', current_line.strip()):
+                    yield from diagram_lines
+                    yield current_line
+                    break
+                diagram_lines.append(current_line)
+            else:
+                # Диаграмма не была закрыта до конца файла
+                if metrics is not None:
+                    metrics.count('blocks_closed')
+                yield from truncate_unclosed(diagram_lines)
+                yield '```'
+        
+        # Проверяем, не начинается ли строка с Mermaid диаграммы без блока кода
+        elif diagram_header(stripped):
+            if metrics is not None:
+                metrics.count('blocks_synthesized')
+            yield '```mermaid'
+            yield line
+            
+            for current_line in reader:
+                current_stripped = current_line.strip()
+                
+                if current_stripped == '':
+                    next_line = reader.peek()
+                    if next_line is None or ends_bare_diagram(next_line.strip()):
+                        # Конец диаграммы или конец файла
+                        yield current_line
+                        break
+                elif _interrupts_diagram(current_stripped):
+                    # Строка будет обработана заново уже вне диаграммы
+                    reader.push(current_line)
+                    break
+                
+                yield current_line
+            
+            # Закрываем блок
+            yield '```'
+            yield ''
+        else:
+            yield line
+
+
+def _escape_blocks(lines, cache=None, metrics=None):
+    """
+    Потоковый вариант escape_mermaid_content
+    
+    Если передан кэш блоков, результат экранирования берется из него.
+    Число экранирований считается по добавленным '&' (каждая замена
+    добавляет одну сущность &quot;, &lt; или &gt;), поэтому оно верно и
+    для результатов из кэша.
+    Повторяет поиск r'```mermaid\n(.*?)\n```': блок открывается строкой,
+    оканчивающейся на ```mermaid, и закрывается первой строкой, начинающейся
+    с ```, не раньше чем через одну строку содержимого.
+    """
+    reader = _LineReader(lines)
+    # Позиция в строке, с которой regex продолжит поиск после закрывающих ```
+    scan_from = 0
+    
+    for line in reader:
+        is_opening = line.endswith('```mermaid') and len(line) - len('```mermaid') >= scan_from
+        scan_from = 0
+        yield line
+        if not is_opening:
+            continue
+        
+        block = []
+        for current_line in reader:
+            if block and current_line.startswith('```'):
+                block_text = '\n'.join(block)
+                if cache is not None:
+                    escaped = cache.lookup(block_text, escape_mermaid_block)
+                else:
+                    escaped = escape_mermaid_block(block_text)
+                if metrics is not None:
+                    metrics.count('escapes_applied', escaped.count('&') - block_text.count('&'))
+                yield from escaped.split('\n')
+                # Закрывающая строка может сама открывать следующий блок
+                reader.push(current_line)
+                scan_from = len('```')
+                break
+            block.append(current_line)
+        else:
+            # Закрывающих ``` нет - блок остается без изменений
+            yield from block
+
+
+def _structure_pass(lines, metrics=None, cache=None):
+    return _repair_structure(lines, metrics)
+
+
+def _reassemble_pass(lines, metrics=None, cache=None):
+    """
+    Потоковый вариант clean_broken_diagrams: части диаграмм можно
+    перенести в любую диаграмму текста, поэтому строки собираются целиком
+    """
+    return reassemble.reassemble(lines if isinstance(lines, list) else list(lines), metrics)
+
+
+def _count_opened(prescan, metrics):
+    if prescan.mermaid_blocks:
+        metrics.count('blocks_opened', prescan.mermaid_blocks)
+
+
+# Три шага исправления в порядке выполнения (см. passes): структура меняется
+# только при заголовках вне блоков и незакрытых блоках, сборка нужна только
+# при частях диаграмм вне блоков, экранирование - только при " и < в блоках
+PASSES = passes.preset(
+    'advanced',
+    passes.Pass('fix_mermaid_diagrams', _structure_pass, requires=('broken',), skipped=_count_opened, lines=True),
+    passes.Pass('clean_broken_diagrams', _reassemble_pass, requires=('orphan',), lines=True),
+    passes.Pass('escape_mermaid_content', _escape_blocks, requires=('label',), lines=True),
+)
+
+
+def _spooled_lines(spool):
+    """
+    Строки копии потока без '\\n' (пустой поток - одна пустая строка, как
+    у ''.split('\\n')); копия закрывается после последней
+    """
+    with spool:
+        spool.seek(0)
+        empty = True
+        for line in spool:
+            empty = False
+            yield line[:-1]
+        if empty:
+            yield ''
+
+
+def fix_mermaid_stream(lines, cache=None, metrics=None):
+    """
+    Выполняет все три шага (структура, сборка, экранирование) над
+    последовательностью строк
+    
+    Принимает итерируемый объект строк без '\n' и возвращает итератор
+    исправленных строк. Результат совпадает с последовательным вызовом
+    fix_mermaid_diagrams, clean_broken_diagrams и escape_mermaid_content.
+    Строки читаются один раз: по ним вычисляются признаки (см. PASSES и
+    passes.Prescan), а сами они копируются во временный файл (первые
+    _SPOOL_BYTES - в памяти). Если сборка разрозненных частей не нужна,
+    шаги обрабатывают строки копии потоково и держат в памяти только
+    текущую диаграмму; иначе текст собирается целиком, как этого требует
+    сборка. cache - необязательный BlockCache для результатов экранирования
+    блоков, metrics - необязательный Metrics для счетчиков исправлений.
+    """
+    spool = tempfile.SpooledTemporaryFile(_SPOOL_BYTES, mode='w+', encoding='utf-8', newline='\n')
+    
+    def copy():
+        for line in lines:
+            spool.write(line)
+            spool.write('\n')
+            yield line
+    
+    wanted = frozenset().union(*(pass_.requires for pass_ in PASSES))
+    try:
+        with metrics.stage('prescan') if metrics is not None else contextlib.nullcontext():
+            reader = copy()
+            prescan = passes.Prescan(reader, wanted)
+            for _ in reader:
+                pass
+        if 'orphan' in prescan.facts:
+            spool.seek(0)
+            content = spool.read()[:-1]
+            spool.close()
+            return iter(passes.run(PASSES, content, metrics, prescan=prescan, cache=cache).split('\n'))
+    except BaseException:
+        spool.close()
+        raise
+    return passes.run(PASSES, _spooled_lines(spool), metrics, prescan=prescan, cache=cache)
+
+
+def fix_content(content, cache=None, metrics=None):
+    """
+    Выполняет все три шага исправления текста (те, для которых в тексте
+    есть признаки, см. PASSES)
+    """
+    if metrics is not None:
+        metrics.count('lines_scanned', content.count('\n') + 1)
+    return passes.run(PASSES, content, metrics, cache=cache)
+
+
+def _block_left_open(text, fixed):
+    """
+    Проверяет, закончился ли текст внутри блока ```: незакрытый блок при
+    исправлении структуры или при экранировании. Блоки любых видов
+    учитываются потому, что строки внутри них reassemble не считает
+    разрозненными частями диаграмм, а граница области внутри блока это
+    бы нарушила
+    """
+    in_block = False
+    for tag in FenceIndex(text).tags:
+        if in_block:
+            in_block = tag != ''
+        else:
+            in_block = True
+    if in_block:
+        return True
+    
+    # Повторяем поиск блоков из _escape_blocks
+    return FenceIndex(fixed).blocks('```mermaid')[1] is not None
+
+
+def _scattered(data):
+    """
+    Проверяет по байтам, что в файле есть заголовки или части диаграмм
+    (reassemble.is_fragment) вне блоков ```mermaid (блок определяется по
+    четности числа строк ``` перед строкой) или незакрытый блок: после
+    исправления структуры в нем могут остаться разрозненные части, а куда
+    их перенести, зависит от всего текста (см. reassemble), поэтому такой
+    файл исправляется одной областью
+    """
+    fences = list(fastpath.candidate_lines(data, (_FENCE,)))
+    if len(fences) % 2:
+        return True
+    openings = set(fastpath.candidate_lines(data, (_MERMAID_FENCE,)))
+    for offset in fastpath.candidate_lines(data, (_DIAGRAM_LINE,)):
+        k = bisect.bisect_right(fences, offset)
+        if k % 2 and fences[k - 1] in openings:
+            continue
+        end = data.find(b'\n', offset)
+        line = bytes(data[offset:len(data) if end == -1 else end]).decode('utf-8', 'replace').strip()
+        if diagram_header(line) is not None or reassemble.is_fragment(line):
+            return True
+    return False
+
+
+def fix_mermaid_file(src, dst, cache=None, metrics=None):
+    """
+    Потоково исправляет текст из src и записывает его в dst
+    
+    Возвращает количество блоков ```mermaid до и после исправления.
+    """
+    counts = {'before': 0, 'after': 0, 'lines': 0}
+    
+    def count_source(lines):
+        for line in lines:
+            counts['before'] += line.count('```mermaid')
+            counts['lines'] += 1
+            yield line
+    
+    # С замерами времени шаги выполняются здесь же, до записи
+    fixed_lines = fix_mermaid_stream(count_source(iter_text_lines(src)), cache, metrics)
+    
+    first = True
+    with metrics.stage('write') if metrics is not None else contextlib.nullcontext():
+        for line in fixed_lines:
+            if not first:
+                dst.write('\n')
+            dst.write(line)
+            counts['after'] += line.count('```mermaid')
+            first = False
+    
+    if metrics is not None:
+        metrics.count('lines_scanned', counts['lines'])
+    return counts['before'], counts['after']
+
+
+def open_cache(cache_path, max_bytes=DEFAULT_MAX_BYTES):
+    """Открывает постоянный кэш блоков в пространстве имен этой стратегии"""
+    return BlockCache(cache_path, f'{TOOL_NAME}:{FIXER_VERSION}', max_bytes)
+
+
+def fix_file(file_path, backup_path=None, cache=None, metrics=None, jobs=None):
+    """
+    Исправляет файл на месте и возвращает словарь с ключами changed,
+    mermaid_before и mermaid_after
+    
+    Файл перезаписывается (атомарно, с резервной копией backup_path, если
+    она задана) только если исправление что-то меняет. cache - необязательный
+    BlockCache (см. open_cache); он не закрывается. jobs - число процессов
+    для исправления частей очень большого файла (см. fastpath.fix_mapped).
+    В документе Word (.docx) исправляется текст абзацев (см.
+    docx.fix_docx), jobs для него не используется.
+    """
+    if metrics is None:
+        metrics = Metrics()
+    
+    with file_lock(file_path):
+        metrics.count('bytes_read', os.path.getsize(file_path))
+        
+        fix = functools.partial(fix_content, cache=cache) if cache is not None else fix_content
+        if docx.is_docx(file_path):
+            # Документ Word: исправляется текст абзацев word/document.xml
+            result = docx.fix_docx(file_path, fix, backup_path, metrics)
+        else:
+            # Большие файлы: исправляются только области вокруг найденных по
+            # байтам кандидатов, остальное копируется без декодирования
+            # Рабочие процессы исправляют без кэша: соединение SQLite не
+            # передается между процессами
+            result = fastpath.fix_mapped(file_path, fix, _CANDIDATES, ends_bare_diagram, _block_left_open,
+                                         backup_path=backup_path, metrics=metrics, jobs=jobs,
+                                         worker_fix=fix_content, whole=_scattered)
+        
+        if result is None:
+            # Исправляем содержимое за один потоковый проход. Пока результат
+            # совпадает с исходным текстом, он никуда не пишется; при первом
+            # отличии запись идет во временный файл, который затем атомарно
+            # заменяет исходный
+            dst = ChangeWriter(file_path)
+            try:
+                with open(file_path, 'r', encoding='utf-8') as src:
+                    original_mermaid_count, fixed_mermaid_count = fix_mermaid_file(src, dst, cache, metrics)
+            except BaseException:
+                dst.discard()
+                raise
+            with metrics.stage('write'):
+                changed = dst.close(backup_path)
+            result = {
+                'changed': changed,
+                'mermaid_before': original_mermaid_count,
+                'mermaid_after': fixed_mermaid_count,
+            }
+        
+        if result['changed']:
+            metrics.count('bytes_written', os.path.getsize(file_path))
+    
+    return result
+
+
+def file_changes(file_path, cache_path=None, cache_max_bytes=DEFAULT_MAX_BYTES, jobs=None, context=0, lines=None,
+                 data=None):
+    """
+    Генерирует изменения (edits.Change), которые fix_file внес бы в файл,
+    не записывая его
+
+    cache_path - путь к постоянному кэшу блоков (см. process_file),
+    context, lines и data - см. edits.file_changes.
+    """
+    cache = open_cache(cache_path, cache_max_bytes) if cache_path else None
+    try:
+        fix = functools.partial(fix_content, cache=cache) if cache is not None else fix_content
+        yield from edits.file_changes(file_path, fix, _CANDIDATES, ends_bare_diagram, _block_left_open, jobs=jobs,
+                                      worker_fix=fix_content, context=context, lines=lines, data=data,
+                                      whole=_scattered)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def process_file(file_path, cache_path=None, cache_max_bytes=DEFAULT_MAX_BYTES, jobs=None, timing=False):
+    """
+    Исправляет один файл (с резервной копией) и возвращает статистику
+    
+    cache_path - путь к постоянному кэшу блоков, общему для файлов и запусков,
+    jobs - число процессов для частей очень большого файла.
+    Счетчики исправлений возвращаются в ключе 'metrics', с timing - вместе
+    с временем этапов.
+    """
+    backup_path = file_path + BACKUP_SUFFIX
+    metrics = Metrics(timing)
+    cache = open_cache(cache_path, cache_max_bytes) if cache_path else None
+    
+    try:
+        result = fix_file(file_path, backup_path, cache, metrics, jobs)
+    finally:
+        if cache is not None:
+            cache.close()
+    
+    stats = {
+        'backup_path': backup_path if result['changed'] else None,
+        'files_changed': int(result['changed']),
+        'mermaid_before': result['mermaid_before'],
+        'mermaid_after': result['mermaid_after'],
+        'mermaid_fixed': max(0, result['mermaid_after'] - result['mermaid_before']),
+        'metrics': metrics.as_dict(),
+    }
+    if cache is not None:
+        stats['cache_hits'] = cache.hits
+        stats['cache_misses'] = cache.misses
+    return stats
@@ -0,0 +1,131 @@
+"""
+Программный интерфейс исправления Mermaid диаграмм
+
+Позволяет исправлять тексты и файлы в одном долго живущем процессе, без
+запуска скриптов. Стратегии соответствуют скриптам:
+
+- basic - fix_mermaid.py: оборачивание диаграмм в блоки ```mermaid;
+- advanced - fix_mermaid_advanced.py: структура блоков, сборка
+  разрозненных частей и экранирование символов;
+- complete - fix_mermaid_complete.py: восстановление диаграмм по
+  библиотеке эталонов.
+
+Импорт модуля ничего не читает и не записывает: библиотека эталонов
+загружается при первом исправлении стратегией complete.
+"""
+
+from mermaid_fixer import advanced, basic, complete
+from mermaid_fixer.library import get_library
+from mermaid_fixer.metrics import Metrics
+
+STRATEGIES = {
+    'basic': basic,
+    'advanced': advanced,
+    'complete': complete,
+}
+
+DEFAULT_STRATEGY = 'advanced'
+
+
+class FixResult:
+    """
+    Результат исправления текста или файла
+
+    text - исправленный текст (для fix_file - None), changed - изменилось
+    ли что-нибудь, path и backup_path - файл и его резервная копия (для
+    fix_file), mermaid_before и mermaid_after - количество блоков ```mermaid,
+    metrics - Metrics со счетчиками исправлений и временем этапов.
+    """
+
+    def __init__(self, strategy, changed, mermaid_before, mermaid_after, metrics,
+                 text=None, path=None, backup_path=None):
+        self.strategy = strategy
+        self.changed = changed
+        self.mermaid_before = mermaid_before
+        self.mermaid_after = mermaid_after
+        self.metrics = metrics
+        self.text = text
+        self.path = path
+        self.backup_path = backup_path
+
+    @property
+    def stats(self):
+        """Счетчики исправлений (см. metrics.COUNTER_LABELS)"""
+        return self.metrics.counters
+
+    def __repr__(self):
+        target = self.path if self.path is not None else f'<{len(self.text)} символов>'
+        return f'FixResult({self.strategy}, {target}, changed={self.changed})'
+
+
+def _strategy_options(strategy, cache, library):
+    """Модуль стратегии и ее дополнительные аргументы (кэш или библиотека)"""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Неизвестная стратегия {strategy!r}, допустимые: {', '.join(STRATEGIES)}")
+    if cache is not None and strategy != 'advanced':
+        raise ValueError("Кэш блоков поддерживается только стратегией advanced")
+    if library is not None and strategy != 'complete':
+        raise ValueError("Библиотека эталонов поддерживается только стратегией complete")
+
+    options = {}
+    if cache is not None:
+        options['cache'] = cache
+    if library is not None:
+        options['library'] = get_library(library) if isinstance(library, str) else library
+    return STRATEGIES[strategy], options
+
+
+def fix(text, strategy=DEFAULT_STRATEGY, cache=None, library=None, timing=False):
+    """
+    Исправляет текст и возвращает FixResult
+
+    cache - BlockCache для стратегии advanced (см. advanced.open_cache),
+    library - DiagramLibrary или каталог эталонов для стратегии complete,
+    timing - замерять время этапов.
+    """
+    module, options = _strategy_options(strategy, cache, library)
+    metrics = Metrics(timing)
+    fixed = module.fix_content(text, metrics=metrics, **options)
+    return FixResult(strategy, fixed != text, text.count('```mermaid'), fixed.count('```mermaid'),
+                     metrics, text=fixed)
+
+
+def fix_stream(lines, strategy=DEFAULT_STRATEGY, cache=None, library=None, metrics=None):
+    """
+    Исправляет последовательность строк (без '\\n') и возвращает итератор
+    исправленных строк
+
+    Стратегия advanced обрабатывает строки потоково, держа в памяти только
+    текущую диаграмму, и собирает их в текст целиком, только если нужна
+    сборка разрозненных частей (см. advanced.fix_mermaid_stream); basic и
+    complete работают с текстом целиком. Счетчики исправлений
+    накапливаются в metrics (Metrics), если он передан.
+    """
+    module, options = _strategy_options(strategy, cache, library)
+    if module is advanced:
+        return advanced.fix_mermaid_stream(lines, metrics=metrics, **options)
+    return iter(module.fix_content('\n'.join(lines), metrics=metrics, **options).split('\n'))
+
+
+def fix_file(path, strategy=DEFAULT_STRATEGY, backup=True, cache=None, library=None, timing=False,
+             jobs=None):
+    """
+    Исправляет файл на месте и возвращает FixResult
+
+    Файл перезаписывается атомарно и только если исправление что-то меняет.
+    backup - создать резервную копию рядом с файлом (с суффиксом стратегии,
+    как у скриптов) или путь резервной копии; False - без резервной копии.
+    jobs - число процессов для исправления частей очень большого файла;
+    результат тот же, что в одном процессе. В документе Word (.docx)
+    исправляется текст абзацев, остальные части архива не меняются.
+    """
+    module, options = _strategy_options(strategy, cache, library)
+    if backup is True:
+        backup_path = path + module.BACKUP_SUFFIX
+    else:
+        backup_path = backup or None
+
+    metrics = Metrics(timing)
+    result = module.fix_file(path, backup_path, metrics=metrics, jobs=jobs, **options)
+    return FixResult(strategy, result['changed'], result['mermaid_before'], result['mermaid_after'],
+                     metrics, path=path, backup_path=backup_path if result['changed'] else None)
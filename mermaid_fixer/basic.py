@@ -0,0 +1,267 @@
+"""
+Базовая стратегия: оборачивание диаграмм без блока кода в ```mermaid и
+добавление указания mermaid в блоки ``` с диаграммами (скрипт fix_mermaid.py)
+"""
+
+import os
+import re
+
+from mermaid_fixer import docx, edits, fastpath, passes
+from mermaid_fixer.classify import HEADER_PATTERN, PrefixTable, diagram_header
+from mermaid_fixer.fences import FenceIndex
+from mermaid_fixer.fileio import file_lock, write_if_changed
+from mermaid_fixer.metrics import Metrics
+
+# Имя и версия инструмента (версия меняется при изменении логики исправления)
+TOOL_NAME = 'fix_mermaid'
+FIXER_VERSION = '3'
+
+# Резервная копия исправленного файла: путь файла с этим суффиксом
+BACKUP_SUFFIX = '.backup'
+
+# Начала строк, которые продолжают диаграмму после пустой строки
+_CONTINUATION = PrefixTable({1: ('    ', '-', '|', '%', 'subgraph', 'classDef', 'class ')})
+
+# Строки, которые может затронуть исправление (для быстрого пути по байтам):
+# любые ``` и заголовки диаграмм в любом регистре
+_CANDIDATES = (
+    re.compile(rb'```'),
+    fastpath.line_start(*fastpath.header_keywords(ignore_case=True), ignore_case=True),
+)
+
+# Сколько строк назад от заголовка ищется ```mermaid
+_LOOKBACK = passes.HEADER_LOOKBACK
+
+# Блок ``` с заголовком диаграммы, для которого еще не встретились закрывающие ```
+_PENDING_BLOCK = re.compile(r'```\n' + HEADER_PATTERN)
+
+# Заголовок диаграммы в строке после открывающих ```
+_HEADER = re.compile(HEADER_PATTERN)
+
+
+def fix_mermaid_diagrams(content, metrics=None):
+    """
+    Исправляет Mermaid диаграммы в тексте
+    
+    Ищет:
+    1. flowchart TD/LR/TB/RL и graph TD/TB/LR/RL (без блока кода)
+    2. Заголовки остальных диаграмм: sequenceDiagram, classDiagram,
+       erDiagram, gantt, pie, stateDiagram и т.д. (без блока кода)
+    3. Блоки кода без указания mermaid
+    
+    И оборачивает их в правильные блоки ```mermaid
+    
+    metrics - необязательный Metrics для счетчиков исправлений.
+    """
+    
+    lines = content.split('\n')
+    result_lines = []
+    i = 0
+    
+    while i < len(lines):
+        line = lines[i].strip()
+        
+        # Проверяем, является ли текущая строка началом Mermaid диаграммы
+        # (одним поиском по таблице ключевых слов)
+        is_mermaid_start = diagram_header(line, ignore_case=True) is not None
+        
+        if is_mermaid_start:
+            # Проверяем, не находится ли уже в блоке кода
+            # Ищем ближайшую предыдущую строку с ```: блок открыт, если это ```mermaid
+            in_code_block = False
+            for j in range(i - 1, max(0, i - _LOOKBACK) - 1, -1):  # Проверяем последние _LOOKBACK строк
+                prev_line = lines[j].strip()
+                if prev_line.startswith('```mermaid'):
+                    in_code_block = True
+                    break
+                elif prev_line.startswith('```') and prev_line != '```mermaid':
+                    break
+            
+            if not in_code_block:
+                if metrics is not None:
+                    metrics.count('blocks_synthesized')
+                
+                # Добавляем открывающий блок
+                result_lines.append('```mermaid')
+                result_lines.append(lines[i])
+                
+                # Ищем конец диаграммы
+                i += 1
+                while i < len(lines):
+                    current_line = lines[i].rstrip()
+                    result_lines.append(current_line)
+                    
+                    # Проверяем условия окончания диаграммы
+                    if (current_line.strip() == '' and 
+                        i + 1 < len(lines) and 
+                        not _CONTINUATION.classify(lines[i + 1].strip())):
+                        # Пустая строка и следующая строка не относится к диаграмме
+                        break
+                    elif (current_line.strip().startswith('```') and 
+                          current_line.strip() != '```mermaid'):
+                        # Встретили закрывающий блок кода
+                        result_lines.pop()  # Убираем неправильный закрывающий блок
+                        break
+                    
+                    i += 1
+                
+                # Добавляем закрывающий блок
+                result_lines.append('```')
+                result_lines.append('')  # Пустая строка после блока
+            else:
+                result_lines.append(lines[i])
+        else:
+            result_lines.append(lines[i])
+        
+        i += 1
+    
+    return '\n'.join(result_lines)
+
+
+def fix_existing_code_blocks(content, metrics=None):
+    """
+    Исправляет существующие блоки кода, добавляя mermaid где необходимо
+    
+    Блоки те же, что находит r'```\n(' + HEADER_PATTERN + r'.*?)\n```', но
+    они берутся из индекса блоков кода, и время линейно даже при многих
+    незакрытых ```.
+    """
+    if _PENDING_BLOCK.search(content) is None:
+        if metrics is not None:
+            metrics.count('blocks_retagged', 0)
+        return content
+
+    fences = FenceIndex(content)
+    
+    def has_header(k):
+        return _HEADER.match(content, fences.ends[k] + 1) is not None
+    
+    blocks, _ = fences.blocks('```', has_header)
+    if metrics is not None:
+        metrics.count('blocks_retagged', len(blocks))
+    if not blocks:
+        return content
+    
+    # Указание mermaid дописывается к открывающим ```
+    parts = []
+    position = 0
+    for opening, _ in blocks:
+        parts.append(content[position:fences.ends[opening]])
+        parts.append('mermaid')
+        position = fences.ends[opening]
+    parts.append(content[position:])
+    return ''.join(parts)
+
+
+# Шаги исправления в порядке выполнения (см. passes): оборачивание нужно
+# только при заголовках, указание mermaid - при ``` (точнее блоки
+# проверяет сам шаг поиском _PENDING_BLOCK)
+PASSES = passes.preset(
+    'basic',
+    passes.Pass('fix_mermaid_diagrams', fix_mermaid_diagrams, requires=('loose_header',)),
+    passes.Pass('fix_existing_code_blocks', fix_existing_code_blocks, requires=('fence',)),
+)
+
+
+def fix_content(content, metrics=None):
+    """
+    Выполняет оба шага исправления текста (те, для которых в тексте есть
+    признаки, см. PASSES)
+    """
+    if metrics is not None:
+        metrics.count('lines_scanned', content.count('\n') + 1)
+    return passes.run(PASSES, content, metrics)
+
+
+def _ends_diagram(stripped):
+    """
+    Проверяет, что непустая строка после пустой завершает диаграмму
+    """
+    return not _CONTINUATION.classify(stripped)
+
+
+def _block_left_open(text, fixed):
+    """
+    Проверяет, остался ли в исправленном тексте блок ``` с диаграммой без
+    закрывающих ``` (их поиск продолжился бы за концом текста)
+    """
+    return _PENDING_BLOCK.search(fixed, fixed.rfind('\n```') + 1) is not None
+
+
+def fix_file(file_path, backup_path=None, metrics=None, jobs=None):
+    """
+    Исправляет файл на месте и возвращает словарь с ключами changed,
+    mermaid_before и mermaid_after
+    
+    Файл перезаписывается (атомарно, с резервной копией backup_path, если
+    она задана) только если исправление что-то меняет. jobs - число
+    процессов для исправления частей очень большого файла (см.
+    fastpath.fix_mapped). В документе Word (.docx) исправляется текст
+    абзацев (см. docx.fix_docx), jobs для него не используется.
+    """
+    if metrics is None:
+        metrics = Metrics()
+    
+    with file_lock(file_path):
+        metrics.count('bytes_read', os.path.getsize(file_path))
+        
+        if docx.is_docx(file_path):
+            # Документ Word: исправляется текст абзацев word/document.xml
+            result = docx.fix_docx(file_path, fix_content, backup_path, metrics)
+        else:
+            # Большие файлы: исправляются только области вокруг найденных по
+            # байтам кандидатов, остальное копируется без декодирования
+            result = fastpath.fix_mapped(file_path, fix_content, _CANDIDATES, _ends_diagram, _block_left_open,
+                                         _LOOKBACK, backup_path, metrics, jobs)
+        
+        if result is None:
+            # Читаем исходный файл
+            with metrics.stage('read'):
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    original_content = f.read()
+            
+            # Исправляем содержимое и записываем исправленный файл
+            fixed_content = fix_content(original_content, metrics)
+            with metrics.stage('write'):
+                changed = write_if_changed(file_path, original_content, fixed_content, backup_path)
+            result = {
+                'changed': changed,
+                'mermaid_before': original_content.count('```mermaid'),
+                'mermaid_after': fixed_content.count('```mermaid'),
+            }
+        
+        if result['changed']:
+            metrics.count('bytes_written', os.path.getsize(file_path))
+    
+    return result
+
+
+def file_changes(file_path, jobs=None, context=0, lines=None, data=None):
+    """
+    Генерирует изменения (edits.Change), которые fix_file внес бы в файл,
+    не записывая его (context, lines и data - см. edits.file_changes)
+    """
+    return edits.file_changes(file_path, fix_content, _CANDIDATES, _ends_diagram, _block_left_open, _LOOKBACK,
+                              jobs=jobs, context=context, lines=lines, data=data)
+
+
+def process_file(file_path, jobs=None, timing=False):
+    """
+    Исправляет один файл (с резервной копией) и возвращает статистику
+    
+    jobs - число процессов для частей очень большого файла.
+    Счетчики исправлений возвращаются в ключе 'metrics', с timing - вместе
+    с временем этапов.
+    """
+    backup_path = file_path + BACKUP_SUFFIX
+    metrics = Metrics(timing)
+    result = fix_file(file_path, backup_path, metrics, jobs)
+    
+    return {
+        'backup_path': backup_path if result['changed'] else None,
+        'files_changed': int(result['changed']),
+        'mermaid_before': result['mermaid_before'],
+        'mermaid_after': result['mermaid_after'],
+        'mermaid_added': result['mermaid_after'] - result['mermaid_before'],
+        'metrics': metrics.as_dict(),
+    }
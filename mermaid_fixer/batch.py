@@ -0,0 +1,178 @@
+"""
+Пакетный режим: обработка каталогов и glob-шаблонов пулом процессов
+"""
+
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from mermaid_fixer import metrics
+
+
+def has_magic(target):
+    """Проверяет, содержит ли путь символы glob-шаблона"""
+    return any(char in target for char in '*?[')
+
+
+# Расширения обрабатываемых файлов: Markdown и документы Word
+EXTENSIONS = ('.md', '.docx')
+
+# Префикс файлов блокировки, которые Word создает рядом с открытым документом
+_WORD_LOCK_PREFIX = '~$'
+
+
+def _is_document(path, extensions=EXTENSIONS):
+    return path.endswith(extensions) and not os.path.basename(path).startswith(_WORD_LOCK_PREFIX)
+
+
+def _walk_markdown(directory, extensions=EXTENSIONS):
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if _is_document(name, extensions):
+                yield os.path.join(root, name)
+
+
+def collect_markdown_files(targets, extensions=EXTENSIONS):
+    """
+    Собирает .md и .docx файлы (или файлы с расширениями extensions) из
+    списка путей, каталогов (рекурсивно) и glob-шаблонов
+    
+    Каждый файл возвращается один раз, в порядке обнаружения. Файлы
+    блокировки Word (~$*.docx) пропускаются.
+    """
+    seen = set()
+    files = []
+    
+    for target in targets:
+        if has_magic(target):
+            matches = sorted(glob.glob(target, recursive=True))
+        else:
+            matches = [target]
+        
+        for match in matches:
+            if os.path.isdir(match):
+                candidates = _walk_markdown(match, extensions)
+            elif os.path.isfile(match) and (_is_document(match, extensions) or match == target):
+                candidates = [match]
+            else:
+                continue
+            
+            for path in candidates:
+                key = os.path.abspath(path)
+                if key not in seen:
+                    seen.add(key)
+                    files.append(path)
+    
+    return files
+
+
+def _run_one(process_file, path):
+    try:
+        return path, process_file(path), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+
+def run_batch(files, process_file, workers=None, manifest=None):
+    """
+    Обрабатывает файлы функцией process_file(path) -> dict статистики
+    
+    Работа распределяется по пулу процессов размером с число ядер.
+    Ошибка в одном файле не прерывает обработку остальных.
+    Если передан манифест, файлы, не изменившиеся с прошлого запуска,
+    пропускаются без чтения, а обработанные файлы записываются в манифест.
+    Возвращает сводку: количество файлов, суммы числовых счетчиков, сумму
+    счетчиков и замеров времени этапов из ключа 'metrics' и ошибки.
+    """
+    summary = {'files': len(files), 'processed': 0, 'skipped': 0, 'totals': {}, 'errors': [],
+               'metrics': {'stages': {}, 'counters': {}}}
+    
+    if manifest is not None:
+        pending = [path for path in files if not manifest.is_fresh(path)]
+        summary['skipped'] = len(files) - len(pending)
+        files = pending
+    
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(files)))
+    
+    def account(path, stats, error):
+        if error is not None:
+            summary['errors'].append((path, error))
+            return
+        if manifest is not None:
+            manifest.record(path)
+        summary['processed'] += 1
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                summary['totals'][key] = summary['totals'].get(key, 0) + value
+        if 'metrics' in stats:
+            metrics.merge(summary['metrics'], stats['metrics'])
+    
+    if workers == 1:
+        for path in files:
+            account(*_run_one(process_file, path))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_run_one, process_file, path) for path in files]
+            for future in as_completed(futures):
+                account(*future.result())
+    
+    summary['errors'].sort()
+    return summary
+
+
+def print_summary(summary, labels):
+    """
+    Печатает сводку пакетной обработки
+    
+    labels сопоставляет ключам счетчиков их подписи; порядок сохраняется.
+    """
+    print(f"\nОбработано файлов: {summary['processed']} из {summary['files']}")
+    if summary['skipped']:
+        print(f"Пропущено без изменений: {summary['skipped']}")
+    
+    totals = summary['totals']
+    for key, label in labels.items():
+        print(f"- {label}: {totals.get(key, 0)}")
+    
+    if 'cache_hits' in totals:
+        print(f"- Кэш блоков: попаданий {totals['cache_hits']}, промахов {totals.get('cache_misses', 0)}")
+    
+    if summary['errors']:
+        print(f"\nОшибки ({len(summary['errors'])}):")
+        for path, error in summary['errors']:
+            print(f"- {path}: {error}")
+
+
+def main_batch(targets, process_file, labels, manifest=None, report_metrics=None, workers=None):
+    """
+    Точка входа пакетного режима для скриптов исправления
+    
+    report_metrics(data) выводит суммарные счетчики и замеры времени,
+    workers - размер пула процессов (по умолчанию - число ядер).
+    Завершает процесс с кодом 1, если хотя бы один файл не удалось обработать.
+    """
+    for target in targets:
+        if not has_magic(target) and not os.path.exists(target):
+            print(f"Ошибка: файл {target} не найден")
+            sys.exit(1)
+    
+    files = collect_markdown_files(targets)
+    if not files:
+        print("Ошибка: не найдено ни одного .md или .docx файла")
+        sys.exit(1)
+    
+    print(f"Найдено файлов: {len(files)}")
+    summary = run_batch(files, process_file, workers=workers, manifest=manifest)
+    if manifest is not None:
+        manifest.save()
+    print_summary(summary, labels)
+    if report_metrics is not None:
+        report_metrics(summary['metrics'])
+    
+    if summary['errors']:
+        sys.exit(1)
+    return summary
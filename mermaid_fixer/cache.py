@@ -0,0 +1,121 @@
+"""
+Постоянный кэш обработанных блоков mermaid с вытеснением по LRU
+"""
+
+import hashlib
+import sqlite3
+import time
+from contextlib import contextmanager
+
+DEFAULT_CACHE = '.mermaid_cache.sqlite'
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# При превышении лимита кэш сокращается до этой доли, чтобы не вытеснять
+# записи на каждом запуске
+_EVICT_TO = 0.9
+
+
+class BlockCache:
+    """
+    Кэш результатов обработки блоков, адресуемый хешем содержимого
+    
+    Ключ - SHA-256 от пространства имен (имя и версия инструмента) и
+    исходного текста блока, поэтому смена версии инструмента автоматически
+    делает старые записи недостижимыми. Хранилище - SQLite, его можно
+    разделять между процессами пула и между запусками. Обновления времени
+    использования и новые записи накапливаются в памяти и записываются одной
+    транзакцией в flush()/close().
+    """
+    
+    def __init__(self, path, namespace, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory = {}
+        self._touched = set()
+        self._new = {}
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS blocks ('
+                         'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                         'size INTEGER NOT NULL, used REAL NOT NULL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS blocks_used ON blocks (used)')
+    
+    def _key(self, text):
+        digest = hashlib.sha256(self.namespace.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(text.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+    
+    def lookup(self, text, compute):
+        """
+        Возвращает результат compute(text) из кэша или вычисляет и сохраняет его
+        """
+        key = self._key(text)
+        
+        value = self._memory.get(key)
+        if value is None:
+            row = self._db.execute('SELECT value FROM blocks WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                value = row[0]
+                self._memory[key] = value
+        
+        if value is not None:
+            self.hits += 1
+            if key not in self._new:
+                self._touched.add(key)
+            return value
+        
+        self.misses += 1
+        value = compute(text)
+        self._memory[key] = value
+        self._new[key] = value
+        return value
+    
+    def flush(self):
+        """Записывает новые записи и время использования, вытесняет лишнее"""
+        if not self._new and not self._touched:
+            return
+        now = time.time()
+        with self._transaction():
+            self._db.executemany(
+                'INSERT OR REPLACE INTO blocks (key, value, size, used) VALUES (?, ?, ?, ?)',
+                ((key, value, len(key) + len(value.encode('utf-8', 'surrogatepass')), now)
+                 for key, value in self._new.items()))
+            self._db.executemany('UPDATE blocks SET used = ? WHERE key = ?',
+                                 ((now, key) for key in self._touched))
+            self._evict()
+        self._new.clear()
+        self._touched.clear()
+    
+    def _evict(self):
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM blocks').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        
+        excess = total - int(self.max_bytes * _EVICT_TO)
+        victims = []
+        for key, size in self._db.execute('SELECT key, size FROM blocks ORDER BY used'):
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+        self._db.executemany('DELETE FROM blocks WHERE key = ?', victims)
+    
+    @contextmanager
+    def _transaction(self):
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        self._db.execute('COMMIT')
+    
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._db.close()
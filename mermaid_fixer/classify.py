@@ -0,0 +1,133 @@
+"""
+Классификация строк: заголовки Mermaid диаграмм и таблицы префиксов
+"""
+
+import re
+
+# Направления для flowchart/graph
+FLOW_DIRECTIONS = frozenset(('TD', 'TB', 'LR', 'RL', 'BT'))
+
+# Ключевое слово заголовка -> вид диаграммы
+DIAGRAM_KEYWORDS = {
+    'flowchart': 'flowchart',
+    'flowchart-elk': 'flowchart',
+    'graph': 'flowchart',
+    'sequenceDiagram': 'sequenceDiagram',
+    'classDiagram': 'classDiagram',
+    'classDiagram-v2': 'classDiagram',
+    'stateDiagram': 'stateDiagram',
+    'stateDiagram-v2': 'stateDiagram',
+    'erDiagram': 'erDiagram',
+    'gantt': 'gantt',
+    'pie': 'pie',
+    'journey': 'journey',
+    'gitGraph': 'gitGraph',
+    'mindmap': 'mindmap',
+    'timeline': 'timeline',
+    'quadrantChart': 'quadrantChart',
+    'requirementDiagram': 'requirementDiagram',
+    'C4Context': 'C4',
+    'C4Container': 'C4',
+    'C4Component': 'C4',
+    'C4Dynamic': 'C4',
+    'C4Deployment': 'C4',
+    'sankey-beta': 'sankey',
+    'xychart-beta': 'xychart',
+    'block-beta': 'block',
+}
+
+# Виды диаграмм, для которых после ключевого слова обязательно направление
+_DIRECTED_KINDS = frozenset(('flowchart',))
+
+# Регулярное выражение для заголовка диаграммы любого вида
+HEADER_PATTERN = r'(?:(?:flowchart|flowchart-elk|graph)\s+(?:TD|TB|LR|RL|BT)|(?:%s)(?![\w-]))' % '|'.join(
+    sorted((re.escape(keyword) for keyword, kind in DIAGRAM_KEYWORDS.items() if kind != 'flowchart'),
+           key=len, reverse=True))
+
+_KEYWORDS_FOLDED = {keyword.lower(): kind for keyword, kind in DIAGRAM_KEYWORDS.items()}
+_FIRST_CHARS = frozenset(keyword[0] for keyword in DIAGRAM_KEYWORDS)
+_FIRST_CHARS_FOLDED = frozenset(keyword[0] for keyword in _KEYWORDS_FOLDED) | frozenset(
+    keyword[0].upper() for keyword in _KEYWORDS_FOLDED)
+
+
+def diagram_header(line, ignore_case=False):
+    """
+    Возвращает вид Mermaid диаграммы, если строка является ее заголовком,
+    иначе None
+    
+    Строка передается без начальных пробелов. Для flowchart/graph после
+    ключевого слова должно идти направление (TD, TB, LR, RL, BT), остальные
+    виды (sequenceDiagram, classDiagram, erDiagram, gantt, pie, stateDiagram
+    и т.д.) распознаются по первому слову. Большинство строк отсекается
+    проверкой первого символа.
+    """
+    if line[:1] not in (_FIRST_CHARS_FOLDED if ignore_case else _FIRST_CHARS):
+        return None
+    
+    parts = line.split(None, 1)
+    if not parts:
+        return None
+    
+    if ignore_case:
+        kind = _KEYWORDS_FOLDED.get(parts[0].lower())
+    else:
+        kind = DIAGRAM_KEYWORDS.get(parts[0])
+    if kind is None:
+        return None
+    
+    if kind in _DIRECTED_KINDS:
+        # Как и раньше, направление проверяется как префикс остатка строки
+        if len(parts) < 2:
+            return None
+        direction = parts[1][:2]
+        if ignore_case:
+            direction = direction.upper()
+        if direction not in FLOW_DIRECTIONS:
+            return None
+    
+    return kind
+
+
+class PrefixTable:
+    """
+    Префиксное дерево для классификации строк за один проход
+    
+    Каждому префиксу сопоставляется битовая маска групп. classify(line)
+    возвращает объединение масок всех префиксов, с которых начинается строка,
+    за время, зависящее только от длины самого длинного совпавшего префикса,
+    но не от количества префиксов в таблице.
+    """
+    
+    def __init__(self, groups):
+        """
+        groups: словарь {битовая маска: последовательность префиксов}
+        """
+        # Узел: [маска всех префиксов на пути к узлу, дочерние узлы]
+        self._root = [0, {}]
+        for mask, prefixes in groups.items():
+            for prefix in prefixes:
+                node = self._root
+                for char in prefix:
+                    node = node[1].setdefault(char, [0, {}])
+                node[0] |= mask
+        self._accumulate(self._root, 0)
+    
+    def _accumulate(self, node, inherited):
+        stack = [(node, inherited)]
+        while stack:
+            node, inherited = stack.pop()
+            node[0] |= inherited
+            for child in node[1].values():
+                stack.append((child, node[0]))
+    
+    def classify(self, line):
+        """Возвращает маску групп префиксов, с которых начинается строка"""
+        mask = 0
+        children = self._root[1]
+        for char in line:
+            node = children.get(char)
+            if node is None:
+                break
+            mask = node[0]
+            children = node[1]
+        return mask
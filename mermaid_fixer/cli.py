@@ -0,0 +1,278 @@
+"""
+Общий разбор аргументов и запуск скриптов исправления
+"""
+
+import argparse
+import contextlib
+import functools
+import json
+import os
+import sys
+import traceback
+
+from mermaid_fixer import batch, docx, edits, gitdiff, metrics
+from mermaid_fixer.cache import DEFAULT_CACHE, DEFAULT_MAX_BYTES
+from mermaid_fixer.manifest import DEFAULT_MANIFEST, Manifest
+
+
+def build_parser(prog, description, supports_cache=False, supports_preview=False):
+    """Создает парсер аргументов, общий для всех скриптов"""
+    parser = argparse.ArgumentParser(prog=prog, description=description,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*' if supports_preview else '+', metavar='путь',
+                        help='файл .md или .docx, каталог (обрабатывается рекурсивно) или glob-шаблон; '
+                             'с --since и --staged - необязательное ограничение путей для git')
+    parser.add_argument('--manifest', nargs='?', const=DEFAULT_MANIFEST, metavar='ФАЙЛ',
+                        help='пропускать файлы, не изменившиеся с прошлого запуска '
+                             f'(по умолчанию манифест: {DEFAULT_MANIFEST})')
+    parser.add_argument('--jobs', '-j', type=int, metavar='N',
+                        help='число процессов: в пакетном режиме - одновременно обрабатываемых файлов '
+                             '(по умолчанию: число ядер), для одного файла - частей очень большого файла '
+                             '(по умолчанию: 1)')
+    parser.add_argument('--stats', action='store_true',
+                        help='напечатать время и процессорное время этапов и счетчики исправлений')
+    parser.add_argument('--stats-json', metavar='ФАЙЛ',
+                        help='записать время этапов и счетчики в JSON (- для стандартного вывода)')
+    if supports_cache:
+        parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE, metavar='ФАЙЛ',
+                            help='постоянный кэш обработанных блоков mermaid, общий для файлов и запусков '
+                                 f'(по умолчанию: {DEFAULT_CACHE})')
+        parser.add_argument('--cache-size', type=float, default=DEFAULT_MAX_BYTES / 2**20, metavar='МБ',
+                            help='ограничение размера кэша на диске, МБ (по умолчанию: %(default)g)')
+    if supports_preview:
+        parser.add_argument('--check', action='store_true',
+                            help='не записывать файлы, а завершиться с кодом 1, если какой-то файл требует '
+                                 'исправлений (проверка останавливается на первом таком файле)')
+        output = parser.add_mutually_exclusive_group()
+        output.add_argument('--diff', action='store_true',
+                            help='не записывать файлы, а напечатать исправления в формате unified diff')
+        output.add_argument('--edits', action='store_true',
+                            help='не записывать файлы, а напечатать правки в JSON: '
+                                 '{путь: [[смещение в байтах, длина, замена], ...]}')
+        changes = parser.add_mutually_exclusive_group()
+        changes.add_argument('--since', metavar='РЕВИЗИЯ',
+                             help='обработать только файлы, измененные в git между ревизией и HEAD, и только '
+                                  'диаграммы, которых касаются изменения')
+        changes.add_argument('--staged', action='store_true',
+                             help='обработать только изменения в индексе git (для pre-commit), и только '
+                                  'диаграммы, которых касаются изменения; если какой-то файл исправлен, '
+                                  'код возврата 1: исправления остаются в рабочей копии, их нужно '
+                                  'проверить и добавить в индекс')
+    return parser
+
+
+def _report_metrics(table, json_path, data):
+    if table:
+        metrics.print_table(data)
+    if json_path:
+        metrics.write_json(data, json_path)
+
+
+def _print_diff(path, changes):
+    """Печатает изменения файла в формате unified diff; возвращает, были ли они"""
+    shift = 0
+    found = False
+    for change in changes:
+        if not found:
+            sys.stdout.write(f'--- {path}\n+++ {path}\n')
+            found = True
+        sys.stdout.writelines(change.hunks(shift))
+        shift += change.line_delta
+    return found
+
+
+def _preview(files, changes_of, diff, edits_json):
+    """
+    Режимы без записи файлов (--check, --diff, --edits): печатает изменения
+    файлов и возвращает код возврата (1 - есть файлы, требующие
+    исправлений, или ошибки)
+    
+    changes_of(path, context) генерирует изменения файла (edits.Change).
+    Без --diff и --edits проверка останавливается на первом изменении.
+    """
+    status = 0
+    spans = {}
+    for path in files:
+        try:
+            with contextlib.closing(changes_of(path, edits.CONTEXT if diff else 0)) as changes:
+                if diff:
+                    found = _print_diff(path, changes)
+                elif edits_json:
+                    file_spans = [span for change in changes for span in change.spans()]
+                    if file_spans:
+                        spans[path] = file_spans
+                    found = bool(file_spans)
+                else:
+                    found = next(changes, None) is not None
+        except Exception as e:
+            print(f"Ошибка при обработке файла {path}: {e}", file=sys.stderr)
+            status = 1
+            continue
+        
+        if found:
+            status = 1
+            if not diff and not edits_json:
+                print(f"Файл {path} требует исправлений")
+                return status
+    
+    if edits_json:
+        json.dump(spans, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write('\n')
+    return status
+
+
+def _git_changes(args, process_file, file_changes):
+    """
+    Режим --since и --staged: исправляет (или с --check, --diff, --edits -
+    проверяет) только измененные в git файлы и в них - только области,
+    которых касаются измененные строки; возвращает код возврата
+    
+    Содержимое файлов берется из проверяемой версии (индекс или HEAD) через
+    gitdiff.CatFile. Файлы, рабочая копия которых от нее отличается,
+    пропускаются. Документы Word обрабатываются целиком с диска.
+    
+    С --staged исправленные файлы не добавляются в индекс, а код возврата
+    1, если исправлен хотя бы один файл: иначе pre-commit пропустил бы в
+    коммит неисправленное содержимое индекса.
+    """
+    files = gitdiff.changed_files(args.since, args.staged, args.paths, batch.EXTENSIONS)
+    version = 'индекса' if args.staged else 'HEAD'
+    selected = {}
+    for changed in files:
+        if changed.dirty:
+            print(f"Файл {changed.path} пропущен: рабочая копия отличается от {version}", file=sys.stderr)
+        else:
+            selected[changed.path] = changed
+    if not files:
+        print("Измененных .md и .docx файлов нет")
+        return 0
+    
+    with gitdiff.CatFile() as blobs:
+        def changes_of(path, context):
+            if docx.is_docx(path):
+                return file_changes(path, context=context)
+            changed = selected[path]
+            return file_changes(path, context=context, lines=changed.lines, data=blobs.read(changed.spec))
+        
+        if args.check or args.diff or args.edits:
+            return _preview(list(selected), changes_of, args.diff, args.edits)
+        
+        status = 0
+        fixed = 0
+        for path, changed in selected.items():
+            try:
+                if docx.is_docx(path):
+                    written = process_file(path)['files_changed']
+                else:
+                    data = blobs.read(changed.spec)
+                    changes = list(file_changes(path, lines=changed.lines, data=data))
+                    if changes:
+                        edits.write_changes(path, data, changes)
+                    written = bool(changes)
+            except Exception as e:
+                print(f"Ошибка при обработке файла {path}: {e}", file=sys.stderr)
+                status = 1
+                continue
+            if written:
+                fixed += 1
+                print(f"Файл {path} исправлен")
+    print(f"Проверено файлов: {len(selected)}, исправлено: {fixed}")
+    if args.staged and fixed:
+        print("Исправления не добавлены в индекс: проверьте их и добавьте (git add)", file=sys.stderr)
+        return 1
+    return status
+
+
+def run(tool_name, version, process_file, labels, report, start_message, description=None,
+        supports_cache=False, add_options=None, file_changes=None, argv=None):
+    """
+    Запускает скрипт исправления
+    
+    process_file(path) исправляет файл и возвращает статистику,
+    report(path, stats) печатает подробный отчет по одному файлу,
+    labels - подписи счетчиков для сводки пакетного режима.
+    Один существующий файл обрабатывается с подробным отчетом, каталоги,
+    glob-шаблоны и несколько путей - в пакетном режиме.
+    Если supports_cache, process_file принимает cache_path и cache_max_bytes.
+    С --jobs для одного файла process_file вызывается с jobs (число
+    процессов для частей файла); в пакетном режиме --jobs задает размер
+    пула файлов, а каждый файл обрабатывается в одном процессе.
+    С --stats и --stats-json process_file вызывается с timing=True и должен
+    вернуть счетчики и замеры времени в ключе 'metrics' (см. Metrics.as_dict).
+    add_options(parser) добавляет собственные аргументы скрипта и возвращает
+    имена тех из них, которые передаются в process_file.
+    file_changes(path, context=...) генерирует изменения файла без записи
+    (edits.Change) для --check, --diff, --edits, --since и --staged; эти
+    аргументы есть, только если он задан. Он принимает те же собственные
+    аргументы, кэш и jobs, что и process_file (а для --since и --staged -
+    еще lines и data, см. edits.file_changes); манифест в этих режимах не
+    используется.
+    """
+    parser = build_parser(f'python {tool_name}.py', description, supports_cache, file_changes is not None)
+    file_options = add_options(parser) if add_options is not None else ()
+    args = parser.parse_args(argv)
+    git_mode = file_changes is not None and (args.since or args.staged)
+    if not args.paths and not git_mode:
+        parser.error('не указан ни один путь')
+    
+    options = {name: getattr(args, name) for name in file_options if getattr(args, name) is not None}
+    if supports_cache and args.cache:
+        options.update(cache_path=args.cache, cache_max_bytes=int(args.cache_size * 2**20))
+    if options:
+        process_file = functools.partial(process_file, **options)
+    
+    if git_mode:
+        # Только файлы и строки, измененные в git
+        sys.exit(_git_changes(args, process_file, functools.partial(file_changes, **options)))
+    
+    if file_changes is not None and (args.check or args.diff or args.edits):
+        # Проверка и просмотр изменений без записи файлов
+        if args.jobs:
+            options['jobs'] = args.jobs
+        if len(args.paths) == 1 and os.path.isfile(args.paths[0]):
+            files = args.paths
+        else:
+            files = batch.collect_markdown_files(args.paths)
+            if not files:
+                print("Ошибка: не найдено ни одного .md или .docx файла", file=sys.stderr)
+                sys.exit(1)
+        changes_of = functools.partial(file_changes, **options)
+        sys.exit(_preview(files, lambda path, context: changes_of(path, context=context), args.diff, args.edits))
+    
+    report_metrics = None
+    if args.stats or args.stats_json:
+        process_file = functools.partial(process_file, timing=True)
+        report_metrics = functools.partial(_report_metrics, args.stats, args.stats_json)
+    
+    manifest = None
+    if args.manifest:
+        manifest = Manifest.load(args.manifest, tool_name, version)
+    
+    if len(args.paths) > 1 or not os.path.isfile(args.paths[0]):
+        # Пакетный режим: каталоги, glob-шаблоны или несколько файлов
+        batch.main_batch(args.paths, process_file, labels, manifest=manifest, report_metrics=report_metrics,
+                         workers=args.jobs)
+        return
+    
+    file_path = args.paths[0]
+    if args.jobs:
+        process_file = functools.partial(process_file, jobs=args.jobs)
+    
+    if manifest is not None and manifest.is_fresh(file_path):
+        print(f"Файл {file_path} не изменился с прошлого запуска, пропущен")
+        manifest.save()
+        return
+    
+    try:
+        print(start_message)
+        stats = process_file(file_path)
+        if manifest is not None:
+            manifest.record(file_path)
+            manifest.save()
+        report(file_path, stats)
+        if report_metrics is not None:
+            report_metrics(stats['metrics'])
+    except Exception as e:
+        print(f"Ошибка при обработке файла: {e}")
+        traceback.print_exc()
+        sys.exit(1)
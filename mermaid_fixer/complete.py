@@ -0,0 +1,321 @@
+"""
+Полная стратегия: диаграммы, в том числе разорванные на части, заменяются
+эталонными версиями из библиотеки *.mmd (скрипт fix_mermaid_complete.py)
+"""
+
+import functools
+import os
+import re
+
+from mermaid_fixer import docx, edits, fastpath, passes
+from mermaid_fixer.classify import diagram_header
+from mermaid_fixer.fileio import file_lock, write_if_changed
+from mermaid_fixer.library import diagram_features, get_library, is_statement, statement_features
+from mermaid_fixer.metrics import Metrics
+
+# Имя и версия инструмента (версия меняется при изменении логики исправления)
+TOOL_NAME = 'fix_mermaid_complete'
+FIXER_VERSION = '3'
+
+# Резервная копия исправленного файла: путь файла с этим суффиксом
+BACKUP_SUFFIX = '.backup_final'
+
+# Связи A --> B и узлы A[Label]
+_NODE_LINE = re.compile(r'[A-Z_]+\s*(?:-->|\[.*\])')
+
+# Максимальная длина фрагмента диаграммы после заголовка, строк
+_MAX_FRAGMENT_LINES = 400
+
+# Строки, которые может затронуть исправление (для быстрого пути по байтам):
+# любые ``` и -->, заголовки диаграмм и все строки, которые могут быть
+# операторами диаграммы (is_statement): идентификатор со скобкой или связью
+# после него, связь в начале строки, комментарий или ключевое слово
+_CANDIDATES = (
+    re.compile(rb'```'),
+    re.compile(rb'-->'),
+    fastpath.line_start(*fastpath.header_keywords(), rb'%%', rb'-\.', rb'==>',
+                        rb'subgraph|end|class|style|linkStyle|click|direction',
+                        rb'[\w\x80-\xff]+' + fastpath.WS + rb'*(?:[\[({>&]|[<ox]?(?:--|==|-\.)|~~~)'),
+)
+
+
+def _fragment_end(lines, start):
+    """
+    Возвращает индекс строки после фрагмента диаграммы, начинающегося со строки start
+    
+    Фрагмент - идущие подряд операторы диаграммы и пустые строки между ними.
+    """
+    end = start
+    j = start
+    while j < len(lines) and j - start < _MAX_FRAGMENT_LINES:
+        stripped = lines[j].strip()
+        if stripped:
+            if not is_statement(stripped):
+                break
+            end = j + 1
+        j += 1
+    return end
+
+
+def _skip_parts(lines, start, features):
+    """
+    Пропускает пустые строки и операторы, относящиеся к эталонной диаграмме
+    """
+    i = start
+    while i < len(lines):
+        stripped = lines[i].strip()
+        if stripped:
+            node_ids = statement_features(stripped)
+            if node_ids is None or not set(node_ids) <= features:
+                break
+        i += 1
+    return i
+
+
+def _closing_fence(lines, start):
+    """
+    Индекс строки ```, закрывающей блок, который начинается перед строкой
+    start, или None, если блок не закрыт до следующего ```
+    """
+    for j in range(start, len(lines)):
+        stripped = lines[j].strip()
+        if stripped.startswith('```'):
+            return j if stripped == '```' else None
+    return None
+
+
+def _continued_after(lines, start):
+    """Есть ли со строки start (после пустых) оператор диаграммы"""
+    j = start
+    while j < len(lines) and not lines[j].strip():
+        j += 1
+    return j < len(lines) and is_statement(lines[j].strip())
+
+
+def _fragment_lines(lines, start, end):
+    """
+    Строки фрагмента start..end для сопоставления с библиотекой: если
+    фрагмент заканчивается закрывающей ```, за которой идут операторы
+    диаграммы (блок закрыт раньше времени), - вместе с ними
+    """
+    fragment = lines[start:end]
+    j = end
+    while j < len(lines) and not lines[j].strip():
+        j += 1
+    if j < len(lines) and lines[j].strip() == '```':
+        fragment += lines[j + 1:_fragment_end(lines, j + 1)]
+    return fragment
+
+
+def _is_stray(line, library):
+    """
+    Проверяет, является ли строка (без отступов) отдельной частью диаграммы
+    """
+    if not line:
+        return False
+    if _NODE_LINE.match(line) or ('Методы:' in line and '-->' in line):
+        return True
+    features = statement_features(line)
+    if features is None:
+        return False
+    # Оператор без узлов (комментарий, end, subgraph, classDef) или оператор,
+    # начинающийся с узла одной из эталонных диаграмм
+    return not features or library.knows_node(features[0])
+
+
+def fix_mermaid_complete(content, library=None, metrics=None):
+    """
+    Находит и исправляет все Mermaid диаграммы, включая разорванные на части
+    
+    Заголовок диаграммы вместе со следующим за ним фрагментом сопоставляется
+    с библиотекой эталонных диаграмм (по умолчанию - каталог diagrams), и
+    найденная диаграмма подставляется целиком. Закрытый блок ```mermaid, за
+    которым не идут операторы диаграммы, не меняется. metrics -
+    необязательный Metrics для счетчиков исправлений и времени
+    сопоставления с библиотекой.
+    """
+    if library is None:
+        library = get_library()
+    
+    lines = content.split('\n')
+    result_lines = []
+    i = 0
+    
+    while i < len(lines):
+        line = lines[i].strip()
+        
+        # Целый блок ```mermaid, после которого нет его частей, остается как есть
+        if line == '```mermaid':
+            close = _closing_fence(lines, i + 1)
+            if close is not None and not _continued_after(lines, close + 1):
+                result_lines.extend(lines[i:close + 1])
+                i = close + 1
+                continue
+        
+        # Ищем начала диаграмм и заменяем их эталонными версиями
+        if diagram_header(line) is not None:
+            features = diagram_features(_fragment_lines(lines, i, _fragment_end(lines, i + 1)))
+            if metrics is None:
+                key = library.match(features)
+            else:
+                with metrics.stage('library_match'):
+                    key = library.match(features)
+            if key is not None:
+                if metrics is not None:
+                    metrics.count('diagrams_restored')
+                i = _skip_parts(lines, i + 1, library.features(key))
+                
+                # Диаграмма уже была обернута в блок кода - заменяем его целиком
+                if (result_lines and result_lines[-1].strip() in ('```', '```mermaid') and
+                        i < len(lines) and lines[i].strip() == '```'):
+                    result_lines.pop()
+                    i = _skip_parts(lines, i + 1, frozenset())
+                
+                result_lines.append('```mermaid')
+                result_lines.append(library.text(key))
+                result_lines.append('```')
+                result_lines.append('')
+                continue
+        
+        # Пропускаем отдельные строки диаграмм, которые не были собраны в блоки
+        if _is_stray(line, library):
+            if metrics is not None:
+                metrics.count('fragments_dropped')
+        else:
+            result_lines.append(lines[i])
+        
+        i += 1
+    
+    return '\n'.join(result_lines)
+
+
+def _ends_fragment(stripped):
+    """
+    Строка без кандидатов - не оператор диаграммы, поэтому на ней
+    заканчивается любой фрагмент
+    """
+    return True
+
+
+def _block_left_open(text, fixed):
+    """
+    Проверяет, закончился ли текст внутри блока ```mermaid: его
+    закрывающие ``` (см. _closing_fence) искались бы за концом текста, а
+    незакрытый в тексте блок исправляется иначе, чем закрытый
+    """
+    for line in reversed(text.split('\n')):
+        stripped = line.strip()
+        if stripped.startswith('```'):
+            return stripped == '```mermaid'
+    return False
+
+
+# Единственный шаг исправления (см. passes): текст без заголовков и строк,
+# похожих на операторы или части диаграмм, он не меняет
+PASSES = passes.preset(
+    'complete',
+    passes.Pass('fix_mermaid_complete', fix_mermaid_complete, requires=('part',)),
+)
+
+
+def fix_content(content, library=None, metrics=None):
+    """
+    Исправляет текст (fix_mermaid_complete с замером времени этапа, если в
+    тексте есть что исправлять)
+    """
+    if metrics is not None:
+        metrics.count('lines_scanned', content.count('\n') + 1)
+    return passes.run(PASSES, content, metrics, library=library)
+
+
+def fix_file(file_path, backup_path=None, library=None, metrics=None, jobs=None):
+    """
+    Исправляет файл на месте и возвращает словарь с ключами changed,
+    mermaid_before и mermaid_after
+    
+    Файл перезаписывается (атомарно, с резервной копией backup_path, если
+    она задана) только если исправление что-то меняет. library - библиотека
+    эталонных диаграмм (по умолчанию - каталог diagrams), jobs - число
+    процессов для исправления частей очень большого файла (см.
+    fastpath.fix_mapped). В документе Word (.docx) исправляется текст
+    абзацев (см. docx.fix_docx), jobs для него не используется.
+    """
+    if metrics is None:
+        metrics = Metrics()
+    if library is None:
+        with metrics.stage('load_library'):
+            library = get_library()
+    
+    with file_lock(file_path):
+        metrics.count('bytes_read', os.path.getsize(file_path))
+        
+        fix = functools.partial(fix_content, library=library)
+        if docx.is_docx(file_path):
+            # Документ Word: исправляется текст абзацев word/document.xml
+            result = docx.fix_docx(file_path, fix, backup_path, metrics)
+        else:
+            # Большие файлы: исправляются только области вокруг найденных по
+            # байтам кандидатов, остальное копируется без декодирования
+            result = fastpath.fix_mapped(file_path, fix, _CANDIDATES, _ends_fragment, _block_left_open,
+                                         backup_path=backup_path, metrics=metrics, jobs=jobs)
+        
+        if result is None:
+            # Читаем исходный файл
+            with metrics.stage('read'):
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    original_content = f.read()
+            
+            # Исправляем содержимое и записываем исправленный файл
+            fixed_content = fix_content(original_content, library, metrics)
+            with metrics.stage('write'):
+                changed = write_if_changed(file_path, original_content, fixed_content, backup_path)
+            result = {
+                'changed': changed,
+                'mermaid_before': original_content.count('```mermaid'),
+                'mermaid_after': fixed_content.count('```mermaid'),
+            }
+        
+        if result['changed']:
+            metrics.count('bytes_written', os.path.getsize(file_path))
+    
+    return result
+
+
+def file_changes(file_path, library_path=None, jobs=None, context=0, lines=None, data=None):
+    """
+    Генерирует изменения (edits.Change), которые fix_file внес бы в файл,
+    не записывая его
+
+    library_path - каталог эталонных диаграмм (по умолчанию - diagrams),
+    context, lines и data - см. edits.file_changes.
+    """
+    library = get_library(library_path) if library_path else get_library()
+    return edits.file_changes(file_path, functools.partial(fix_content, library=library), _CANDIDATES,
+                              _ends_fragment, _block_left_open, jobs=jobs, context=context, lines=lines, data=data)
+
+
+def process_file(file_path, library_path=None, jobs=None, timing=False):
+    """
+    Исправляет один файл (с резервной копией) и возвращает статистику
+    
+    library_path - каталог эталонных диаграмм (по умолчанию - diagrams),
+    jobs - число процессов для частей очень большого файла.
+    Счетчики исправлений возвращаются в ключе 'metrics', с timing - вместе
+    с временем этапов.
+    """
+    backup_path = file_path + BACKUP_SUFFIX
+    metrics = Metrics(timing)
+    library = None
+    if library_path:
+        with metrics.stage('load_library'):
+            library = get_library(library_path)
+    result = fix_file(file_path, backup_path, library, metrics, jobs)
+    
+    return {
+        'backup_path': backup_path if result['changed'] else None,
+        'files_changed': int(result['changed']),
+        'mermaid_before': result['mermaid_before'],
+        'mermaid_after': result['mermaid_after'],
+        'mermaid_restored': max(0, result['mermaid_after'] - result['mermaid_before']),
+        'metrics': metrics.as_dict(),
+    }
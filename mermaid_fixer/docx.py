@@ -0,0 +1,521 @@
+"""
+Исправление Mermaid диаграмм в документах Word (.docx) без распаковки
+
+Документ .docx - ZIP-архив, текст которого хранится в word/document.xml.
+Эта часть разбирается потоково (expat, по частям): каждый абзац (w:p)
+становится строкой текста - содержимым его элементов w:t, а для абзацев
+и элементов w:t запоминаются их смещения в байтах XML. Текст из строк
+исправляется той же функцией, что и Markdown, и изменения переносятся
+обратно в XML: измененные строки - правкой только затронутых w:t (с
+сохранением оформления остальных), удаленные - удалением абзацев,
+добавленные - новыми абзацами. Остальные байты XML копируются как есть.
+
+Архив пересобирается с заменой одной части: все остальные элементы
+(изображения, стили и т.д.), их заголовки и записи центрального каталога
+копируются байт в байт частями, поэтому память не зависит от размера
+встроенных изображений. Табуляции и переносы внутри абзаца (w:tab, w:br)
+в текст строки не входят и остаются на своих местах.
+"""
+
+import contextlib
+import difflib
+import struct
+import xml.parsers.expat
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+from mermaid_fixer.fileio import AtomicFile
+
+# Часть архива с текстом документа
+DOCUMENT_PART = 'word/document.xml'
+
+# Пространства имен WordprocessingML (обычное и Strict) и совместимости разметки
+_WORD_NAMESPACES = (
+    'http://schemas.openxmlformats.org/wordprocessingml/2006/main',
+    'http://purl.oclc.org/ooxml/wordprocessingml/main',
+)
+_FALLBACK = 'http://schemas.openxmlformats.org/markup-compatibility/2006 Fallback'
+
+# Размер частей при разборе и копировании
+_CHUNK = 64 * 1024
+
+# Сколько последних байт разобранного XML хранится для определения конца
+# абзаца (закрывающий тег или пустой элемент <w:p/>)
+_TAIL = 256
+
+# Записи ZIP: локальный заголовок, запись центрального каталога и его конец
+_LOCAL_HEADER = struct.Struct('<4s5H3I2H')
+_CENTRAL_ENTRY = struct.Struct('<4s6H3I5H2I')
+_END_RECORD = struct.Struct('<4s4H2IH')
+_CENTRAL_SIGNATURE = b'PK\x01\x02'
+_END_SIGNATURE = b'PK\x05\x06'
+_ZIP64_LOCATOR_SIGNATURE = b'PK\x06\x07'
+
+# Бит 3 флагов: размеры и CRC записаны после данных (в описателе данных)
+_DATA_DESCRIPTOR_FLAG = 0x08
+
+
+def is_docx(path):
+    """Проверяет, является ли файл документом Word по расширению"""
+    return path.lower().endswith('.docx')
+
+
+class _Paragraph:
+    """
+    Абзац document.xml: начало и конец в байтах, куски текста (элементы
+    w:t с текстом) и позиция закрывающего тега (None у пустого элемента)
+
+    Кусок - список [начало тега, начало текста, конец текста, текст,
+    сохраняются ли пробелы (xml:space="preserve")].
+    """
+
+    __slots__ = ('start', 'end', 'pieces', 'close', 'nested')
+
+    def __init__(self, start):
+        self.start = start
+        self.end = None
+        self.pieces = []
+        self.close = None
+        self.nested = False
+
+    @property
+    def text(self):
+        return ''.join(piece[3] for piece in self.pieces)
+
+
+class _DocumentReader:
+    """Потоковый разбор document.xml в абзацы"""
+
+    def __init__(self):
+        self.paragraphs = []
+        self.prefix = None
+        self._word = None
+        self._open = []
+        self._piece = None
+        self._fallback = 0
+        self._close_tag = None
+        self._tail = b''
+        self._tail_start = 0
+        self._consumed = 0
+        self._parser = xml.parsers.expat.ParserCreate(namespace_separator=' ')
+        self._parser.StartNamespaceDeclHandler = self._namespace
+        self._parser.StartElementHandler = self._start
+        self._parser.EndElementHandler = self._end
+        self._parser.CharacterDataHandler = self._characters
+
+    def read(self, stream):
+        for chunk in iter(lambda: stream.read(_CHUNK), b''):
+            self._tail = self._tail[-_TAIL:] + chunk
+            self._consumed += len(chunk)
+            self._tail_start = self._consumed - len(self._tail)
+            self._parser.Parse(chunk, False)
+        self._parser.Parse(b'', True)
+        return self.paragraphs
+
+    def _namespace(self, prefix, uri):
+        if uri in _WORD_NAMESPACES and self._word is None:
+            self._word = uri
+            self.prefix = prefix
+            self._close_tag = ('</' + _name(prefix, 'p')).encode('utf-8')
+
+    def _start(self, name, attributes):
+        index = self._parser.CurrentByteIndex
+        if name == _FALLBACK:
+            self._fallback += 1
+            return
+        if self._fallback or self._word is None:
+            return
+        if name == self._word + ' p':
+            if self._open:
+                self._open[-1].nested = True
+            paragraph = _Paragraph(index)
+            self.paragraphs.append(paragraph)
+            self._open.append(paragraph)
+        elif name == self._word + ' t' and self._open:
+            preserve = attributes.get('http://www.w3.org/XML/1998/namespace space') == 'preserve'
+            self._piece = [index, None, None, '', preserve]
+
+    def _characters(self, data):
+        piece = self._piece
+        if piece is None:
+            return
+        if piece[1] is None:
+            piece[1] = self._parser.CurrentByteIndex
+        piece[3] += data
+
+    def _end(self, name):
+        index = self._parser.CurrentByteIndex
+        if name == _FALLBACK:
+            self._fallback -= 1
+            return
+        if self._fallback or self._word is None:
+            return
+        if name == self._word + ' t' and self._piece is not None:
+            piece = self._piece
+            self._piece = None
+            if piece[1] is not None:
+                piece[2] = index
+                self._open[-1].pieces.append(piece)
+        elif name == self._word + ' p' and self._open:
+            paragraph = self._open.pop()
+            # Закрывающий тег начинается с index; у пустого элемента <w:p/>
+            # index - позиция сразу после него (и за ним не может идти </w:p>)
+            offset = index - self._tail_start
+            after = offset + len(self._close_tag)
+            if self._tail.startswith(self._close_tag, offset) and self._tail[after:after + 1] in b'> \t\r\n':
+                paragraph.close = index
+                paragraph.end = self._tail_start + self._tail.index(b'>', offset) + 1
+            else:
+                paragraph.close = None
+                paragraph.end = index
+
+
+def read_paragraphs(stream):
+    """
+    Разбирает document.xml из потока байт и возвращает (абзацы, префикс
+    пространства имен WordprocessingML)
+
+    Абзацы в mc:Fallback (копии содержимого mc:Choice) пропускаются.
+    """
+    reader = _DocumentReader()
+    paragraphs = reader.read(stream)
+    return paragraphs, reader.prefix
+
+
+def _name(prefix, local):
+    return f'{prefix}:{local}' if prefix else local
+
+
+def _run(prefix, text):
+    """Новый фрагмент (w:r) с текстом"""
+    t = _name(prefix, 't')
+    return f'<{_name(prefix, "r")}><{t} xml:space="preserve">{escape(text)}</{t}></{_name(prefix, "r")}>'
+
+
+def _new_paragraph(prefix, text):
+    p = _name(prefix, 'p')
+    if not text:
+        return f'<{p}/>'.encode('utf-8')
+    return f'<{p}>{_run(prefix, text)}</{p}>'.encode('utf-8')
+
+
+def _text_edits(paragraph, text, prefix):
+    """
+    Правки XML, заменяющие текст абзаца на text: меняются только куски,
+    затронутые отличием от старого текста (общие начало и конец
+    сохраняются)
+    """
+    pieces = paragraph.pieces
+    if paragraph.text == text:
+        return []
+    if not pieces:
+        if paragraph.close is not None:
+            return [(paragraph.close, paragraph.close, _run(prefix, text).encode('utf-8'))]
+        # Пустой элемент <w:p/> заменяется абзацем с текстом
+        return [(paragraph.start, paragraph.end, _new_paragraph(prefix, text))]
+
+    old = paragraph.text
+    prefix_length = 0
+    limit = min(len(old), len(text))
+    while prefix_length < limit and old[prefix_length] == text[prefix_length]:
+        prefix_length += 1
+    suffix_length = 0
+    while (suffix_length < limit - prefix_length and
+           old[len(old) - 1 - suffix_length] == text[len(text) - 1 - suffix_length]):
+        suffix_length += 1
+    changed_end = len(old) - suffix_length
+    inserted = text[prefix_length:len(text) - suffix_length]
+
+    # Вставленный текст дописывается к куску, в котором начинается отличие
+    # (при чистой вставке на границе кусков - к предыдущему)
+    anchor = None
+    position = 0
+    for k, piece in enumerate(pieces):
+        end = position + len(piece[3])
+        if position <= prefix_length < end or (prefix_length == end and prefix_length == changed_end):
+            anchor = k
+            break
+        position = end
+    if anchor is None:
+        anchor = len(pieces) - 1
+
+    edits = []
+    position = 0
+    for k, piece in enumerate(pieces):
+        tag_start, text_start, text_end, piece_text, preserve = piece
+        length = len(piece_text)
+        cut_start = min(max(prefix_length - position, 0), length)
+        cut_end = min(max(changed_end - position, 0), length)
+        position += length
+        new_text = piece_text[:cut_start] + (inserted if k == anchor else '') + piece_text[cut_end:]
+        if new_text == piece_text:
+            continue
+        if not preserve and new_text != new_text.strip():
+            # Пробелы по краям сохраняются только с xml:space="preserve"
+            t = _name(prefix, 't')
+            edits.append((tag_start, text_end, f'<{t} xml:space="preserve">{escape(new_text)}'.encode('utf-8')))
+        else:
+            edits.append((text_start, text_end, escape(new_text).encode('utf-8')))
+    return edits
+
+
+def _delete_edits(paragraph, prefix):
+    """Правки, удаляющие абзац (абзац с вложенными абзацами только очищается)"""
+    if paragraph.nested:
+        return _text_edits(paragraph, '', prefix)
+    return [(paragraph.start, paragraph.end, b'')]
+
+
+def document_edits(paragraphs, fixed_lines, prefix):
+    """
+    Правки XML (начало, конец, новые байты), превращающие текст абзацев в
+    строки fixed_lines, в порядке возрастания начала
+
+    Строки сопоставляются с абзацами построчным сравнением
+    (difflib.SequenceMatcher) после отбрасывания общих начала и конца.
+    """
+    lines = [paragraph.text for paragraph in paragraphs]
+    head = 0
+    while head < min(len(lines), len(fixed_lines)) and lines[head] == fixed_lines[head]:
+        head += 1
+    tail = 0
+    while (tail < min(len(lines), len(fixed_lines)) - head and
+           lines[len(lines) - 1 - tail] == fixed_lines[len(fixed_lines) - 1 - tail]):
+        tail += 1
+
+    matcher = difflib.SequenceMatcher(None, lines[head:len(lines) - tail],
+                                      fixed_lines[head:len(fixed_lines) - tail], autojunk=False)
+    edits = []
+
+    def insert(before, new_lines):
+        # Новые абзацы - после предыдущего абзаца (или перед первым)
+        if before > 0:
+            position = paragraphs[before - 1].end
+        else:
+            position = paragraphs[0].start
+        data = b''.join(_new_paragraph(prefix, line) for line in new_lines)
+        edits.append((position, position, data))
+
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        i1, i2, j1, j2 = i1 + head, i2 + head, j1 + head, j2 + head
+        if tag == 'equal':
+            continue
+        paired = min(i2 - i1, j2 - j1)
+        for k in range(paired):
+            edits.extend(_text_edits(paragraphs[i1 + k], fixed_lines[j1 + k], prefix))
+        for k in range(i1 + paired, i2):
+            edits.extend(_delete_edits(paragraphs[k], prefix))
+        if j1 + paired < j2:
+            insert(i1 + paired, fixed_lines[j1 + paired:j2])
+
+    edits.sort(key=lambda edit: edit[0])
+    return edits
+
+
+def _copy(src, length, write):
+    while length > 0:
+        chunk = src.read(min(length, _CHUNK))
+        if not chunk:
+            raise EOFError("Неожиданный конец данных")
+        write(chunk)
+        length -= len(chunk)
+
+
+def _splice(stream, edits, write):
+    """Копирует поток в write, применяя правки (начало, конец, новые байты)"""
+    position = 0
+    for start, end, data in edits:
+        _copy(stream, start - position, write)
+        write(data)
+        _copy(stream, end - start, lambda chunk: None)
+        position = end
+    for chunk in iter(lambda: stream.read(_CHUNK), b''):
+        write(chunk)
+
+
+def _read_directory(f):
+    """
+    Читает центральный каталог ZIP: (записи - сырые байты, конец каталога
+    - сырые байты, смещение каталога)
+    """
+    f.seek(0, 2)
+    size = f.tell()
+    tail_size = min(size, _END_RECORD.size + 0xFFFF)
+    f.seek(size - tail_size)
+    tail = f.read(tail_size)
+    at = tail.rfind(_END_SIGNATURE)
+    if at == -1 or len(tail) - at < _END_RECORD.size:
+        raise zipfile.BadZipFile("Не найден конец центрального каталога")
+    if tail[max(at - 20, 0):at - 16] == _ZIP64_LOCATOR_SIGNATURE:
+        raise zipfile.LargeZipFile("Архивы ZIP64 не поддерживаются")
+    end_record = tail[at:]
+    _, _, _, _, count, directory_size, directory_offset, _ = _END_RECORD.unpack_from(end_record)
+
+    f.seek(directory_offset)
+    directory = f.read(directory_size)
+    entries = []
+    position = 0
+    for _ in range(count):
+        fields = _CENTRAL_ENTRY.unpack_from(directory, position)
+        if fields[0] != _CENTRAL_SIGNATURE:
+            raise zipfile.BadZipFile("Поврежден центральный каталог")
+        length = _CENTRAL_ENTRY.size + fields[10] + fields[11] + fields[12]
+        entries.append(directory[position:position + length])
+        position += length
+    return entries, end_record, directory_offset
+
+
+def _entry_name(entry):
+    fields = _CENTRAL_ENTRY.unpack_from(entry)
+    name = entry[_CENTRAL_ENTRY.size:_CENTRAL_ENTRY.size + fields[10]]
+    return name.decode('utf-8' if fields[3] & 0x800 else 'cp437')
+
+
+def _entry_offset(entry):
+    return _CENTRAL_ENTRY.unpack_from(entry)[-1]
+
+
+def _write_part(src, entry, stream, edits, out):
+    """
+    Записывает в out элемент архива с данными stream, измененными правками
+    edits, и возвращает его запись центрального каталога
+
+    Локальный заголовок копируется из исходного архива; метод сжатия тот же
+    (без сжатия или deflate), размеры и CRC записываются в заголовок.
+    """
+    fields = list(_CENTRAL_ENTRY.unpack_from(entry))
+    method = fields[4]
+    if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+        raise ValueError(f"Метод сжатия {method} части {DOCUMENT_PART} не поддерживается")
+
+    src.seek(fields[-1])
+    header = bytearray(src.read(_LOCAL_HEADER.size))
+    local = list(_LOCAL_HEADER.unpack_from(header))
+    header += src.read(local[9] + local[10])
+    header_offset = out.tell()
+    out.write(header)
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15) if method == zipfile.ZIP_DEFLATED else None
+    crc = 0
+    size = 0
+    compressed_size = 0
+
+    def write(chunk):
+        nonlocal crc, size, compressed_size
+        crc = zlib.crc32(chunk, crc)
+        size += len(chunk)
+        if compressor is not None:
+            chunk = compressor.compress(chunk)
+        compressed_size += len(chunk)
+        out.write(chunk)
+
+    _splice(stream, edits, write)
+    if compressor is not None:
+        chunk = compressor.flush()
+        compressed_size += len(chunk)
+        out.write(chunk)
+    if size >= 0xFFFFFFFF or compressed_size >= 0xFFFFFFFF:
+        raise zipfile.LargeZipFile("Архивы ZIP64 не поддерживаются")
+
+    end = out.tell()
+    local[2] &= ~_DATA_DESCRIPTOR_FLAG
+    local[6:9] = crc, compressed_size, size
+    out.seek(header_offset)
+    out.write(_LOCAL_HEADER.pack(*local))
+    out.seek(end)
+
+    fields[3] &= ~_DATA_DESCRIPTOR_FLAG
+    fields[7:10] = crc, compressed_size, size
+    fields[-1] = header_offset
+    return _CENTRAL_ENTRY.pack(*fields) + entry[_CENTRAL_ENTRY.size:]
+
+
+def _with_offset(entry, offset):
+    fields = list(_CENTRAL_ENTRY.unpack_from(entry))
+    fields[-1] = offset
+    return _CENTRAL_ENTRY.pack(*fields) + entry[_CENTRAL_ENTRY.size:]
+
+
+def _rebuild(path, target, edits):
+    """
+    Записывает в target (AtomicFile) архив path, в котором document.xml
+    изменен правками edits, а остальные элементы скопированы байт в байт
+    """
+    out = target.file
+    with open(path, 'rb') as src, zipfile.ZipFile(path) as archive:
+        entries, end_record, directory_offset = _read_directory(src)
+        members = sorted(entries, key=_entry_offset)
+        new_entries = {}
+
+        src.seek(0)
+        _copy(src, _entry_offset(members[0]) if members else directory_offset, out.write)
+        for k, entry in enumerate(members):
+            offset = _entry_offset(entry)
+            end = _entry_offset(members[k + 1]) if k + 1 < len(members) else directory_offset
+            if _entry_name(entry) == DOCUMENT_PART:
+                with archive.open(DOCUMENT_PART) as stream:
+                    new_entries[offset] = _write_part(src, entry, stream, edits, out)
+            else:
+                new_entries[offset] = _with_offset(entry, out.tell())
+                src.seek(offset)
+                _copy(src, end - offset, out.write)
+
+        directory_start = out.tell()
+        for entry in entries:
+            out.write(new_entries[_entry_offset(entry)])
+        fields = list(_END_RECORD.unpack_from(end_record))
+        fields[5] = out.tell() - directory_start
+        fields[6] = directory_start
+        out.write(_END_RECORD.pack(*fields) + end_record[_END_RECORD.size:])
+
+
+def _read_document(path):
+    with zipfile.ZipFile(path) as archive:
+        with archive.open(DOCUMENT_PART) as stream:
+            return read_paragraphs(stream)
+
+
+def document_text(path):
+    """Текст абзацев документа Word по строке на абзац (то, что исправляет fix_docx)"""
+    paragraphs, _ = _read_document(path)
+    return '\n'.join(paragraph.text for paragraph in paragraphs)
+
+
+def fix_docx(path, fix, backup_path=None, metrics=None):
+    """
+    Исправляет диаграммы в тексте абзацев документа Word на месте и
+    возвращает словарь с ключами changed, mermaid_before и mermaid_after
+
+    fix(text, metrics=None) - функция исправления текста (например,
+    fix_content стратегии), metrics - необязательный Metrics (этапы read и
+    write - разбор document.xml и пересборка архива). Файл перезаписывается
+    (атомарно, с резервной копией backup_path) только если текст изменился.
+    """
+    def stage(name):
+        return metrics.stage(name) if metrics is not None else contextlib.nullcontext()
+
+    with stage('read'):
+        paragraphs, prefix = _read_document(path)
+    text = '\n'.join(paragraph.text for paragraph in paragraphs)
+
+    fixed = fix(text, metrics=metrics)
+    result = {
+        'changed': False,
+        'mermaid_before': text.count('```mermaid'),
+        'mermaid_after': fixed.count('```mermaid'),
+    }
+    if fixed == text or not paragraphs:
+        result['mermaid_after'] = result['mermaid_before']
+        return result
+
+    with stage('write'):
+        edits = document_edits(paragraphs, fixed.split('\n'), prefix)
+        target = AtomicFile(path, binary=True)
+        try:
+            _rebuild(path, target, edits)
+            target.commit(backup_path)
+        finally:
+            target.discard()
+    result['changed'] = True
+    return result
@@ -0,0 +1,361 @@
+"""
+Изменения файла без записи: правки и unified diff (--check, --diff, --edits)
+
+Быстрый путь (fastpath.changed_regions) находит только измененные области
+файла, поэтому исправленный текст целиком не собирается: каждая область
+сравнивается построчно сама по себе, и из нее получаются правки
+(смещение, длина, замена) и части unified diff. Смещения и длины правок -
+в байтах UTF-8 исходного файла. Для документа Word (.docx) сравнивается
+текст абзацев (см. docx.document_text), и смещения отсчитываются в нем.
+"""
+
+import difflib
+import mmap
+import os
+
+from mermaid_fixer import docx, fastpath, spans
+from mermaid_fixer.fileio import AtomicFile
+
+# Строк контекста в unified diff
+CONTEXT = 3
+
+# Размер частей при подсчете строк между областями
+_CHUNK = 1 << 20
+
+
+def _split_lines(text):
+    """Строки текста вместе с '\\n' (у последней - если он есть)"""
+    lines = text.split('\n')
+    last = lines.pop()
+    result = [line + '\n' for line in lines]
+    if last:
+        result.append(last)
+    return result
+
+
+def _common_prefix(a, b):
+    length = 0
+    limit = min(len(a), len(b))
+    while length < limit and a[length] == b[length]:
+        length += 1
+    return length
+
+
+def _common_suffix(a, b, limit):
+    length = 0
+    while length < limit and a[len(a) - 1 - length] == b[len(b) - 1 - length]:
+        length += 1
+    return length
+
+
+def _format_range(start, length):
+    """Диапазон строк заголовка @@ (как в difflib.unified_diff)"""
+    beginning = start + 1
+    if length == 1:
+        return f'{beginning}'
+    if not length:
+        beginning -= 1
+    return f'{beginning},{length}'
+
+
+class Change:
+    """
+    Измененная часть файла из целых строк
+
+    offset - смещение начала первой строки в байтах, line - ее номер (с 0),
+    old и new - исходный и исправленный текст этих строк.
+    """
+
+    __slots__ = ('offset', 'line', 'old', 'new')
+
+    def __init__(self, offset, line, old, new):
+        self.offset = offset
+        self.line = line
+        self.old = old
+        self.new = new
+
+    def _matcher(self):
+        old_lines = _split_lines(self.old)
+        new_lines = _split_lines(self.new)
+        return old_lines, new_lines, difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+
+    def spans(self):
+        """
+        Правки [смещение, длина, замена]: строки сравниваются построчно, а у
+        каждой группы замененных строк отбрасываются общие начало и конец
+        """
+        old_lines, new_lines, matcher = self._matcher()
+        result = []
+        position = self.offset
+        consumed = 0
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                continue
+            position += sum(len(line.encode('utf-8')) for line in old_lines[consumed:i1])
+            old = ''.join(old_lines[i1:i2])
+            new = ''.join(new_lines[j1:j2])
+            head = _common_prefix(old, new)
+            tail = _common_suffix(old, new, min(len(old), len(new)) - head)
+            removed = old[head:len(old) - tail]
+            result.append([position + len(old[:head].encode('utf-8')), len(removed.encode('utf-8')),
+                           new[head:len(new) - tail]])
+            position += len(old.encode('utf-8'))
+            consumed = i2
+        return result
+
+    def hunks(self, shift=0, context=CONTEXT):
+        """
+        Строки частей unified diff (@@ ... @@ и строки с ' ', '-', '+')
+
+        shift - на сколько строк сдвинуто начало изменения в исправленном
+        файле из-за предыдущих изменений.
+        """
+        old_lines, new_lines, matcher = self._matcher()
+        for group in matcher.get_grouped_opcodes(context):
+            i1, i2, j1, j2 = group[0][1], group[-1][2], group[0][3], group[-1][4]
+            yield (f'@@ -{_format_range(self.line + i1, i2 - i1)} '
+                   f'+{_format_range(self.line + shift + j1, j2 - j1)} @@\n')
+            for tag, a1, a2, b1, b2 in group:
+                if tag == 'equal':
+                    lines = [(' ', line) for line in old_lines[a1:a2]]
+                else:
+                    lines = [('-', line) for line in old_lines[a1:a2]] + [('+', line) for line in new_lines[b1:b2]]
+                for mark, line in lines:
+                    yield mark + line
+                    if not line.endswith('\n'):
+                        yield '\n\\ No newline at end of file\n'
+
+    @property
+    def line_delta(self):
+        """Изменение числа строк"""
+        return self.new.count('\n') - self.old.count('\n')
+
+
+def _count_lines(data, start, end):
+    count = 0
+    while start < end:
+        chunk_end = min(start + _CHUNK, end)
+        count += data[start:chunk_end].count(b'\n')
+        start = chunk_end
+    return count
+
+
+def _line_offsets(data, numbers):
+    """
+    Смещения начал строк с номерами numbers (с 1, по возрастанию); для
+    строк за концом данных - len(data)
+    """
+    offsets = []
+    line = 1
+    position = 0
+    for number in numbers:
+        # Целые части без нужной строки пропускаются подсчетом переводов строк
+        while line < number and position < len(data):
+            chunk_end = min(position + _CHUNK, len(data))
+            count = data[position:chunk_end].count(b'\n')
+            if line + count >= number:
+                break
+            line += count
+            position = chunk_end
+        while line < number and position < len(data):
+            newline = data.find(b'\n', position)
+            position = len(data) if newline == -1 else newline + 1
+            line += 1
+        offsets.append(position)
+    return offsets
+
+
+def _byte_ranges(data, lines):
+    """
+    Диапазоны байтов строк lines - пар (первая строка с 1, число строк), как
+    в заголовках частей git diff; у удаления (0 строк) берутся строки до и
+    после него. Пересекающиеся и соседние диапазоны объединяются.
+    """
+    bounds = []
+    for first, count in lines:
+        if count == 0:
+            first, count = max(first, 1), 2 if first else 1
+        bounds.append((first, first + count))
+    bounds.sort()
+    numbers = sorted({line for bound in bounds for line in bound})
+    positions = dict(zip(numbers, _line_offsets(data, numbers)))
+    ranges = []
+    for first, end in bounds:
+        start, stop = positions[first], positions[end]
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], stop))
+        elif start < stop:
+            ranges.append((start, stop))
+    return ranges
+
+
+def _coalesced(regions):
+    """Соединяет соседние области (конец одной - начало следующей)"""
+    pending = None
+    for start, end, old, fixed in regions:
+        if pending is not None and pending[1] == start:
+            pending = (pending[0], end, pending[2] + old, pending[3] + fixed)
+            continue
+        if pending is not None:
+            yield pending
+        pending = (start, end, old, fixed)
+    if pending is not None:
+        yield pending
+
+
+def _end(change):
+    return change.offset + len(change.old.encode('utf-8'))
+
+
+def _with_leading(data, change, context):
+    start = change.offset
+    lines = 0
+    while lines < context and start > 0:
+        start = data.rfind(b'\n', 0, start - 1) + 1
+        lines += 1
+    prefix = data[start:change.offset].decode('utf-8')
+    return Change(start, change.line - lines, prefix + change.old, prefix + change.new)
+
+
+def _with_trailing(data, change, context):
+    start = end = _end(change)
+    for _ in range(context):
+        if end == len(data):
+            break
+        newline = data.find(b'\n', end)
+        end = len(data) if newline == -1 else newline + 1
+    suffix = data[start:end].decode('utf-8')
+    return Change(change.offset, change.line, change.old + suffix, change.new + suffix)
+
+
+def _with_context(data, changes, context):
+    """
+    Добавляет к изменениям до context неизмененных строк до и после них;
+    изменения, между которыми не больше 2 * context строк, объединяются
+    """
+    pending = None
+    for change in changes:
+        if pending is not None:
+            if change.line - pending.line - pending.old.count('\n') <= 2 * context:
+                between = data[_end(pending):change.offset].decode('utf-8')
+                pending = Change(pending.offset, pending.line, pending.old + between + change.old,
+                                 pending.new + between + change.new)
+                continue
+            yield _with_trailing(data, pending, context)
+        pending = _with_leading(data, change, context)
+    if pending is not None:
+        yield _with_trailing(data, pending, context)
+
+
+def _mapped_changes(data, fix, patterns, closes, is_open, lookback, metrics, jobs, worker_fix, ranges, whole):
+    """
+    Изменения файла по областям быстрого пути
+
+    Область начинается с перевода строки перед первой строкой и
+    заканчивается перед переводом строки после последней; изменение
+    расширяется до целых строк. Если исправитель удалил все строки до
+    конца файла вместе с переводом строки перед ними, в изменение входит и
+    предыдущая строка.
+    """
+    regions = ((start, end, data[start:end].decode('utf-8'), fixed)
+               for start, end, fixed, _ in fastpath.changed_regions(data, fix, patterns, closes, is_open,
+                                                                    lookback, metrics, jobs, worker_fix, ranges,
+                                                                    whole))
+    line = 0
+    counted = 0
+    for start, end, old, fixed in _coalesced(regions):
+        keep_newline = True
+        if old.startswith('\n'):
+            if fixed.startswith('\n'):
+                old, fixed, start = old[1:], fixed[1:], start + 1
+            elif not fixed and end < len(data):
+                old, start = old[1:], start + 1
+                keep_newline = False
+            else:
+                previous = data.rfind(b'\n', 0, start) + 1
+                head = data[previous:start].decode('utf-8')
+                old, fixed, start = head + old, head + fixed, previous
+        if end < len(data):
+            old += '\n'
+            if keep_newline:
+                fixed += '\n'
+
+        line += _count_lines(data, counted, start)
+        counted = start
+        yield Change(start, line, old, fixed)
+
+
+def _data_changes(data, fix, patterns, closes, is_open, lookback, metrics, jobs, worker_fix, context, lines,
+                  whole):
+    """Изменения непустых данных data (байты или mmap), см. file_changes"""
+    if data.find(b'\r') == -1:
+        ranges = _byte_ranges(data, lines) if lines is not None else None
+        changes = _mapped_changes(data, fix, patterns, closes, is_open, lookback, metrics, jobs, worker_fix,
+                                  ranges, whole)
+        yield from _with_context(data, changes, context) if context else changes
+        return
+
+    raw = data[:].decode('utf-8')
+    text = raw.replace('\r\n', '\n').replace('\r', '\n')
+    fixed = fix(text, metrics=metrics)
+    if fixed != text:
+        yield Change(0, 0, raw, fixed)
+
+
+def file_changes(path, fix, patterns, closes, is_open=None, lookback=0, metrics=None, jobs=None, worker_fix=None,
+                 context=0, lines=None, data=None, whole=None):
+    """
+    Генерирует изменения (Change), которые исправление внесло бы в файл,
+    не записывая его
+
+    Аргументы (и whole) - как у fastpath.fix_mapped. Изменения идут в порядке
+    следования и не пересекаются; генератор можно прервать на первом.
+    context - сколько неизмененных строк файла добавить до и после каждого
+    изменения (для unified diff, см. Change.hunks). lines - необязательные
+    измененные строки парами (первая строка с 1, число строк), как в
+    заголовках частей git diff: исправляются только области быстрого пути,
+    которые их касаются. data - содержимое файла (байты), если его нужно
+    взять не с диска, а, например, из индекса git. Файл с переводами строк
+    '\\r' (запись заменила бы их на '\\n') и документ Word сравниваются
+    целиком одним изменением (lines не используется, документ Word всегда
+    читается с диска).
+    """
+    if docx.is_docx(path):
+        text = docx.document_text(path)
+        fixed = fix(text, metrics=metrics)
+        if fixed != text:
+            yield Change(0, 0, text, fixed)
+        return
+
+    arguments = (fix, patterns, closes, is_open, lookback, metrics, jobs, worker_fix, context, lines, whole)
+    if data is not None:
+        if data:
+            yield from _data_changes(data, *arguments)
+        return
+
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield from _data_changes(data, *arguments)
+
+
+def write_changes(path, data, changes, backup_path=None):
+    """
+    Записывает в path данные data (байты) с изменениями changes (Change по
+    порядку, не пересекаются) атомарно, с резервной копией backup_path, если
+    она задана
+    """
+    target = AtomicFile(path, binary=True)
+    try:
+        writer = spans.SpanWriter(target.file, data)
+        try:
+            for change in changes:
+                for edit in spans.narrow(data, change.offset, _end(change), change.new):
+                    writer.edit(*edit)
+            writer.close()
+        finally:
+            writer.discard()
+        target.commit(backup_path)
+    finally:
+        target.discard()
@@ -0,0 +1,425 @@
+"""
+Быстрый путь для больших файлов: поиск кандидатов по байтам через mmap
+
+Файл отображается в память, и строки, которые могут заинтересовать
+исправитель (кандидаты), ищутся регулярными выражениями по байтам, без
+декодирования. Декодируются и исправляются только области вокруг
+кандидатов, остальные байты копируются как есть. Файл без кандидатов не
+декодируется вовсе. Из исправленной области записываются только
+измененные строки, остальное - срезами отображения (см. spans).
+
+Область начинается со строки первого кандидата и заканчивается границей:
+непустой строкой без кандидатов, перед которой стоит пустая строка и на
+которой исправитель гарантированно вернулся в начальное состояние (это
+проверяет функция closes, специфичная для исправителя). Если исправитель
+мог остаться внутри незакрытого блока (is_open), область продолжается до
+следующей границы. Для корректности шаблоны кандидатов должны находить
+все строки, которые исправитель может изменить или от которых зависит его
+состояние; лишние срабатывания лишь увеличивают декодируемые области.
+
+Границы областей находятся по байтам, без исправления, поэтому очень
+большой файл можно исправлять по областям параллельно (jobs): области
+отправляются в пул процессов, а продление области из-за незакрытого блока
+повторяется в основном процессе так же, как при обработке в одном.
+"""
+
+import collections
+import contextlib
+import heapq
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from mermaid_fixer import spans
+from mermaid_fixer.classify import DIAGRAM_KEYWORDS
+from mermaid_fixer.fileio import AtomicFile
+from mermaid_fixer.metrics import Metrics, merge
+
+# Байтовые последовательности UTF-8 всех пробельных символов str.strip(),
+# кроме '\n' (т.е. str.isspace() без перевода строки)
+WS = rb'(?:[\t\x0b-\r\x1c- ]|\xc2[\x85\xa0]|\xe1\x9a\x80|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]|\xe2\x81\x9f|\xe3\x80\x80)'
+
+# Строка, пустая после strip(), которая гарантированно пустая и в байтах
+_BLANK_LINE = re.compile(rb'\n[ \t\x0b\x0c]*\n')
+
+# Сколько раз область продлевается из-за незакрытого блока, прежде чем
+# остаток файла обрабатывается целиком
+_MAX_REOPEN = 8
+
+# Параллельное исправление областей: только для файлов от этого размера
+# (запуск пула дороже выигрыша на небольших файлах) и заданиями примерно
+# такого объема
+_PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+_TASK_BYTES = 1024 * 1024
+
+
+def line_start(*alternatives, ignore_case=False):
+    """
+    Шаблон кандидата: строка, начинающаяся (после пробелов) с одной из
+    альтернатив (байтовых регулярных выражений)
+
+    Шаблон начинается с '\n', поэтому поиск идет быстрым сканированием
+    литерала; первая строка файла проверяется отдельно.
+    """
+    body = b'|'.join(alternatives)
+    if ignore_case:
+        body = b'(?i:' + body + b')'
+    return re.compile(b'\n' + WS + b'*(?:' + body + b')')
+
+
+def header_keywords(ignore_case=False):
+    """
+    Байтовые шаблоны ключевых слов заголовков диаграмм для line_start
+
+    Без учета регистра ключевые слова обрезаются перед 'k': str.lower()
+    превращает в 'k' знак кельвина (U+212A), которого нет в ASCII-поиске.
+    """
+    keywords = set()
+    for keyword in DIAGRAM_KEYWORDS:
+        if ignore_case:
+            keyword = keyword.lower().split('k', 1)[0]
+        keywords.add(re.escape(keyword.encode('ascii')))
+    return tuple(sorted(keywords, key=len, reverse=True))
+
+
+def _line_begin(data, offset):
+    return data.rfind(b'\n', 0, offset) + 1
+
+
+def _line_end(data, offset):
+    end = data.find(b'\n', offset)
+    return len(data) if end == -1 else end + 1
+
+
+def _matches(data, pattern):
+    """Начала строк, в которых найден шаблон"""
+    if pattern.pattern.startswith(b'\n'):
+        first_end = _line_end(data, 0)
+        if pattern.match(b'\n' + data[:first_end]):
+            yield 0
+    for match in pattern.finditer(data):
+        yield _line_begin(data, match.end() - 1)
+
+
+def candidate_lines(data, patterns):
+    """Начала строк-кандидатов в порядке возрастания, без повторов"""
+    last = -1
+    for offset in heapq.merge(*(_matches(data, pattern) for pattern in patterns)):
+        if offset != last:
+            yield offset
+            last = offset
+
+
+def _count(data, needle, start=0, end=None, limit=None):
+    """Считает вхождения needle в data[start:end] (не больше limit)"""
+    if end is None:
+        end = len(data)
+    count = 0
+    offset = data.find(needle, start, end)
+    while offset != -1 and count != limit:
+        count += 1
+        offset = data.find(needle, offset + len(needle), end)
+    return count
+
+
+def _find_boundary(data, start, limit, closes, lookback):
+    """
+    Ищет границу области в [start, limit): перевод строки в конце строки L,
+    такой что перед L стоит пустая строка, L не пуста и closes(L) истинно
+
+    limit - начало следующего кандидата (или конец файла). Если до него
+    меньше lookback строк после L, граница не подходит: исправитель, глядя
+    назад от кандидата, увидел бы строки уже обработанной области.
+    """
+    search_from = start - 1
+    while True:
+        match = _BLANK_LINE.search(data, search_from, limit)
+        if match is None:
+            return None
+        line_begin = match.end()
+        newline = data.find(b'\n', line_begin, limit)
+        if newline == -1:
+            return None
+        stripped = data[line_begin:newline].decode('utf-8').strip()
+        if stripped and closes(stripped):
+            break
+        search_from = match.end() - 1
+
+    if limit < len(data) and _count(data, b'\n', newline + 1, limit, lookback) < lookback:
+        return None
+    return newline
+
+
+def _spans(data, patterns, closes, lookback):
+    """
+    Генерирует области (начало, конец) по байтам, без исправления
+
+    Область включает перевод строки перед строкой первого кандидата (для
+    исправителя это пустая первая строка) и не включает перевод строки
+    после строки-границы. Так удаление исправителем всех строк области
+    удаляет и перевод строки перед ней, как при обработке всего текста.
+    Последняя область может заканчиваться концом файла.
+    """
+    candidates = candidate_lines(data, patterns)
+    candidate = next(candidates, None)
+
+    while candidate is not None:
+        begin = max(candidate - 1, 0)
+        end = _line_end(data, candidate)
+        while True:
+            candidate = next(candidates, None)
+            while candidate is not None and candidate < end:
+                candidate = next(candidates, None)
+
+            limit = len(data) if candidate is None else candidate
+            boundary = _find_boundary(data, end, limit, closes, lookback) if end < len(data) else None
+            if boundary is not None:
+                yield begin, boundary
+                break
+            if candidate is None:
+                yield begin, len(data)
+                return
+            end = _line_end(data, candidate)
+
+
+def _fix_text(fix, is_open, text, metrics=None):
+    """
+    Исправляет текст области: (исправленный текст или None, если он не
+    изменился, изменение числа ```mermaid, остался ли блок открытым)
+    """
+    fixed = fix(text, metrics=metrics)
+    opened = is_open is not None and is_open(text, fixed)
+    if fixed == text:
+        return None, 0, opened
+    return fixed, fixed.count('```mermaid') - text.count('```mermaid'), opened
+
+
+# Функции исправления в рабочем процессе (задаются инициализатором пула)
+_worker_fix = None
+_worker_is_open = None
+
+
+def _init_worker(fix, is_open):
+    global _worker_fix, _worker_is_open
+    _worker_fix = fix
+    _worker_is_open = is_open
+
+
+def _fix_in_worker(chunks, timing):
+    """
+    Исправляет области (байты) в рабочем процессе; к результату _fix_text
+    каждой добавляются ее счетчики и замеры (Metrics.as_dict)
+    """
+    results = []
+    for chunk in chunks:
+        metrics = Metrics(timing)
+        results.append(_fix_text(_worker_fix, _worker_is_open, chunk.decode('utf-8'), metrics) +
+                       (metrics.as_dict(),))
+    return results
+
+
+def _parallel_attempts(data, spans, fix, is_open, jobs, timing):
+    """
+    Исправляет области spans пулом из jobs процессов и генерирует
+    результаты _fix_in_worker в порядке областей
+
+    Соседние области объединяются в задания примерно по _TASK_BYTES; в
+    работе одновременно не больше двух заданий на процесс, чтобы копии
+    областей не занимали память всего файла.
+    """
+    def tasks():
+        chunk = []
+        size = 0
+        for begin, end in spans:
+            chunk.append(data[begin:end])
+            size += end - begin
+            if size >= _TASK_BYTES:
+                yield chunk
+                chunk = []
+                size = 0
+        if chunk:
+            yield chunk
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(fix, is_open)) as pool:
+        pending = collections.deque()
+        for chunk in tasks():
+            pending.append(pool.submit(_fix_in_worker, chunk, timing))
+            if len(pending) >= 2 * jobs:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _selected(spans, ranges):
+    """
+    Для каждой области - пересекается ли она с одним из диапазонов ranges
+    (пары (начало, конец) по возрастанию, без пересечений)
+    """
+    selected = []
+    k = 0
+    for begin, end in spans:
+        while k < len(ranges) and ranges[k][1] <= begin:
+            k += 1
+        selected.append(k < len(ranges) and ranges[k][0] < end)
+    return selected
+
+
+def _regions(data, spans, fix, is_open, metrics=None, attempts=None, selected=None):
+    """
+    Генерирует исправленные области (начало, конец, исправленный текст или
+    None, если область не изменилась, изменение числа ```mermaid)
+
+    attempts - результаты первой попытки исправить каждую из spans со
+    счетчиками (см. _parallel_attempts) или None - области исправляются
+    здесь же. Если исправитель остался внутри незакрытого блока, область
+    продолжается до конца следующей и исправляется заново (после
+    _MAX_REOPEN продлений - до конца файла). Счетчики отвергнутых попыток
+    не учитываются. selected - необязательный список (см. _selected):
+    области, для которых он ложен, не исправляются, но продлевать
+    незакрытый блок можно и в них.
+    """
+    k = 0
+    while k < len(spans):
+        begin, end = spans[k]
+        k += 1
+        if selected is not None and not selected[k - 1]:
+            continue
+        counters = dict(metrics.counters) if metrics is not None else None
+        if attempts is not None:
+            fixed, delta, opened, stats = next(attempts)
+        else:
+            fixed, delta, opened = _fix_text(fix, is_open, data[begin:end].decode('utf-8'), metrics)
+            stats = None
+
+        reopened = 0
+        while opened and end < len(data):
+            if metrics is not None:
+                metrics.counters = counters
+            reopened += 1
+            if k == len(spans) or reopened > _MAX_REOPEN:
+                end = len(data)
+                k = len(spans)
+            else:
+                end = spans[k][1]
+                k += 1
+                if attempts is not None:
+                    next(attempts)
+            counters = dict(metrics.counters) if metrics is not None else None
+            fixed, delta, opened = _fix_text(fix, is_open, data[begin:end].decode('utf-8'), metrics)
+            stats = None
+
+        if stats is not None and metrics is not None:
+            merge(metrics.as_dict(), stats)
+        yield begin, end, fixed, delta
+
+
+def changed_regions(data, fix, patterns, closes, is_open=None, lookback=0, metrics=None, jobs=None,
+                    worker_fix=None, ranges=None, whole=None):
+    """
+    Генерирует измененные области данных data (байты или mmap без '\\r'):
+    (начало, конец, исправленный текст, изменение числа ```mermaid)
+
+    Аргументы - как у fix_mapped. Неизмененные области не возвращаются, и
+    исправленный текст целиком не собирается, поэтому генератор можно
+    прервать на первой измененной области. ranges - необязательные
+    диапазоны байтов (пары (начало, конец) по возрастанию, без
+    пересечений): исправляются только области, которые их пересекают
+    (например, с измененными в git строками); jobs тогда не используется.
+    """
+    if whole is not None and whole(data):
+        spans = [(0, len(data))]
+    else:
+        spans = list(_spans(data, patterns, closes, lookback))
+    selected = _selected(spans, ranges) if ranges is not None else None
+    attempts = None
+    if (jobs is not None and jobs > 1 and len(data) >= _PARALLEL_MIN_BYTES and len(spans) > 1 and
+            selected is None):
+        attempts = _parallel_attempts(data, spans, worker_fix or fix, is_open, jobs,
+                                      metrics is not None and metrics.timing)
+    try:
+        for start, end, fixed, delta in _regions(data, spans, fix, is_open, metrics, attempts, selected):
+            if metrics is not None:
+                metrics.count('regions')
+                metrics.count('bytes_decoded', end - start)
+            if fixed is not None:
+                yield start, end, fixed, delta
+    finally:
+        if attempts is not None:
+            attempts.close()
+
+
+def fix_mapped(path, fix, patterns, closes, is_open=None, lookback=0, backup_path=None, metrics=None,
+               jobs=None, worker_fix=None, whole=None):
+    """
+    Исправляет файл через быстрый путь
+
+    fix(text, metrics=None) - функция исправления текста, patterns - байтовые
+    шаблоны кандидатов, closes(stripped) - проверка строки-границы,
+    is_open(text, fixed) - проверка, что область закончилась внутри блока,
+    lookback - на сколько строк назад исправитель смотрит от кандидата,
+    whole(data) - необязательная проверка по байтам, что исправление
+    зависит от всего текста и файл нужно исправить одной областью,
+    metrics - необязательный Metrics (этап 'fastpath' - поиск кандидатов и
+    копирование, без времени самого исправления).
+
+    jobs - число процессов для исправления областей файла от
+    _PARALLEL_MIN_BYTES: области исправляются пулом, а текст между ними
+    копируется без участия процессов. Результат совпадает с обработкой в
+    одном процессе байт в байт. worker_fix - функция исправления для
+    рабочих процессов, если fix нельзя передать в другой процесс (по
+    умолчанию - fix); is_open тоже должна передаваться. В параллельном
+    режиме ожидание процессов входит в этап 'fastpath', а время их этапов
+    суммируется.
+
+    Файл перезаписывается (атомарно, с резервной копией backup_path), только
+    если хотя бы одна область изменилась; metrics получает счетчики
+    bytes_copied и bytes_replaced (см. spans.SpanWriter). Возвращает
+    словарь с ключами changed, mermaid_before и mermaid_after или None, если
+    быстрый путь неприменим (файл с переводами строк '\r' - обычное чтение
+    их преобразует).
+    """
+    target = None
+    stage = metrics.stage('fastpath') if metrics is not None else contextlib.nullcontext()
+    with stage:
+        try:
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return {'changed': False, 'mermaid_before': 0, 'mermaid_after': 0}
+
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    if data.find(b'\r') != -1:
+                        return None
+
+                    before = _count(data, b'```mermaid')
+                    after = before
+                    # Временный файл создается на первой измененной области и
+                    # пишется по ходу: неизмененные строки - срезами data
+                    writer = None
+                    try:
+                        for start, end, fixed, delta in changed_regions(data, fix, patterns, closes, is_open,
+                                                                        lookback, metrics, jobs, worker_fix,
+                                                                        whole=whole):
+                            if writer is None:
+                                target = AtomicFile(path, binary=True)
+                                writer = spans.SpanWriter(target.file, data)
+                            for edit in spans.narrow(data, start, end, fixed):
+                                writer.edit(*edit)
+                            after += delta
+                        if writer is not None:
+                            writer.close()
+                            if metrics is not None:
+                                metrics.count('bytes_copied', writer.copied)
+                                metrics.count('bytes_replaced', writer.replaced)
+                    finally:
+                        if writer is not None:
+                            writer.discard()
+
+            # Замена - после закрытия отображения (Windows не заменяет отображенный файл)
+            if target is not None:
+                target.commit(backup_path)
+        finally:
+            if target is not None:
+                target.discard()
+
+    return {'changed': target is not None, 'mermaid_before': before, 'mermaid_after': after}
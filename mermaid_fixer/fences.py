@@ -0,0 +1,107 @@
+"""
+Индекс блоков кода: все строки текста с ``` за один линейный проход
+
+Для каждой такой строки индекс хранит позицию первых ``` в ней и конец
+строки (смещения в символах текста), а по запросу - начало строки и
+указание языка: текст после ``` у строки, которая после отступа
+начинается с ``` ('' для ``` без языка), или None, если ``` стоит в
+середине строки. Этапы исправления находят блоки и незакрытые ```
+запросами к индексу, не просматривая текст заново, поэтому время не
+зависит от того, сколько блоков в тексте не закрыто.
+"""
+
+import re
+
+FENCE = '```'
+
+# ``` и остаток строки после них: одно совпадение на строку
+_FENCE_LINE = re.compile(r'```[^\n]*')
+
+
+def _tag(line):
+    """Указание языка строки с ``` (см. описание модуля)"""
+    stripped = line.strip()
+    return stripped[len(FENCE):] if stripped.startswith(FENCE) else None
+
+
+class FenceIndex:
+    """
+    Строки с ``` в порядке их следования
+
+    positions и ends - позиции первых ``` в строке и конца строки (позиция
+    '\\n' или длина текста); starts и tags - начала строк и указания
+    языка, они вычисляются при первом обращении.
+    """
+
+    __slots__ = ('text', 'positions', 'ends', '_starts', '_tags')
+
+    def __init__(self, text):
+        self.text = text
+        spans = [match.span() for match in _FENCE_LINE.finditer(text)]
+        self.positions = [position for position, _ in spans]
+        self.ends = [end for _, end in spans]
+        self._starts = None
+        self._tags = None
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def starts(self):
+        """Начала строк с ```"""
+        if self._starts is None:
+            rfind = self.text.rfind
+            self._starts = [rfind('\n', 0, position) + 1 for position in self.positions]
+        return self._starts
+
+    @property
+    def tags(self):
+        """Указания языка строк с ``` (None - ``` в середине строки)"""
+        if self._tags is None:
+            text = self.text
+            self._tags = [_tag(text[start:end]) for start, end in zip(self.starts, self.ends)]
+        return self._tags
+
+    def blocks(self, opening, accept=None):
+        """
+        Находит блоки так же, как поиск re.finditer(opening + r'\\n(.*?)\\n```',
+        text, re.DOTALL), и возвращает (список пар номеров открывающей и
+        закрывающей строк в индексе, номер незакрытой открывающей строки
+        или None)
+
+        Открывающая строка оканчивается на opening (которое начинается с ```);
+        закрывающая - первая строка не раньше чем через одну строку
+        содержимого, которая начинается с ``` без отступа. Открывающая
+        строка в конце текста тоже считается незакрытой. Поиск следующего
+        блока продолжается с закрывающих ```. accept - необязательная
+        проверка открывающей строки по ее номеру в индексе (например,
+        заголовок диаграммы в следующей строке).
+        """
+        text = self.text
+        positions, ends = self.positions, self.ends
+        count = len(positions)
+        pairs = []
+        scan = 0
+        k = 0
+        while k < count:
+            # opening не содержит '\n', поэтому совпадение не выходит за строку
+            tag_start = ends[k] - len(opening)
+            if (tag_start < scan or not text.startswith(opening, tag_start) or
+                    (accept is not None and not accept(k))):
+                k += 1
+                continue
+
+            # Закрывающие ``` стоят в начале строки; между открывающей и
+            # закрывающей строками - хотя бы одна строка
+            close = k + 1
+            while close < count and (positions[close] < ends[k] + 2 or
+                                     text[positions[close] - 1] != '\n'):
+                close += 1
+            if close == count:
+                # Дальше закрывающих ``` нет ни для одной открывающей строки
+                return pairs, k
+
+            pairs.append((k, close))
+            scan = positions[close] + len(FENCE)
+            k = close
+        return pairs, None
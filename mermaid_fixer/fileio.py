@@ -0,0 +1,201 @@
+"""
+Запись исправленных файлов: блокировка, резервная копия и атомарная замена
+
+Файл перезаписывается только если его содержимое действительно меняется.
+Новое содержимое пишется во временный файл в том же каталоге и атомарно
+переименовывается поверх исходного, поэтому сбой посреди записи не оставляет
+обрезанный файл. Так как исходный inode при этом не изменяется, резервной
+копией служит жесткая ссылка (или reflink) на него, а не копия байтов.
+"""
+
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки недоступны
+    fcntl = None
+
+# ioctl FICLONE (Linux): копирование при записи на btrfs, XFS и т.п.
+_FICLONE = 0x40049409
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Рекомендательная блокировка файла на время исправления
+
+    Блокируется сам файл. Если за время ожидания файл был заменен другим
+    процессом (атомарное переименование), блокировка берется заново уже на
+    новом файле. Без fcntl (Windows) блокировка не выполняется.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    while True:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                current = os.stat(path)
+            except FileNotFoundError:
+                current = None
+            locked = os.fstat(fd)
+            if current is not None and (current.st_dev, current.st_ino) == (locked.st_dev, locked.st_ino):
+                break
+        except BaseException:
+            os.close(fd)
+            raise
+        os.close(fd)
+
+    try:
+        yield
+    finally:
+        os.close(fd)
+
+
+def _reflink(src, dst):
+    if fcntl is None:
+        raise OSError("reflink недоступен")
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+
+
+def make_backup(path, backup_path):
+    """
+    Сохраняет текущую версию файла в backup_path
+
+    Используется жесткая ссылка на исходный inode, затем reflink, и только
+    если оба способа недоступны (другая файловая система, FAT и т.п.) -
+    обычное копирование. Ссылка безопасна, потому что исходный файл затем
+    заменяется переименованием, а не перезаписывается на месте.
+    """
+    directory = os.path.dirname(os.path.abspath(backup_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.backup-', suffix='.tmp')
+    os.close(fd)
+    os.remove(tmp_path)
+    try:
+        for method in (os.link, _reflink, shutil.copy2):
+            try:
+                method(path, tmp_path)
+                break
+            except OSError:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                if method is shutil.copy2:
+                    raise
+        os.replace(tmp_path, backup_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class AtomicFile:
+    """Временный файл рядом с целевым, атомарно заменяющий его в commit()"""
+
+    def __init__(self, path, binary=False):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, self.tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.',
+                                             suffix='.tmp')
+        self.file = os.fdopen(fd, 'wb') if binary else os.fdopen(fd, 'w', encoding='utf-8')
+
+    def commit(self, backup_path=None):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        shutil.copymode(self.path, self.tmp_path)
+        if backup_path is not None:
+            make_backup(self.path, backup_path)
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        if not self.file.closed:
+            self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def write_if_changed(path, original, fixed, backup_path=None):
+    """
+    Атомарно записывает fixed в path, если оно отличается от original
+
+    Перед заменой создается резервная копия backup_path. Возвращает True,
+    если файл был изменен.
+    """
+    if fixed == original:
+        return False
+
+    target = AtomicFile(path)
+    try:
+        target.file.write(fixed)
+        target.commit(backup_path)
+    finally:
+        target.discard()
+    return True
+
+
+class ChangeWriter:
+    """
+    Потоковая запись с проверкой, изменилось ли содержимое
+
+    Пока записываемый текст совпадает с исходным файлом, он только
+    сравнивается и никуда не пишется. При первом расхождении создается
+    временный файл, в него переносится совпавшее начало из исходного файла
+    и дальше запись идет туда. Если расхождений нет, close() не трогает диск.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.changed = False
+        self._source = open(path, 'r', encoding='utf-8')
+        self._matched = 0
+        self._target = None
+
+    def write(self, text):
+        if self._target is not None:
+            self._target.file.write(text)
+            return
+
+        if self._source.read(len(text)) == text:
+            self._matched += len(text)
+            return
+        self._diverge()
+        self._target.file.write(text)
+
+    def _diverge(self):
+        self.changed = True
+        self._target = AtomicFile(self.path)
+        self._source.seek(0)
+        remaining = self._matched
+        while remaining:
+            chunk = self._source.read(min(remaining, 1 << 20))
+            self._target.file.write(chunk)
+            remaining -= len(chunk)
+
+    def close(self, backup_path=None):
+        """
+        Завершает запись: заменяет файл, если содержимое изменилось
+
+        Возвращает True, если файл был изменен.
+        """
+        try:
+            if self._target is None and self._source.read(1):
+                # Новое содержимое - начало исходного: файл укорачивается
+                self._diverge()
+            self._source.close()
+            if self._target is not None:
+                self._target.commit(backup_path)
+            return self.changed
+        finally:
+            self.discard()
+
+    def discard(self):
+        """Отменяет запись, не трогая исходный файл"""
+        if not self._source.closed:
+            self._source.close()
+        if self._target is not None:
+            self._target.discard()
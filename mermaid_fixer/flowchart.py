@@ -0,0 +1,451 @@
+"""
+Разбор flowchart/graph диаграмм Mermaid: операторы, узлы и связи
+
+Строка разбирается за один проход слева направо: узлы со всеми формами
+лейблов (A[..], A(..), A{..}, A>..], A((..)), A([..]), A[[..]], A[(..)],
+A{{..}}, A[/..\\], A["..."]), связи (-->, ---, -.->, ==>, ~~~, <-->, o--o,
+x--x) с текстом (-- текст -->, -. текст .->, == текст ==>, -->|текст|),
+группы через &, классы A:::класс, ключевые слова (subgraph, end,
+classDef, class, style, linkStyle, click, direction) и комментарии %%.
+Атомы (идентификаторы, пробелы) находятся регулярными выражениями без
+альтернатив, поэтому разбор строки линеен по ее длине.
+
+Строка, которая не разбирается как оператор, не относится к диаграмме:
+по этому правилу определяется конец диаграммы без блока кода. Строка из
+одних идентификаторов (BARE) - допустимый оператор, но ее не отличить от
+слова обычного текста, поэтому продолжением диаграммы она не считается.
+"""
+
+import re
+import sys
+from array import array
+
+# Виды операторов
+COMMENT = 'comment'
+NODE = 'node'
+BARE = 'bare'
+EDGE = 'edge'
+SUBGRAPH = 'subgraph'
+END = 'end'
+CLASSDEF = 'classDef'
+CLASS = 'class'
+STYLE = 'style'
+LINKSTYLE = 'linkStyle'
+CLICK = 'click'
+DIRECTION = 'direction'
+
+_DIRECTIONS = frozenset(('TB', 'TD', 'BT', 'RL', 'LR'))
+
+# Формы узлов: первый символ -> (открытие, закрытие), длинные открытия первыми.
+# У трапеций ([/ и [\) закрытие - ] после / или \
+SHAPES = {
+    '(': (('(((', ')))'), ('((', '))'), ('([', '])'), ('(', ')')),
+    '[': (('[[', ']]'), ('[(', ')]'), ('[/', ']'), ('[\\', ']'), ('[', ']')),
+    '{': (('{{', '}}'), ('{', '}')),
+    '>': (('>', ']'),),
+}
+
+# Символы, с которых может продолжаться оператор после идентификатора узла
+_AFTER_NODE = frozenset('[({>&-=~<:;')
+
+# Начало строки, которая может разбираться как оператор (шаблон для поиска
+# строк-кандидатов): комментарий, ключевое слово или идентификатор с
+# формой, связью или классом после него. Идентификатор захватывается
+# просмотром вперед, чтобы при неудаче не перебирались его начала
+STATEMENT_START = (r'%%|(?:end|subgraph|direction|classDef|class|style|linkStyle|click)\b|'
+                   r'(?=(?P<word>\w+))(?P=word)[^\S\n]*(?:[\[({>&\-=~<:;]|[ox][-=])')
+_STATEMENT_KEYWORDS = frozenset(('end', 'subgraph', 'direction', 'classDef', 'style', 'linkStyle',
+                                 'click', 'class'))
+
+_IDENTIFIER = re.compile(r'\w+')
+# Запятые в списке узлов оператора class и имя класса
+_LIST_COMMAS = re.compile(r'[ \t]*,[ \t]*')
+_CLASS_NAME = re.compile(r'[\w-]+')
+_SPACES = re.compile(r'[ \t]*')
+# Первый идентификатор строки и первый значащий символ после него
+_HEAD = re.compile(r'(\w+)[ \t]*(.?)')
+
+
+def _shape(s, i):
+    """
+    Разбирает форму узла с позиции i: (конец, открытие, лейбл) или None
+    """
+    for opening, closing in SHAPES[s[i]]:
+        if s.startswith(opening, i):
+            break
+    else:
+        return None
+    j = i + len(opening)
+    if j < len(s) and s[j] == '"':
+        # Лейбл в кавычках может содержать закрывающие скобки
+        quote = s.find('"', j + 1)
+        if quote == -1 or not s.startswith(closing, quote + 1):
+            return None
+        return quote + 1 + len(closing), opening, s[j + 1:quote]
+
+    end = s.find(closing, j)
+    if opening in ('[/', '[\\'):
+        while end != -1 and s[end - 1] not in '/\\':
+            end = s.find(closing, end + 1)
+        if end == -1 or end == j:
+            return None
+        return end + 1, opening, s[j:end - 1]
+    if end == -1:
+        return None
+    return end + len(closing), opening, s[j:end]
+
+
+def _node(s, i):
+    """
+    Разбирает узел с позиции i: (конец, идентификатор, форма, лейбл,
+    класс) или None
+    """
+    match = _IDENTIFIER.match(s, i)
+    if match is None:
+        return None
+    j = match.end()
+    node_id = match.group()
+    shape = label = node_class = None
+
+    # Перед [ допускаются пробелы (A [Лейбл]), перед остальными формами нет:
+    # иначе текст со скобками "Модель (версия 2)" считался бы узлом
+    k = _SPACES.match(s, j).end()
+    if k < len(s) and (s[k] == '[' or (k == j and s[k] in '({>')):
+        parsed = _shape(s, k)
+        if parsed is None:
+            return None
+        j, shape, label = parsed
+
+    if s.startswith(':::', j):
+        match = _IDENTIFIER.match(s, j + 3)
+        if match is None:
+            return None
+        j = match.end()
+        node_class = match.group()
+    return j, node_id, shape, label, node_class
+
+
+def _group(s, i):
+    """Разбирает группу узлов A & B & C: (конец, [узлы]) или None"""
+    nodes = []
+    while True:
+        node = _node(s, i)
+        if node is None:
+            return None
+        nodes.append(node)
+        i = node[0]
+        k = _SPACES.match(s, i).end()
+        if k < len(s) and s[k] == '&':
+            i = _SPACES.match(s, k + 1).end()
+            continue
+        return i, nodes
+
+
+def _pipe_label(s, i, link):
+    """Необязательный текст связи |текст| после стрелки"""
+    k = _SPACES.match(s, i).end()
+    if k < len(s) and s[k] == '|':
+        end = s.find('|', k + 1)
+        if end == -1:
+            return None
+        return end + 1, link, s[k + 1:end]
+    return i, link, None
+
+
+def _tip(s, k):
+    """Конец стрелки с наконечником > o x (o и x - не начало идентификатора)"""
+    if k < len(s):
+        if s[k] == '>':
+            return k + 1
+        if s[k] in 'ox' and (k + 1 == len(s) or not (s[k + 1].isalnum() or s[k + 1] == '_')):
+            return k + 1
+    return k
+
+
+def _link(s, i):
+    """
+    Разбирает связь с позиции i: (конец, стрелка, текст или None) или None
+    """
+    n = len(s)
+    j = i
+    if j + 1 < n and s[j] in '<ox' and s[j + 1] in '-=':
+        j += 1
+    if j >= n:
+        return None
+    char = s[j]
+
+    if char == '~':
+        k = j
+        while k < n and s[k] == '~':
+            k += 1
+        return (k, s[i:k], None) if k - j >= 3 else None
+    if char not in '-=':
+        return None
+
+    k = j
+    while k < n and s[k] == char:
+        k += 1
+
+    if char == '-' and k < n and s[k] == '.':
+        # Пунктир: -.-> -..- или с текстом -. текст .->
+        while k < n and s[k] == '.':
+            k += 1
+        if k < n and s[k] == '-':
+            k = _tip(s, k + 1)
+            return _pipe_label(s, k, s[i:k])
+        close = s.find('.-', k)
+        if close == -1 or not s[k:close].strip():
+            return None
+        end = _tip(s, close + 2)
+        return end, s[i:j + 2] + s[close:end], s[k:close].strip()
+
+    if k - j < 2:
+        return None
+    end = _tip(s, k)
+    if end > k or k - j >= 3:
+        return _pipe_label(s, end, s[i:end])
+
+    # Связь с текстом: -- текст --> или --"текст"-->
+    text_start = _SPACES.match(s, k).end()
+    search_from = k
+    if text_start < n and s[text_start] == '"':
+        quote = s.find('"', text_start + 1)
+        if quote == -1:
+            return None
+        search_from = quote + 1
+    close = s.find(char * 2, search_from)
+    if close == -1 or not s[k:close].strip():
+        return None
+    label = s[k:close].strip()
+    if label.startswith('"') and label.endswith('"') and len(label) > 1:
+        label = label[1:-1]
+    end = close
+    while end < n and s[end] == char:
+        end += 1
+    end = _tip(s, end)
+    return end, s[i:k] + s[close:end], label
+
+
+def _chain(s, chart):
+    """Разбирает цепочку групп узлов и связей; возвращает вид оператора или None"""
+    parsed = _group(s, 0)
+    if parsed is None:
+        return None
+    i, nodes = parsed
+    edges = []
+    groups = [nodes]
+    while True:
+        i = _SPACES.match(s, i).end()
+        if i == len(s) or (s[i] == ';' and not s[i + 1:].strip()):
+            break
+        link = _link(s, i)
+        if link is None:
+            return None
+        i, arrow, label = link
+        parsed = _group(s, _SPACES.match(s, i).end())
+        if parsed is None:
+            return None
+        i, targets = parsed
+        edges.append((groups[-1], targets, arrow, label))
+        groups.append(targets)
+
+    if chart is not None:
+        for group in groups:
+            for _, node_id, shape, label, node_class in group:
+                chart.node(node_id, shape, label, node_class)
+        for sources, targets, arrow, label in edges:
+            for source in sources:
+                for target in targets:
+                    chart.edge(source[1], target[1], arrow, label)
+
+    if edges:
+        return EDGE
+    if any(node[2] is not None for node in nodes):
+        return NODE
+    return BARE
+
+
+def _class_operands(s, i):
+    """
+    Операнды оператора class (class A,B имя;): (идентификаторы узлов, имя
+    класса) или None, если после class не ровно список узлов и имя
+    """
+    words = _LIST_COMMAS.sub(',', s[i:].strip().rstrip(';')).split()
+    if len(words) != 2 or not _CLASS_NAME.fullmatch(words[1]):
+        return None
+    node_ids = [node_id for node_id in words[0].split(',') if node_id]
+    return (node_ids, words[1]) if node_ids else None
+
+
+def statement(stripped, chart=None):
+    """
+    Разбирает строку (без отступов) как оператор flowchart и возвращает его
+    вид или None, если строка не разбирается
+
+    Если передан chart (Flowchart), узлы, связи, подграфы и классы оператора
+    добавляются в модель.
+    """
+    match = _HEAD.match(stripped)
+    if match is None:
+        return COMMENT if stripped.startswith('%%') else None
+    keyword, after = match.groups()
+    rest = match.end(1)
+    if keyword in _STATEMENT_KEYWORDS and (rest == len(stripped) or stripped[rest] in ' \t;'):
+        if keyword == 'end' and stripped[rest:].strip() in ('', ';'):
+            return END
+        if keyword == 'subgraph':
+            words = stripped[rest:].split(None, 1)
+            if chart is not None and words:
+                subgraph = _IDENTIFIER.match(words[0])
+                chart.subgraph(subgraph.group() if subgraph else words[0])
+            return SUBGRAPH
+        if keyword == 'direction':
+            return DIRECTION if stripped[rest:].strip() in _DIRECTIONS else None
+        if keyword in ('classDef', 'style', 'linkStyle', 'click'):
+            words = stripped[rest:].split()
+            if len(words) < 2:
+                return None
+            if chart is not None:
+                if keyword == 'style':
+                    chart.reference(words[0])
+                elif keyword == 'classDef':
+                    chart.define_class(words[0])
+            return {'classDef': CLASSDEF, 'style': STYLE, 'linkStyle': LINKSTYLE, 'click': CLICK}[keyword]
+        if keyword == 'class':
+            operands = _class_operands(stripped, rest)
+            if operands is None:
+                return None
+            if chart is not None:
+                chart.assign_class(*operands)
+            return CLASS
+
+    # Быстрый отказ для обычного текста: после первого идентификатора
+    # должны идти форма, связь, группа, класс или конец оператора
+    if after and after not in _AFTER_NODE and not (
+            after in 'ox' and stripped[match.end():match.end() + 1] in ('-', '=')):
+        return None
+    return _chain(stripped, chart)
+
+
+def continues_diagram(stripped):
+    """
+    Проверяет, что строка - оператор flowchart, который продолжает диаграмму
+    (не строка из одних идентификаторов)
+    """
+    kind = statement(stripped)
+    return kind is not None and kind != BARE
+
+
+class Flowchart:
+    """
+    Компактная модель flowchart: таблицы узлов и связей
+
+    Идентификаторы узлов интернируются и нумеруются по порядку появления;
+    формы, лейблы и классы узлов - списки, параллельные списку
+    идентификаторов. Связи хранятся массивами номеров узлов (array) и
+    списками стрелок и текстов. Разбор оператора вызывает методы node,
+    edge, reference, assign_class, define_class и subgraph; подкласс может
+    их переопределить, чтобы получать события разбора (см. mermaid_fixer.lint).
+    """
+
+    __slots__ = ('direction', 'ids', 'shapes', 'labels', 'classes', 'sources', 'targets',
+                 'arrows', 'edge_labels', 'subgraphs', 'class_defs', '_index')
+
+    def __init__(self, direction=None):
+        self.direction = direction
+        self.ids = []
+        self.shapes = []
+        self.labels = []
+        self.classes = []
+        self.sources = array('i')
+        self.targets = array('i')
+        self.arrows = []
+        self.edge_labels = []
+        self.subgraphs = []
+        self.class_defs = []
+        self._index = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, node_id):
+        return node_id in self._index
+
+    def number(self, node_id):
+        """Номер узла node_id (новый узел добавляется без формы и лейбла)"""
+        index = self._index.get(node_id)
+        if index is None:
+            index = len(self.ids)
+            node_id = sys.intern(node_id)
+            self._index[node_id] = index
+            self.ids.append(node_id)
+            self.shapes.append(None)
+            self.labels.append(None)
+            self.classes.append(None)
+        return index
+
+    def node(self, node_id, shape=None, label=None, node_class=None):
+        """Узел в цепочке оператора: возвращает номер, форма, лейбл и класс уточняются"""
+        index = self.number(node_id)
+        if shape is not None:
+            self.shapes[index] = shape
+            self.labels[index] = label
+        if node_class is not None:
+            self.classes[index] = node_class
+        return index
+
+    def edge(self, source, target, arrow, label=None):
+        """Добавляет связь между узлами source и target (идентификаторы)"""
+        self.sources.append(self.number(source))
+        self.targets.append(self.number(target))
+        self.arrows.append(sys.intern(arrow))
+        self.edge_labels.append(label)
+
+    def reference(self, node_id):
+        """Узел, упомянутый вне цепочки (в операторе style или class)"""
+        return self.number(node_id)
+
+    def assign_class(self, node_ids, class_name):
+        """Оператор class: узлам node_ids назначается класс class_name"""
+        for node_id in node_ids:
+            self.classes[self.reference(node_id)] = class_name
+
+    def define_class(self, class_name):
+        """Оператор classDef"""
+        self.class_defs.append(sys.intern(class_name))
+
+    def subgraph(self, subgraph_id):
+        """Оператор subgraph"""
+        self.subgraphs.append(sys.intern(subgraph_id))
+
+    def add(self, stripped):
+        """Добавляет оператор (строку без отступов); возвращает его вид или None"""
+        return statement(stripped, self)
+
+
+def header_direction(stripped):
+    """Направление (TD, LR и т.д.), если строка - заголовок flowchart/graph, иначе None"""
+    words = stripped.split()
+    if words[0] in ('graph', 'flowchart') and len(words) > 1 and words[1][:2] in _DIRECTIONS:
+        return words[1][:2]
+    return None
+
+
+def parse(lines):
+    """
+    Разбирает строки диаграммы (заголовок flowchart/graph необязателен) и
+    возвращает (Flowchart, номера строк, которые не разобрались)
+    """
+    chart = Flowchart()
+    errors = []
+    for number, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if chart.direction is None and not chart.ids:
+            chart.direction = header_direction(stripped)
+            if chart.direction is not None:
+                continue
+        if chart.add(stripped) is None:
+            errors.append(number)
+    return chart, errors
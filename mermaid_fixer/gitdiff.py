@@ -0,0 +1,140 @@
+"""
+Изменения в git: измененные файлы, их строки и содержимое
+
+Проверяемая версия - индекс (staged: изменения относительно HEAD) или
+HEAD (since: изменения относительно заданной ревизии). Измененные файлы и
+строки читаются одним git diff -U0 на все файлы, содержимое файлов -
+одним долго работающим процессом git cat-file --batch (CatFile), а не
+отдельным запуском git или чтением с диска на каждый файл. Файлы, рабочая
+копия которых отличается от проверяемой версии, определяются еще одним
+git diff --name-only: исправление записывается в рабочую копию, поэтому
+такие файлы не исправляются.
+"""
+
+import codecs
+import os
+import re
+import subprocess
+
+# Заголовок части diff: строки новой версии (первая, число строк)
+_HUNK = re.compile(rb'@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@')
+
+# Настройки, от которых зависит разбор вывода git diff
+_DIFF_OPTIONS = ('-c', 'core.quotePath=false')
+_DIFF_FLAGS = ('--no-color', '--no-ext-diff', '--no-textconv', '--no-renames', '--no-relative',
+               '--src-prefix=a/', '--dst-prefix=b/')
+
+
+def _git(*args):
+    return subprocess.run(('git',) + args, stdout=subprocess.PIPE, check=True).stdout
+
+
+def _unquote(path):
+    """
+    Путь из заголовка diff: в кавычках - с экранированием как в C; после
+    пути с пробелами git ставит табуляцию
+    """
+    if path.endswith(b'\t'):
+        path = path[:-1]
+    if path.startswith(b'"') and path.endswith(b'"'):
+        path = codecs.escape_decode(path[1:-1])[0]
+    return os.fsdecode(path)
+
+
+class ChangedFile:
+    """
+    Измененный файл
+
+    path - путь относительно текущего каталога, spec - объект для git
+    cat-file (ревизия:путь или :путь в индексе), lines - измененные строки
+    парами (первая строка с 1, число строк; 0 строк - место удаления), как в
+    заголовках частей git diff, dirty - рабочая копия отличается от
+    проверяемой версии.
+    """
+
+    __slots__ = ('path', 'spec', 'lines', 'dirty')
+
+    def __init__(self, path, spec, lines, dirty):
+        self.path = path
+        self.spec = spec
+        self.lines = lines
+        self.dirty = dirty
+
+
+def changed_files(since=None, staged=False, paths=(), extensions=None):
+    """
+    Возвращает измененные файлы (ChangedFile) с расширениями extensions
+
+    staged - изменения в индексе относительно HEAD, иначе - изменения HEAD
+    относительно ревизии since. paths - необязательные пути (pathspec git),
+    которыми ограничивается поиск. Удаленные файлы не возвращаются.
+    """
+    if staged:
+        revisions, target, worktree = ('--cached',), ':', ()
+    else:
+        revisions, target, worktree = (since, 'HEAD'), 'HEAD:', ('HEAD',)
+    pathspec = ('--',) + tuple(paths)
+
+    top = os.fsdecode(_git('rev-parse', '--show-toplevel').rstrip(b'\n'))
+    names = [os.fsdecode(name) for name in
+             _git(*_DIFF_OPTIONS, 'diff', '--name-only', '-z', '--diff-filter=d', *_DIFF_FLAGS, *revisions,
+                  *pathspec).split(b'\0') if name]
+    if extensions is not None:
+        names = [name for name in names if name.endswith(extensions)]
+    if not names:
+        return []
+
+    dirty = {os.fsdecode(name) for name in
+             _git(*_DIFF_OPTIONS, 'diff', '--name-only', '-z', *_DIFF_FLAGS, *worktree, *pathspec).split(b'\0')}
+
+    lines = {}
+    current = None
+    patch = _git(*_DIFF_OPTIONS, 'diff', '-U0', '--diff-filter=d', *_DIFF_FLAGS, *revisions, *pathspec)
+    for line in patch.split(b'\n'):
+        if line.startswith(b'+++ '):
+            current = lines.setdefault(_unquote(line[4:])[2:], [])
+        elif line.startswith(b'@@ ') and current is not None:
+            match = _HUNK.match(line)
+            if match is not None:
+                count = match.group(2)
+                current.append((int(match.group(1)), 1 if count is None else int(count)))
+        elif line.startswith(b'diff '):
+            current = None
+
+    return [ChangedFile(os.path.relpath(os.path.join(top, name)), target + name, lines.get(name, []),
+                        name in dirty)
+            for name in names]
+
+
+class CatFile:
+    """
+    Процесс git cat-file --batch: содержимое объектов по запросу, один
+    процесс на все файлы
+    """
+
+    def __init__(self):
+        self._process = subprocess.Popen(('git', 'cat-file', '--batch'), stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE)
+
+    def read(self, spec):
+        """Содержимое объекта spec (байты) или None, если его нет"""
+        self._process.stdin.write(os.fsencode(spec) + b'\n')
+        self._process.stdin.flush()
+        header = self._process.stdout.readline()
+        if not header or header.endswith(b' missing\n'):
+            return None
+        size = int(header.split()[2])
+        data = self._process.stdout.read(size)
+        self._process.stdout.read(1)
+        return data
+
+    def close(self):
+        self._process.stdin.close()
+        self._process.stdout.close()
+        self._process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
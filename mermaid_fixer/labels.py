@@ -0,0 +1,217 @@
+"""
+Экранирование лейблов flowchart/graph диаграмм за один проход
+
+Каждая строка блока просматривается слева направо один раз: поиск
+(_OPENER) переходит к следующему месту, где может начинаться лейбл, -
+форме узла после идентификатора (A[...], A(...), A{...}, A>...] и
+остальные формы из flowchart.SHAPES), тексту связи (-- текст -->,
+== текст ==>, -. текст .->) или лейблу связи |текст|, - и по виду
+открытия известно, где лейбл закрывается. Текст лейбла экранируется
+таблицей перевода (str.translate); кавычки-ограничители ("текст" в форме,
+связи или |...|) и переносы <br>, которые Mermaid понимает в лейблах,
+сохраняются. Текст вне лейблов (стрелки, classDef, style, click с
+подсказкой в кавычках) не меняется.
+
+Mermaid ломают " внутри лейбла (закрывает строку) и < (начало HTML
+тега); одиночный > безопасен. Поэтому блок и строка без " и < пропускаются
+после проверки вхождения, а в остальных > в лейблах экранируется вместе
+с <. Экранирование идемпотентно: в результате нет символов, которые оно
+меняет.
+"""
+
+import re
+
+from mermaid_fixer.classify import diagram_header
+from mermaid_fixer.flowchart import SHAPES
+
+# Замены символов в тексте лейбла
+_TABLE = str.maketrans({'"': '&quot;', '<': '&lt;', '>': '&gt;'})
+
+# Перенос строки в лейбле (не экранируется)
+_BREAK = re.compile(r'<br[ \t]*/?>', re.IGNORECASE)
+
+# Возможные начала лейблов: формы узлов, лейбл |...| и тексты связей
+_OPENER = re.compile(r'[\[({>|]|--|==|-\.')
+
+# Первая значащая строка блока (без отступа) и строки с " или <
+_HEADER_LINE = re.compile(r'^[ \t]*(?!%%)(\S.*)$', re.MULTILINE)
+_TRIGGER_LINE = re.compile(r'^.*["<].*$', re.MULTILINE)
+
+# Операторы без лейблов (в click кавычки ограничивают подсказку)
+_SKIPPED = frozenset(('classDef', 'class', 'style', 'linkStyle', 'click'))
+
+
+def _escape_text(text):
+    """Экранирует текст лейбла, сохраняя переносы <br>"""
+    if '<' not in text:
+        return text.translate(_TABLE)
+    parts = []
+    position = 0
+    for match in _BREAK.finditer(text):
+        parts.append(text[position:match.start()].translate(_TABLE))
+        parts.append(match.group())
+        position = match.end()
+    parts.append(text[position:].translate(_TABLE))
+    return ''.join(parts)
+
+
+def _escape_quoted(text):
+    """Экранирует лейбл связи: кавычки по краям - ограничители"""
+    first = text.find('"')
+    last = text.rfind('"')
+    if first < last and not text[:first].strip() and not text[last + 1:].strip():
+        return text[:first + 1] + _escape_text(text[first + 1:last]) + text[last:]
+    return _escape_text(text)
+
+
+def _is_identifier_end(line, i):
+    """Символ перед позицией i завершает идентификатор узла"""
+    return i > 0 and (line[i - 1].isalnum() or line[i - 1] == '_')
+
+
+def _shape(line, i):
+    """
+    Лейбл формы узла с позиции i: (начало, конец лейбла, конец формы) или
+    None; у лейбла в кавычках начало и конец - внутри кавычек
+    """
+    for opening, closing in SHAPES[line[i]]:
+        if line.startswith(opening, i):
+            break
+    else:
+        return None
+    j = i + len(opening)
+    slanted = opening in ('[/', '[\\')
+    if line.startswith('"', j):
+        # У трапеций и параллелограммов перед закрытием стоит / или \
+        tails = ('/' + closing, '\\' + closing) if slanted else (closing,)
+        quotes = [(quote, len(tail)) for tail in tails
+                  for quote in (line.find('"' + tail, j + 1),) if quote != -1]
+        if quotes:
+            quote, length = min(quotes)
+            return j + 1, quote, quote + 1 + length
+
+    if slanted:
+        end = line.find(closing, j + 1)
+        while end != -1 and line[end - 1] not in '/\\':
+            end = line.find(closing, end + 1)
+        return None if end == -1 else (j, end - 1, end + 1)
+    end = line.find(closing, j)
+    return None if end == -1 else (j, end, end + len(closing))
+
+
+def _arrow_end(line, k):
+    """Конец стрелки с позиции k после ее линии: наконечник > o x или k"""
+    if line.startswith('>', k):
+        return k + 1
+    if line[k:k + 1] in ('o', 'x') and not line[k + 1:k + 2].isalnum():
+        return k + 1
+    return k
+
+
+def _link_text(line, i, char):
+    """
+    Текст связи с позиции i (-- текст --> или == текст ==>): (начало,
+    конец текста, продолжение поиска) или None, если это стрелка без текста
+    """
+    k = i
+    while k < len(line) and line[k] == char:
+        k += 1
+    if k - i > 2 or k == len(line) or _arrow_end(line, k) > k:
+        return None
+    end = line.find(char * 2, k)
+    if end == -1:
+        return None
+    resume = end
+    while resume < len(line) and line[resume] == char:
+        resume += 1
+    return k, end, _arrow_end(line, resume)
+
+
+def _dotted_text(line, i):
+    """Текст пунктирной связи с позиции i (-. текст .->) или None"""
+    k = i + 1
+    while k < len(line) and line[k] == '.':
+        k += 1
+    if k == len(line) or line[k] == '-':
+        return None
+    end = line.find('.-', k)
+    if end == -1:
+        return None
+    resume = end + 1
+    while resume < len(line) and line[resume] == '-':
+        resume += 1
+    return k, end, _arrow_end(line, resume)
+
+
+def escape_line(line):
+    """Экранирует лейблы в строке flowchart/graph диаграммы"""
+    stripped = line.lstrip()
+    if not stripped or stripped.startswith('%%') or stripped.split(None, 1)[0] in _SKIPPED:
+        return line
+
+    parts = []
+    copied = 0
+    position = 0
+    while True:
+        match = _OPENER.search(line, position)
+        if match is None:
+            break
+        i = match.start()
+        token = match.group()
+        label = None
+        quoted = False
+        if token == '|':
+            end = line.find('|', i + 1)
+            if end != -1:
+                label = i + 1, end, end + 1
+                quoted = True
+        elif token == '--' or token == '==':
+            label = _link_text(line, i, token[0])
+            quoted = True
+            if label is None:
+                # Пропускаем стрелку целиком, чтобы ее > не считался формой
+                k = i
+                while k < len(line) and line[k] == token[0]:
+                    k += 1
+                position = _arrow_end(line, k)
+                continue
+        elif token == '-.':
+            label = _dotted_text(line, i)
+            quoted = True
+        elif token == '[':
+            before = i
+            while before > 0 and line[before - 1] in ' \t':
+                before -= 1
+            if _is_identifier_end(line, before):
+                label = _shape(line, i)
+        elif _is_identifier_end(line, i):
+            label = _shape(line, i)
+
+        if label is None:
+            position = i + 1
+            continue
+        start, end, position = label
+        text = line[start:end]
+        escaped = _escape_quoted(text) if quoted else _escape_text(text)
+        if escaped != text:
+            parts.append(line[copied:start])
+            parts.append(escaped)
+            copied = end
+
+    if not parts:
+        return line
+    parts.append(line[copied:])
+    return ''.join(parts)
+
+
+def escape_block(content):
+    """
+    Экранирует лейблы в содержимом блока ```mermaid (текст между
+    ```mermaid и ```); блоки других видов диаграмм не меняются
+    """
+    if '"' not in content and '<' not in content:
+        return content
+    match = _HEADER_LINE.search(content)
+    if match is not None and diagram_header(match.group(1)) not in (None, 'flowchart'):
+        return content
+    return _TRIGGER_LINE.sub(lambda match: escape_line(match.group()), content)
@@ -0,0 +1,261 @@
+"""
+Библиотека эталонных диаграмм с индексом по узлам и MinHash-отпечаткам
+
+Эталонные диаграммы хранятся во внешнем каталоге, по одной в файле *.mmd
+(имя файла без расширения - ключ диаграммы). Разорванный фрагмент
+диаграммы из документа сопоставляется с эталоном без перебора всей
+библиотеки: кандидаты берутся из LSH-корзин MinHash-подписи и из
+инвертированного индекса по самым редким идентификаторам узлов фрагмента,
+после чего точно сравниваются только они.
+"""
+
+import hashlib
+import os
+import random
+import re
+
+from mermaid_fixer.classify import diagram_header
+from mermaid_fixer.flowchart import Flowchart, continues_diagram
+
+DEFAULT_LIBRARY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'diagrams')
+
+# MinHash: NUM_PERM перестановок, LSH: BANDS полос по ROWS значений
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Сколько самых редких признаков фрагмента используется для поиска по
+# инвертированному индексу и сколько диаграмм может быть в одном списке
+_RARE_FEATURES = 8
+_MAX_POSTINGS = 64
+
+# Минимальная доля признаков фрагмента, найденных в эталоне, минимальное
+# число общих узлов и минимальный коэффициент Жаккара фрагмента и эталона:
+# короткая диаграмма с узлами A, B, C не должна подменяться эталоном
+# только потому, что все ее узлы в нем есть
+MIN_CONTAINMENT = 0.5
+MIN_COMMON_NODES = 3
+MIN_JACCARD = 0.5
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x6d65726d)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+# Ключевые слова и направления, которые не являются узлами
+_KEYWORDS = frozenset((
+    'graph', 'flowchart', 'subgraph', 'end', 'class', 'classDef', 'style',
+    'linkStyle', 'click', 'direction', 'TD', 'TB', 'LR', 'RL', 'BT',
+))
+
+# Лейблы узлов и связей: "...", [...], (...), {...}, |...|
+_LABELS = re.compile(r'"[^"]*"|\[[^\]]*\]|\([^)]*\)|\{[^}]*\}|\|[^|]*\|')
+# Текст на связи без кавычек: A -- текст --> B, A --1--> B
+_EDGE_TEXT = re.compile(r'--(?![->])[^>]*?-->')
+_IDENTIFIER = re.compile(r'[^\W\d]\w*')
+
+
+def is_statement(stripped):
+    """
+    Проверяет, является ли строка (без отступов) оператором flowchart/graph
+    (см. flowchart.statement; строки из одних идентификаторов не считаются)
+    """
+    return continues_diagram(stripped)
+
+
+def statement_features(stripped):
+    """
+    Возвращает идентификаторы узлов оператора flowchart/graph или None, если
+    строка не оператор (то же, что is_statement и line_features вместе;
+    модель строится только для операторов)
+    """
+    if not continues_diagram(stripped):
+        return None
+    chart = Flowchart()
+    chart.add(stripped)
+    return _chart_features(chart)
+
+
+def _chart_features(chart):
+    return chart.subgraphs + chart.ids + [name for name in chart.classes if name is not None]
+
+
+def line_features(stripped):
+    """
+    Возвращает идентификаторы узлов (и имена классов) из строки диаграммы
+
+    Операторы flowchart разбираются (flowchart.statement), из остальных
+    строк берутся все слова вне лейблов, кроме ключевых слов.
+    """
+    if not stripped or stripped.startswith('%%') or stripped.startswith('classDef'):
+        return []
+    chart = Flowchart()
+    if chart.add(stripped) is not None:
+        return _chart_features(chart)
+
+    # Строки других видов диаграмм (sequenceDiagram, erDiagram и т.д.)
+    text = _LABELS.sub(' ', stripped)
+    text = _EDGE_TEXT.sub(' --> ', text)
+    return [token for token in _IDENTIFIER.findall(text) if token not in _KEYWORDS]
+
+
+def header_feature(stripped):
+    """
+    Возвращает признак заголовка диаграммы (вид и направление) или None
+    """
+    kind = diagram_header(stripped)
+    if kind is None:
+        return None
+    parts = stripped.split(None, 2)
+    if kind == 'flowchart' and len(parts) > 1:
+        return f'#flowchart {parts[1][:2]}'
+    return f'#{kind}'
+
+
+def diagram_features(lines):
+    """
+    Возвращает множество признаков диаграммы: заголовок и идентификаторы узлов
+    """
+    features = set()
+    for line in lines:
+        stripped = line.strip()
+        feature = header_feature(stripped)
+        if feature is not None:
+            features.add(feature)
+        else:
+            features.update(line_features(stripped))
+    return features
+
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def minhash(features):
+    """Возвращает MinHash-подпись множества признаков"""
+    hashes = [_feature_hash(feature) for feature in features]
+    if not hashes:
+        return None
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+class DiagramLibrary:
+    """
+    Индексированная библиотека эталонных диаграмм
+    """
+
+    def __init__(self):
+        self._texts = {}
+        self._features = {}
+        self._buckets = {}
+        self._postings = {}
+
+    @classmethod
+    def load(cls, directory=DEFAULT_LIBRARY):
+        """Загружает все *.mmd файлы каталога (рекурсивно)"""
+        library = cls()
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                if not name.endswith('.mmd'):
+                    continue
+                with open(os.path.join(root, name), 'r', encoding='utf-8') as f:
+                    library.add(name[:-len('.mmd')], f.read().rstrip('\n'))
+        return library
+
+    def __len__(self):
+        return len(self._texts)
+
+    def __contains__(self, key):
+        return key in self._texts
+
+    def text(self, key):
+        """Возвращает текст эталонной диаграммы"""
+        return self._texts[key]
+
+    def features(self, key):
+        """Возвращает множество признаков эталонной диаграммы"""
+        return self._features[key]
+
+    def knows_node(self, node_id):
+        """Проверяет, встречается ли идентификатор узла хотя бы в одном эталоне"""
+        return node_id in self._postings
+
+    def add(self, key, text):
+        """Регистрирует эталонную диаграмму"""
+        if key in self._texts:
+            raise ValueError(f"Диаграмма {key} уже зарегистрирована")
+        features = diagram_features(text.split('\n'))
+        self._texts[key] = text
+        self._features[key] = features
+
+        for feature in features:
+            self._postings.setdefault(feature, []).append(key)
+
+        signature = minhash(features)
+        if signature is not None:
+            for band in range(BANDS):
+                bucket = (band, signature[band * ROWS:(band + 1) * ROWS])
+                self._buckets.setdefault(bucket, []).append(key)
+
+    def _candidates(self, features):
+        candidates = set()
+
+        # Близкие по Жаккару диаграммы - через LSH-корзины
+        signature = minhash(features)
+        if signature is not None:
+            for band in range(BANDS):
+                candidates.update(self._buckets.get((band, signature[band * ROWS:(band + 1) * ROWS]), ()))
+
+        # Частичные фрагменты - через самые редкие узлы фрагмента
+        known = [feature for feature in features if feature in self._postings and not feature.startswith('#')]
+        known.sort(key=lambda feature: len(self._postings[feature]))
+        for feature in known[:_RARE_FEATURES]:
+            postings = self._postings[feature]
+            if len(postings) <= _MAX_POSTINGS:
+                candidates.update(postings)
+
+        return candidates
+
+    def match(self, features, min_containment=MIN_CONTAINMENT, min_common=MIN_COMMON_NODES,
+              min_jaccard=MIN_JACCARD):
+        """
+        Находит эталон для фрагмента по множеству его признаков
+
+        Возвращает ключ диаграммы или None. Эталон должен содержать не меньше
+        min_containment признаков фрагмента и не меньше min_common его
+        узлов, а коэффициент Жаккара их признаков должен быть не меньше
+        min_jaccard; при равенстве выбирается диаграмма с большим
+        коэффициентом Жаккара. Признак заголовка (вид и направление) должен
+        совпадать, если он есть у фрагмента.
+        """
+        headers = {feature for feature in features if feature.startswith('#')}
+        nodes = features - headers
+        if not nodes:
+            return None
+
+        best = None
+        best_score = None
+        for key in self._candidates(features):
+            reference = self._features[key]
+            if headers and not headers <= reference:
+                continue
+            common = len(nodes & reference)
+            containment = common / len(nodes)
+            jaccard = len(features & reference) / len(features | reference)
+            if common < min_common or containment < min_containment or jaccard < min_jaccard:
+                continue
+            score = (containment, jaccard, key)
+            if best_score is None or score > best_score:
+                best, best_score = key, score
+        return best
+
+
+_loaded = {}
+
+
+def get_library(directory=DEFAULT_LIBRARY):
+    """Возвращает библиотеку каталога, загружая ее один раз на процесс"""
+    directory = os.path.abspath(directory)
+    if directory not in _loaded:
+        _loaded[directory] = DiagramLibrary.load(directory)
+    return _loaded[directory]
@@ -0,0 +1,400 @@
+"""
+Проверка смысла flowchart/graph диаграмм: правила за один обход
+
+Каждая диаграмма разбирается один раз (flowchart.statement), и разбор
+порождает события: узел в цепочке оператора, связь, упоминание узла в
+class или style, classDef, использование класса, оператор (с его видом
+или None, если строка не разбирается), начало и конец диаграммы. Правило
+(подкласс Rule) переопределяет методы тех событий, которые ему нужны, и
+вызывается только на них, поэтому все правила работают в том же обходе,
+а время проверки линейно по числу строк при любом числе правил.
+
+Идентификаторы узлов и имена классов заменяются номерами (см.
+flowchart.Flowchart и Traversal.class_number); правила хранят состояние
+по номерам, а строки берут из таблиц обхода только для сообщений.
+
+Проверяются блоки ```mermaid в Markdown и в тексте документов Word и
+целые файлы .mmd. Запуск: python -m mermaid_fixer.lint путь... (код
+возврата 1, если найдены проблемы)
+"""
+
+import argparse
+import sys
+
+from mermaid_fixer import batch, docx
+from mermaid_fixer.classify import diagram_header
+from mermaid_fixer.fences import FenceIndex
+from mermaid_fixer.flowchart import END, SUBGRAPH, Flowchart, header_direction, statement
+
+# События обхода: имена методов Rule
+EVENTS = ('start', 'node', 'edge', 'reference', 'class_def', 'class_use', 'statement', 'finish')
+
+# Файлы, в которых ищутся диаграммы: документы и отдельные диаграммы
+EXTENSIONS = batch.EXTENSIONS + ('.mmd',)
+
+_DIAGRAM_SUFFIX = '.mmd'
+
+
+class Rule:
+    """
+    Правило проверки диаграммы
+
+    Методы - события обхода; первый аргумент каждого - Traversal, через
+    него правило читает таблицы диаграммы и сообщает о проблемах
+    (Traversal.report). Правило создается один раз на Linter и проверяет
+    диаграммы по очереди, поэтому состояние диаграммы сбрасывается в start.
+    """
+
+    code = None
+
+    def start(self, chart):
+        """Начало диаграммы"""
+
+    def node(self, chart, index, shape, label):
+        """Узел index в цепочке оператора (форма и лейбл - в этом месте или None)"""
+
+    def edge(self, chart, index):
+        """Связь index (узлы - chart.sources[index] и chart.targets[index])"""
+
+    def reference(self, chart, index):
+        """Узел index упомянут в операторе class или style"""
+
+    def class_def(self, chart, number):
+        """Оператор classDef класса number"""
+
+    def class_use(self, chart, number):
+        """Класс number назначен узлам (оператор class или A:::класс)"""
+
+    def statement(self, chart, kind):
+        """Оператор вида kind (None - строка не разбирается)"""
+
+    def finish(self, chart):
+        """Конец диаграммы"""
+
+
+class Traversal(Flowchart):
+    """
+    Модель диаграммы, которая при разборе вызывает обработчики правил
+
+    line - номер текущей строки, diagnostics - найденные проблемы
+    кортежами (строка, код, сообщение), class_names - имена классов по
+    номерам.
+    """
+
+    __slots__ = ('line', 'diagnostics', 'class_names', '_class_index', '_on_node', '_on_edge',
+                 '_on_reference', '_on_class_def', '_on_class_use')
+
+    def __init__(self, handlers):
+        super().__init__()
+        self.line = 0
+        self.diagnostics = []
+        self.class_names = []
+        self._class_index = {}
+        self._on_node = handlers['node']
+        self._on_edge = handlers['edge']
+        self._on_reference = handlers['reference']
+        self._on_class_def = handlers['class_def']
+        self._on_class_use = handlers['class_use']
+
+    def report(self, code, message, line=None):
+        """Добавляет проблему в строке line (по умолчанию - в текущей)"""
+        self.diagnostics.append((self.line if line is None else line, code, message))
+
+    def class_number(self, class_name):
+        """Номер класса class_name (новый класс добавляется)"""
+        number = self._class_index.get(class_name)
+        if number is None:
+            number = self._class_index[class_name] = len(self.class_names)
+            self.class_names.append(sys.intern(class_name))
+        return number
+
+    def node(self, node_id, shape=None, label=None, node_class=None):
+        index = super().node(node_id, shape, label, node_class)
+        for handler in self._on_node:
+            handler(self, index, shape, label)
+        if node_class is not None and self._on_class_use:
+            number = self.class_number(node_class)
+            for handler in self._on_class_use:
+                handler(self, number)
+        return index
+
+    def edge(self, source, target, arrow, label=None):
+        super().edge(source, target, arrow, label)
+        index = len(self.sources) - 1
+        for handler in self._on_edge:
+            handler(self, index)
+
+    def reference(self, node_id):
+        index = super().reference(node_id)
+        for handler in self._on_reference:
+            handler(self, index)
+        return index
+
+    def assign_class(self, node_ids, class_name):
+        super().assign_class(node_ids, class_name)
+        if self._on_class_use:
+            number = self.class_number(class_name)
+            for handler in self._on_class_use:
+                handler(self, number)
+
+    def define_class(self, class_name):
+        super().define_class(class_name)
+        if self._on_class_def:
+            number = self.class_number(class_name)
+            for handler in self._on_class_def:
+                handler(self, number)
+
+
+class InvalidStatement(Rule):
+    """Строка, которая не разбирается как оператор flowchart"""
+
+    code = 'invalid-statement'
+
+    def statement(self, chart, kind):
+        if kind is None:
+            chart.report(self.code, 'Строка не разбирается как оператор flowchart')
+
+
+class UnclosedSubgraph(Rule):
+    """subgraph без end и end без subgraph"""
+
+    code = 'unclosed-subgraph'
+
+    def start(self, chart):
+        self.open = []
+
+    def statement(self, chart, kind):
+        if kind == SUBGRAPH:
+            self.open.append(chart.line)
+        elif kind == END:
+            if self.open:
+                self.open.pop()
+            else:
+                chart.report(self.code, 'end без открытого subgraph')
+
+    def finish(self, chart):
+        for line in self.open:
+            chart.report(self.code, 'subgraph не закрыт (нет end)', line)
+
+
+class UndefinedClass(Rule):
+    """Класс назначен узлам, но не определен через classDef"""
+
+    code = 'undefined-class'
+
+    def start(self, chart):
+        self.defined = set()
+        self.uses = []
+
+    def class_def(self, chart, number):
+        self.defined.add(number)
+
+    def class_use(self, chart, number):
+        self.uses.append((number, chart.line))
+
+    def finish(self, chart):
+        for number, line in self.uses:
+            if number not in self.defined:
+                chart.report(self.code, f'Класс {chart.class_names[number]} не определен (нет classDef)', line)
+
+
+class UndefinedNode(Rule):
+    """Оператор class или style ссылается на узел, которого нет в диаграмме"""
+
+    code = 'undefined-node'
+
+    def start(self, chart):
+        self.seen = set()
+        self.references = []
+
+    def node(self, chart, index, shape, label):
+        self.seen.add(index)
+
+    def reference(self, chart, index):
+        self.references.append((index, chart.line))
+
+    def finish(self, chart):
+        subgraphs = set(chart.subgraphs)
+        for index, line in self.references:
+            node_id = chart.ids[index]
+            if index not in self.seen and node_id not in subgraphs:
+                chart.report(self.code, f'Узел {node_id} не описан в диаграмме', line)
+
+
+class DanglingEdge(Rule):
+    """
+    Связь с узлом, который встречается только в ней и не описан, хотя
+    остальные узлы диаграммы описаны (обычно - опечатка в идентификаторе)
+    """
+
+    code = 'dangling-edge'
+
+    def start(self, chart):
+        self.occurrences = {}
+        self.endpoints = {}
+
+    def node(self, chart, index, shape, label):
+        self.occurrences[index] = self.occurrences.get(index, 0) + 1
+
+    def reference(self, chart, index):
+        self.occurrences[index] = self.occurrences.get(index, 0) + 1
+
+    def edge(self, chart, index):
+        self.endpoints.setdefault(chart.sources[index], chart.line)
+        self.endpoints.setdefault(chart.targets[index], chart.line)
+
+    def finish(self, chart):
+        shapes = chart.shapes
+        if all(shape is None for shape in shapes):
+            return
+        subgraphs = set(chart.subgraphs)
+        for index, line in self.endpoints.items():
+            node_id = chart.ids[index]
+            if shapes[index] is None and self.occurrences.get(index) == 1 and node_id not in subgraphs:
+                chart.report(self.code, f'Связь с узлом {node_id}, который больше нигде не встречается', line)
+
+
+class ConflictingLabel(Rule):
+    """Один идентификатор узла описан с разными лейблами"""
+
+    code = 'conflicting-label'
+
+    def start(self, chart):
+        self.labels = {}
+
+    def node(self, chart, index, shape, label):
+        if label is None:
+            return
+        first = self.labels.setdefault(index, label)
+        if first != label:
+            chart.report(self.code, f'Узел {chart.ids[index]} уже описан с другим лейблом: {first}')
+
+
+# Правила по умолчанию
+RULES = (InvalidStatement, UnclosedSubgraph, UndefinedClass, UndefinedNode, DanglingEdge, ConflictingLabel)
+
+
+class Linter:
+    """
+    Проверка диаграмм набором правил (классов Rule) за один обход каждой
+
+    Для каждого события заранее составляется список обработчиков - методов
+    правил, которые это событие переопределили.
+    """
+
+    def __init__(self, rules=RULES):
+        self.rules = [rule() for rule in rules]
+        self._handlers = {
+            event: tuple(getattr(rule, event) for rule in self.rules
+                         if getattr(type(rule), event) is not getattr(Rule, event))
+            for event in EVENTS
+        }
+
+    def lint_lines(self, lines, first_line=0):
+        """
+        Проверяет строки одной диаграммы flowchart/graph (заголовок
+        необязателен) и возвращает проблемы кортежами (строка, код,
+        сообщение); строки нумеруются с first_line
+        """
+        chart = Traversal(self._handlers)
+        on_statement = self._handlers['statement']
+        for handler in self._handlers['start']:
+            handler(chart)
+
+        header = True
+        for number, line in enumerate(lines, first_line):
+            stripped = line.strip()
+            if not stripped:
+                continue
+            chart.line = number
+            if header and not stripped.startswith('%%'):
+                header = False
+                chart.direction = header_direction(stripped)
+                if chart.direction is not None:
+                    continue
+            kind = statement(stripped, chart)
+            for handler in on_statement:
+                handler(chart, kind)
+
+        for handler in self._handlers['finish']:
+            handler(chart)
+        chart.diagnostics.sort(key=lambda diagnostic: diagnostic[0])
+        return chart.diagnostics
+
+    def lint_text(self, text):
+        """
+        Проверяет flowchart/graph диаграммы в блоках ```mermaid текста и
+        возвращает проблемы (строки нумеруются с 0 от начала текста)
+        """
+        fences = FenceIndex(text)
+        blocks, _ = fences.blocks('```mermaid')
+        diagnostics = []
+        line = 0
+        counted = 0
+        for opening, closing in blocks:
+            start = fences.ends[opening] + 1
+            content = text[start:fences.starts[closing] - 1].split('\n')
+            if not _is_flowchart(content):
+                continue
+            line += text.count('\n', counted, start)
+            counted = start
+            diagnostics.extend(self.lint_lines(content, line))
+        return diagnostics
+
+
+def _is_flowchart(lines):
+    """Первая значащая строка - заголовок flowchart/graph"""
+    for line in lines:
+        stripped = line.strip()
+        if stripped and not stripped.startswith('%%'):
+            return diagram_header(stripped) == 'flowchart'
+    return False
+
+
+def lint_file(path, linter=None):
+    """
+    Проверяет диаграммы файла: .mmd - целиком, документ Word - по тексту
+    абзацев, остальные - по блокам ```mermaid
+    """
+    if linter is None:
+        linter = Linter()
+    if docx.is_docx(path):
+        return linter.lint_text(docx.document_text(path))
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if path.endswith(_DIAGRAM_SUFFIX):
+        lines = text.split('\n')
+        return linter.lint_lines(lines) if _is_flowchart(lines) else []
+    return linter.lint_text(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m mermaid_fixer.lint',
+                                     description='Проверка смысла flowchart/graph диаграмм Mermaid')
+    parser.add_argument('paths', nargs='+', metavar='путь',
+                        help='файл .md, .docx или .mmd, каталог (обрабатывается рекурсивно) или glob-шаблон')
+    args = parser.parse_args(argv)
+
+    files = batch.collect_markdown_files(args.paths, EXTENSIONS)
+    if not files:
+        print("Ошибка: не найдено ни одного .md, .docx или .mmd файла", file=sys.stderr)
+        sys.exit(1)
+
+    linter = Linter()
+    status = 0
+    for path in files:
+        try:
+            diagnostics = lint_file(path, linter)
+        except Exception as e:
+            print(f"Ошибка при обработке файла {path}: {e}", file=sys.stderr)
+            status = 1
+            continue
+        for line, code, message in diagnostics:
+            print(f"{path}:{line + 1}: {code}: {message}")
+        if diagnostics:
+            status = 1
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
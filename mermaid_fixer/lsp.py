@@ -0,0 +1,607 @@
+"""
+Сервер LSP (Language Server Protocol) для Mermaid диаграмм в Markdown
+
+Держит открытые документы в памяти и публикует диагностики: незакрытый
+блок кода, блок ``` с диаграммой без указания mermaid, диаграмма или ее
+строки вне блока ```mermaid, неэкранированные < > и " в лейблах. Для
+каждой диагностики есть быстрое исправление (quickfix), для всего
+документа - source.fixAll (стратегия advanced).
+
+Анализ инкрементальный. Документ делится на единицы: блоки кода целиком
+и участки текста между границами, на которых гарантированно заканчивается
+любая диаграмма без блока кода (пустая строка, за которой идет не
+относящаяся к диаграмме строка, - те же правила, что при исправлении).
+Диагностики единицы зависят только от ее строк, поэтому после правки
+заново анализируются только единицы, которые ее затронули, а диагностики
+остальных сдвигаются. Время обработки нажатия клавиши зависит от размера
+правленого блока или абзаца, а не от длины документа.
+
+Запуск: python -m mermaid_fixer.lsp (обмен через stdin/stdout)
+"""
+
+import bisect
+import json
+import sys
+
+from mermaid_fixer import advanced
+from mermaid_fixer.api import fix
+from mermaid_fixer.classify import diagram_header
+
+SOURCE = 'mermaid-fixer'
+
+# Уровни диагностик LSP
+ERROR = 1
+WARNING = 2
+
+# Уровень сообщения window/logMessage
+LOG_ERROR = 1
+
+# Коды диагностик
+UNCLOSED_FENCE = 'unclosed-fence'
+UNTAGGED_FENCE = 'untagged-fence'
+DIAGRAM_OUTSIDE_FENCE = 'diagram-outside-fence'
+STRAY_DIAGRAM_LINE = 'stray-diagram-line'
+UNESCAPED_LABEL = 'unescaped-label'
+
+_MESSAGES = {
+    UNCLOSED_FENCE: 'Блок кода не закрыт',
+    UNTAGGED_FENCE: 'Блок кода с диаграммой без указания mermaid',
+    DIAGRAM_OUTSIDE_FENCE: 'Диаграмма без блока ```mermaid',
+    STRAY_DIAGRAM_LINE: 'Строка диаграммы вне блока ```mermaid',
+    UNESCAPED_LABEL: 'Неэкранированные символы < > или " в лейбле',
+}
+
+_FIX_TITLES = {
+    UNCLOSED_FENCE: 'Добавить закрывающие ```',
+    UNTAGGED_FENCE: 'Указать язык mermaid',
+    DIAGRAM_OUTSIDE_FENCE: 'Обернуть диаграмму в блок ```mermaid',
+    STRAY_DIAGRAM_LINE: 'Удалить строку',
+    UNESCAPED_LABEL: 'Экранировать символы',
+}
+
+
+def _to_index(line, character):
+    """Позиция в единицах UTF-16 (как в LSP) -> индекс в строке Python"""
+    if line.isascii():
+        return min(character, len(line))
+    units = 0
+    for index, char in enumerate(line):
+        if units >= character:
+            return index
+        units += 2 if ord(char) > 0xFFFF else 1
+    return len(line)
+
+
+def _to_units(line, index):
+    """Индекс в строке Python -> позиция в единицах UTF-16"""
+    if line.isascii():
+        return index
+    return index + sum(1 for char in line[:index] if ord(char) > 0xFFFF)
+
+
+def _is_fence(line):
+    return line.lstrip().startswith('```')
+
+
+# Роли строк ```: открывает блок, закрывает его или находится внутри
+_OPEN = 0
+_INNER = 1
+_CLOSE = 2
+
+
+class _LineIndex:
+    """
+    Отсортированный список номеров строк с отложенным сдвигом
+
+    Вставка или удаление строк сдвигают все номера после правки. Чтобы не
+    переписывать их на каждое нажатие клавиши, сдвиг хвоста хранится одним
+    числом и переносится на элементы, только когда правка происходит в
+    другом месте: стоимость зависит от расстояния между правками, а не от
+    длины списка.
+    """
+
+    def __init__(self, values=()):
+        self._values = list(values)
+        # Ко всем элементам начиная с _start прибавляется _delta
+        self._start = len(self._values)
+        self._delta = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    def __getitem__(self, index):
+        value = self._values[index]
+        return value + self._delta if index >= self._start else value
+
+    def _move(self, start):
+        values, delta = self._values, self._delta
+        if delta:
+            if start > self._start:
+                for i in range(self._start, start):
+                    values[i] += delta
+            else:
+                for i in range(start, self._start):
+                    values[i] -= delta
+        self._start = start
+
+    def slice(self, a, b):
+        values, start, delta = self._values, self._start, self._delta
+        if not delta or b <= start:
+            return values[a:b]
+        if a >= start:
+            return [value + delta for value in values[a:b]]
+        return values[a:start] + [value + delta for value in values[start:b]]
+
+    def bisect_left(self, value):
+        k = bisect.bisect_left(self._values, value, 0, self._start)
+        if k < self._start:
+            return k
+        return bisect.bisect_left(self._values, value - self._delta, self._start)
+
+    def bisect_right(self, value):
+        k = bisect.bisect_right(self._values, value, 0, self._start)
+        if k < self._start:
+            return k
+        return bisect.bisect_right(self._values, value - self._delta, self._start)
+
+    def splice(self, a, b, values):
+        """Заменяет элементы [a, b) номерами values"""
+        self._move(a)
+        delta = self._delta
+        self._values[a:b] = [value - delta for value in values] if delta else values
+
+    def shift(self, a, delta):
+        """Сдвигает элементы начиная с a на delta"""
+        if delta:
+            self._move(a)
+            self._delta += delta
+
+
+class Document:
+    """
+    Текст документа по строкам, роли строк ``` и диагностики
+
+    Диагностики хранятся отсортированными номерами строк (_LineIndex) и
+    параллельным списком (начало, конец, уровень, код) с позициями в
+    единицах UTF-16, как их отдает LSP.
+    """
+
+    def __init__(self, text):
+        self.lines = text.split('\n')
+        self._fences = _LineIndex(i for i, line in enumerate(self.lines) if _is_fence(line))
+        self._roles = [None] * len(self._fences)
+        self._pair(0)
+        diagnostics = self._analyze(0, len(self.lines))
+        self._diagnostic_lines = _LineIndex(diagnostic[0] for diagnostic in diagnostics)
+        self._diagnostic_rest = [diagnostic[1:] for diagnostic in diagnostics]
+
+    @property
+    def text(self):
+        return '\n'.join(self.lines)
+
+    def _pair(self, k):
+        """
+        Определяет роли строк ``` начиная с k-й (закрывают блок только строки
+        из одних ```, как при исправлении) и останавливается, когда роль
+        снова определяется так же, как до правки (у новых строк роль None).
+        Возвращает номер первой строки ``` с прежней ролью
+        """
+        roles, fences, lines = self._roles, self._fences, self.lines
+        inside = k > 0 and roles[k - 1] != _CLOSE
+        while k < len(roles):
+            old = roles[k]
+            if old is not None and inside == (old != _OPEN):
+                return k
+            if not inside:
+                roles[k] = _OPEN
+                inside = True
+            elif lines[fences[k]].strip() == '```':
+                roles[k] = _CLOSE
+                inside = False
+            else:
+                roles[k] = _INNER
+            k += 1
+        return k
+
+    def _block_of(self, k):
+        """Блок (открытие, закрытие или None), которому принадлежит k-я ```"""
+        roles, fences = self._roles, self._fences
+        opening = k
+        while roles[opening] != _OPEN:
+            opening -= 1
+        closing = k if roles[k] == _CLOSE else k + 1
+        while closing < len(roles) and roles[closing] != _CLOSE:
+            closing += 1
+        return fences[opening], fences[closing] if closing < len(roles) else None
+
+    def _block_at(self, index):
+        """Блок (открытие, закрытие), содержащий строку index, или None"""
+        k = self._fences.bisect_right(index) - 1
+        if k < 0 or (self._roles[k] == _CLOSE and self._fences[k] != index):
+            return None
+        return self._block_of(k)
+
+    def _is_unit_start(self, index):
+        """Начинается ли с этой строки единица анализа"""
+        if index == 0:
+            return True
+        block = self._block_at(index)
+        if block is not None:
+            return block[0] == index
+        if self._block_at(index - 1) is not None:
+            return True
+        stripped = self.lines[index].strip()
+        return (self.lines[index - 1].strip() == '' and
+                bool(advanced.ends_bare_diagram(stripped)))
+
+    def _unit_start_at_or_before(self, index):
+        while index > 0:
+            block = self._block_at(index)
+            if block is not None:
+                return block[0]
+            if self._is_unit_start(index):
+                return index
+            index -= 1
+        return 0
+
+    def _unit_start_at_or_after(self, index):
+        while index < len(self.lines):
+            block = self._block_at(index)
+            if block is not None:
+                if block[0] == index:
+                    return index
+                if block[1] is None:
+                    return len(self.lines)
+                index = block[1] + 1
+                continue
+            if self._is_unit_start(index):
+                return index
+            index += 1
+        return len(self.lines)
+
+    def _analyze(self, start, end):
+        """
+        Диагностики строк [start, end) кортежами (строка, начало, конец,
+        уровень, код); start и end - границы единиц
+        """
+        diagnostics = []
+        lines = self.lines
+        i = start
+        while i < end:
+            block = self._block_at(i)
+            if block is not None:
+                self._analyze_block(block, diagnostics)
+                i = len(lines) if block[1] is None else block[1] + 1
+                continue
+
+            stripped = lines[i].strip()
+            if diagram_header(stripped):
+                diagnostics.append((i, 0, _to_units(lines[i], len(lines[i])), WARNING, DIAGRAM_OUTSIDE_FENCE))
+                # Строки диаграммы исправляются вместе с заголовком
+                i = advanced.bare_diagram_end(lines, i)
+                continue
+            if advanced.is_stray_fragment(stripped):
+                diagnostics.append((i, 0, _to_units(lines[i], len(lines[i])), WARNING, STRAY_DIAGRAM_LINE))
+            i += 1
+        return diagnostics
+
+    def _analyze_block(self, block, diagnostics):
+        opening, closing = block
+        lines = self.lines
+        fence = lines[opening].strip()
+        width = _to_units(lines[opening], len(lines[opening]))
+        if closing is None:
+            diagnostics.append((opening, 0, width, ERROR, UNCLOSED_FENCE))
+
+        content_end = len(lines) if closing is None else closing
+        if fence == '```' and opening + 1 < content_end and diagram_header(lines[opening + 1].strip()):
+            diagnostics.append((opening, 0, width, WARNING, UNTAGGED_FENCE))
+
+        if fence == '```mermaid' and closing is not None:
+            for index, original, escaped in self._escaped_lines(opening, closing):
+                prefix = 0
+                while prefix < len(original) and original[prefix] == escaped[prefix]:
+                    prefix += 1
+                suffix = 0
+                while (suffix < len(original) - prefix and
+                       original[-1 - suffix] == escaped[-1 - suffix]):
+                    suffix += 1
+                diagnostics.append((index, _to_units(original, prefix),
+                                    _to_units(original, len(original) - suffix), WARNING, UNESCAPED_LABEL))
+
+    def _escaped_lines(self, opening, closing):
+        """Строки блока ```mermaid, которые меняет экранирование"""
+        content = self.lines[opening + 1:closing]
+        escaped = advanced.escape_mermaid_block('\n'.join(content)).split('\n')
+        for offset, (original, new) in enumerate(zip(content, escaped)):
+            if original != new:
+                yield opening + 1 + offset, original, new
+
+    def apply_change(self, change):
+        """
+        Применяет изменение из textDocument/didChange и обновляет диагностики
+
+        Диапазон, который начинается за последней строкой или кончается
+        раньше, чем начинается, - ValueError; документ тогда не меняется.
+        """
+        if 'range' not in change:
+            self.__init__(change['text'])
+            return
+
+        lines = self.lines
+        start, end = change['range']['start'], change['range']['end']
+        if (not 0 <= start['line'] < len(lines) or
+                (end['line'], end['character']) < (start['line'], start['character'])):
+            raise ValueError(f"Диапазон правки вне документа из {len(lines)} строк: {change['range']}")
+        first, last = start['line'], min(end['line'], len(lines) - 1)
+        prefix = lines[first][:_to_index(lines[first], start['character'])]
+        suffix = lines[last][_to_index(lines[last], end['character']):] if end['line'] < len(lines) else ''
+        new_lines = change['text'].split('\n')
+        new_lines[0] = prefix + new_lines[0]
+        new_lines[-1] += suffix
+
+        old_end = last + 1
+        new_end = first + len(new_lines)
+        delta = new_end - old_end
+        lines[first:old_end] = new_lines
+
+        # Строки ``` в правленом диапазоне заменяются, следующие сдвигаются
+        fences, roles = self._fences, self._roles
+        a = fences.bisect_left(first)
+        b = fences.bisect_left(old_end)
+        new_fences = [first + k for k, line in enumerate(new_lines) if _is_fence(line)]
+        was_unclosed = bool(roles) and roles[-1] != _CLOSE
+        fences.splice(a, b, new_fences)
+        fences.shift(a + len(new_fences), delta)
+        roles[a:b] = [None] * len(new_fences)
+
+        dirty_start, dirty_end = first, new_end
+        if a != b or new_fences:
+            # Изменились блоки от той, что содержит правку, до первой ``` с
+            # прежней ролью (если она внутри блока - до конца этого блока)
+            k = self._pair(a)
+            if a > 0 and roles[a - 1] != _CLOSE:
+                dirty_start = min(dirty_start, self._block_of(a - 1)[0])
+            if k == len(roles):
+                if was_unclosed or (roles and roles[-1] != _CLOSE):
+                    dirty_end = len(lines)
+                elif roles:
+                    dirty_end = max(dirty_end, fences[k - 1] + 1)
+            elif roles[k] == _OPEN:
+                dirty_end = max(dirty_end, fences[k])
+            else:
+                closing = self._block_of(k)[1]
+                dirty_end = max(dirty_end, len(lines) if closing is None else closing + 1)
+
+        # Заново анализируются единицы от последней границы до правки до
+        # первой границы после нее; обе границы не зависят от правки
+        unit_start = self._unit_start_at_or_before(min(dirty_start, first) - 1) if dirty_start > 0 else 0
+        unit_end = self._unit_start_at_or_after(dirty_end + 1) if dirty_end < len(lines) else len(lines)
+        old_unit_end = unit_end - delta if unit_end > first else unit_end
+
+        diagnostic_lines = self._diagnostic_lines
+        a = diagnostic_lines.bisect_left(unit_start)
+        b = diagnostic_lines.bisect_left(old_unit_end)
+        diagnostics = self._analyze(unit_start, unit_end)
+        diagnostic_lines.splice(a, b, [diagnostic[0] for diagnostic in diagnostics])
+        diagnostic_lines.shift(a + len(diagnostics), delta)
+        self._diagnostic_rest[a:b] = [diagnostic[1:] for diagnostic in diagnostics]
+
+    def diagnostics(self, first=0, last=None):
+        """Диагностики строк [first, last] (по умолчанию - все) в формате LSP"""
+        lines = self._diagnostic_lines
+        a = lines.bisect_left(first) if first else 0
+        b = len(lines) if last is None else lines.bisect_left(last + 1)
+        return [{
+            'range': {'start': {'line': line, 'character': start},
+                      'end': {'line': line, 'character': end}},
+            'severity': severity,
+            'source': SOURCE,
+            'code': code,
+            'message': _MESSAGES[code],
+        } for line, (start, end, severity, code) in zip(lines.slice(a, b), self._diagnostic_rest[a:b])]
+
+    def _insert_line(self, index, text):
+        """Правка, вставляющая строку перед строкой index (или в конец)"""
+        if index < len(self.lines):
+            position = {'line': index, 'character': 0}
+            return {'range': {'start': position, 'end': position}, 'newText': text + '\n'}
+        last = len(self.lines) - 1
+        position = {'line': last, 'character': _to_units(self.lines[last], len(self.lines[last]))}
+        return {'range': {'start': position, 'end': position}, 'newText': '\n' + text}
+
+    def quick_fix(self, line, code):
+        """Правки (TextEdit), исправляющие диагностику code в строке line"""
+        lines = self.lines
+        text = lines[line]
+        if code == UNCLOSED_FENCE:
+            end = len(lines)
+            if text.strip() == '```mermaid':
+                end = line + 1 + len(advanced.truncate_unclosed(lines[line + 1:]))
+            return [self._insert_line(end, '```')]
+
+        if code == UNTAGGED_FENCE:
+            position = {'line': line, 'character': _to_units(text, text.index('```') + 3)}
+            return [{'range': {'start': position, 'end': position}, 'newText': 'mermaid'}]
+
+        if code == DIAGRAM_OUTSIDE_FENCE:
+            end = advanced.bare_diagram_end(lines, line)
+            return [self._insert_line(line, '```mermaid'), self._insert_line(end, '```')]
+
+        if code == STRAY_DIAGRAM_LINE:
+            if line + 1 < len(lines):
+                start, end = {'line': line, 'character': 0}, {'line': line + 1, 'character': 0}
+            else:
+                previous = lines[line - 1] if line else ''
+                start = {'line': max(line - 1, 0), 'character': _to_units(previous, len(previous)) if line else 0}
+                end = {'line': line, 'character': _to_units(text, len(text))}
+            return [{'range': {'start': start, 'end': end}, 'newText': ''}]
+
+        if code == UNESCAPED_LABEL:
+            opening, closing = self._block_at(line)
+            for index, original, escaped in self._escaped_lines(opening, closing):
+                if index == line:
+                    end = {'line': line, 'character': _to_units(original, len(original))}
+                    return [{'range': {'start': {'line': line, 'character': 0}, 'end': end},
+                             'newText': escaped}]
+        return []
+
+
+class Server:
+    """
+    Сервер LSP: чтение сообщений JSON-RPC из stdin и ответы в stdout
+    """
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+        self.documents = {}
+        self._shutdown = False
+
+    def _read_message(self):
+        length = None
+        while True:
+            header = self._reader.readline()
+            if not header:
+                return None
+            header = header.strip()
+            if not header:
+                break
+            name, _, value = header.decode('ascii').partition(':')
+            if name.lower() == 'content-length':
+                length = int(value)
+        if length is None:
+            return None
+        return json.loads(self._reader.read(length).decode('utf-8'))
+
+    def send(self, message):
+        message['jsonrpc'] = '2.0'
+        body = json.dumps(message, ensure_ascii=False).encode('utf-8')
+        self._writer.write(b'Content-Length: %d\r\n\r\n' % len(body) + body)
+        self._writer.flush()
+
+    def _publish(self, uri):
+        document = self.documents.get(uri)
+        diagnostics = document.diagnostics() if document is not None else []
+        self.send({'method': 'textDocument/publishDiagnostics',
+                   'params': {'uri': uri, 'diagnostics': diagnostics}})
+
+    def initialize(self, params):
+        return {
+            'capabilities': {
+                'positionEncoding': 'utf-16',
+                # Инкрементальная синхронизация: клиент присылает только правки
+                'textDocumentSync': {'openClose': True, 'change': 2},
+                'codeActionProvider': {'codeActionKinds': ['quickfix', 'source.fixAll']},
+            },
+            'serverInfo': {'name': SOURCE},
+        }
+
+    def shutdown(self, params):
+        self._shutdown = True
+        return None
+
+    def did_open(self, params):
+        document = params['textDocument']
+        self.documents[document['uri']] = Document(document['text'])
+        self._publish(document['uri'])
+
+    def did_change(self, params):
+        uri = params['textDocument']['uri']
+        document = self.documents[uri]
+        for change in params['contentChanges']:
+            document.apply_change(change)
+        self._publish(uri)
+
+    def did_close(self, params):
+        uri = params['textDocument']['uri']
+        self.documents.pop(uri, None)
+        self._publish(uri)
+
+    def code_action(self, params):
+        uri = params['textDocument']['uri']
+        document = self.documents.get(uri)
+        if document is None:
+            return []
+        only = params.get('context', {}).get('only')
+        actions = []
+
+        if not only or 'quickfix' in only:
+            first, last = params['range']['start']['line'], params['range']['end']['line']
+            for diagnostic in document.diagnostics(first, last):
+                line, code = diagnostic['range']['start']['line'], diagnostic['code']
+                edits = document.quick_fix(line, code)
+                if edits:
+                    actions.append({'title': _FIX_TITLES[code], 'kind': 'quickfix',
+                                    'diagnostics': [diagnostic], 'isPreferred': True,
+                                    'edit': {'changes': {uri: edits}}})
+
+        if not only or 'source.fixAll' in only or 'source' in only:
+            text = document.text
+            result = fix(text, 'advanced')
+            if result.changed:
+                last = len(document.lines) - 1
+                end = {'line': last, 'character': _to_units(document.lines[last], len(document.lines[last]))}
+                actions.append({'title': 'Исправить все Mermaid диаграммы', 'kind': 'source.fixAll',
+                                'edit': {'changes': {uri: [{'range': {'start': {'line': 0, 'character': 0},
+                                                                      'end': end},
+                                                            'newText': result.text}]}}})
+        return actions
+
+    _REQUESTS = {
+        'initialize': initialize,
+        'shutdown': shutdown,
+        'textDocument/codeAction': code_action,
+    }
+
+    _NOTIFICATIONS = {
+        'textDocument/didOpen': did_open,
+        'textDocument/didChange': did_change,
+        'textDocument/didClose': did_close,
+    }
+
+    def handle(self, message):
+        """Обрабатывает одно сообщение; возвращает False после exit"""
+        method = message.get('method')
+        if method == 'exit':
+            return False
+
+        if 'id' not in message:
+            handler = self._NOTIFICATIONS.get(method)
+            if handler is None:
+                return True
+            try:
+                handler(self, message.get('params') or {})
+            except Exception as e:
+                # На уведомление нельзя ответить ошибкой: она пишется в журнал
+                # клиента, а сервер продолжает работу
+                self.send({'method': 'window/logMessage',
+                           'params': {'type': LOG_ERROR, 'message': f'{method}: {type(e).__name__}: {e}'}})
+            return True
+
+        handler = self._REQUESTS.get(method)
+        if handler is None:
+            self.send({'id': message['id'], 'error': {'code': -32601, 'message': f'Метод {method} не поддерживается'}})
+            return True
+        try:
+            result = handler(self, message.get('params') or {})
+        except Exception as e:
+            self.send({'id': message['id'], 'error': {'code': -32603, 'message': f'{type(e).__name__}: {e}'}})
+            return True
+        self.send({'id': message['id'], 'result': result})
+        return True
+
+    def serve(self):
+        """Обрабатывает сообщения до exit или конца ввода; возвращает код выхода"""
+        while True:
+            message = self._read_message()
+            if message is None or not self.handle(message):
+                return 0 if self._shutdown else 1
+
+
+def main():
+    sys.exit(Server(sys.stdin.buffer, sys.stdout.buffer).serve())
+
+
+if __name__ == "__main__":
+    main()
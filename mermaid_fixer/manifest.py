@@ -0,0 +1,105 @@
+"""
+Манифест запусков: пропуск файлов, не изменившихся с прошлого исправления
+"""
+
+import hashlib
+import json
+import os
+import time
+
+DEFAULT_MANIFEST = '.mermaid_manifest.json'
+
+_FORMAT_VERSION = 1
+
+# Если файл изменен позже, чем за это время до записи в манифест, его mtime
+# не считается надежным: правка в тот же квант времени не изменит mtime
+_RACY_WINDOW_NS = 2 * 10**9
+
+
+def file_sha256(path):
+    """Возвращает SHA-256 содержимого файла, читая его блоками"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    Хранит для каждого файла размер, mtime, хеш содержимого и версию
+    инструмента после последнего исправления
+    
+    Записи разных инструментов (fix_mermaid, fix_mermaid_advanced, ...)
+    хранятся раздельно, поэтому один манифест можно использовать для всех
+    скриптов.
+    """
+    
+    def __init__(self, path, tool, version):
+        self.path = path
+        self.tool = tool
+        self.version = str(version)
+        self._files = {}
+        self.skipped = 0
+    
+    @classmethod
+    def load(cls, path, tool, version):
+        manifest = cls(path, tool, version)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # Нет манифеста или он поврежден - начинаем с пустого
+            return manifest
+        if data.get('format') == _FORMAT_VERSION:
+            manifest._files = data.get('files', {})
+        return manifest
+    
+    def _entry(self, path):
+        return self._files.get(os.path.abspath(path), {}).get(self.tool)
+    
+    def is_fresh(self, path):
+        """
+        Проверяет, что файл не изменился после последнего исправления
+        
+        Совпадение размера и mtime проверяется одним stat без чтения файла.
+        Если изменился только mtime, сравнивается хеш содержимого.
+        """
+        entry = self._entry(path)
+        if entry is None or entry.get('version') != self.version:
+            return False
+        
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if st.st_size != entry['size']:
+            return False
+        if st.st_mtime_ns == entry['mtime_ns'] and not entry.get('racy'):
+            return True
+        
+        if file_sha256(path) != entry['sha256']:
+            return False
+        # Содержимое прежнее (например, файл был затронут touch) - обновляем mtime
+        entry['mtime_ns'] = st.st_mtime_ns
+        entry['racy'] = time.time_ns() - st.st_mtime_ns < _RACY_WINDOW_NS
+        return True
+    
+    def record(self, path):
+        """Запоминает состояние файла после исправления"""
+        st = os.stat(path)
+        self._files.setdefault(os.path.abspath(path), {})[self.tool] = {
+            'version': self.version,
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha256': file_sha256(path),
+            'racy': time.time_ns() - st.st_mtime_ns < _RACY_WINDOW_NS,
+        }
+    
+    def save(self):
+        """Атомарно сохраняет манифест"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'format': _FORMAT_VERSION, 'files': self._files}, f,
+                      ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,145 @@
+"""
+Счетчики и замеры времени этапов исправления (--stats, --stats-json)
+"""
+
+import json
+import sys
+import time
+
+# Подписи счетчиков для отчетов; неизвестные счетчики печатаются по имени
+COUNTER_LABELS = {
+    'lines_scanned': 'Просмотрено строк',
+    'bytes_read': 'Прочитано байт',
+    'bytes_decoded': 'Декодировано байт (быстрый путь)',
+    'bytes_written': 'Записано байт',
+    'bytes_copied': 'Скопировано неизмененных байт (быстрый путь)',
+    'bytes_replaced': 'Записано байт исправленных строк (быстрый путь)',
+    'regions': 'Областей вокруг кандидатов (быстрый путь)',
+    'blocks_opened': 'Встречено блоков ```mermaid',
+    'blocks_closed': 'Добавлено закрывающих ```',
+    'blocks_synthesized': 'Обернуто в ```mermaid диаграмм без блока кода',
+    'blocks_retagged': 'Добавлено указание mermaid в блоки ```',
+    'fragments_dropped': 'Удалено разрозненных частей диаграмм',
+    'fragments_reassembled': 'Собрано разрозненных строк диаграмм',
+    'escapes_applied': 'Экранировано символов',
+    'diagrams_restored': 'Восстановлено диаграмм по библиотеке эталонов',
+    'passes_skipped': 'Пропущено проходов без признаков в тексте',
+}
+
+
+class _NullStage:
+    """Замер, который ничего не измеряет (замеры выключены)"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """
+    Замер одного вызова этапа: собственное время без вложенных этапов
+    """
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._metrics._nested.append([0.0, 0.0])
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        nested = self._metrics._nested
+        nested_wall, nested_cpu = nested.pop()
+        if nested:
+            nested[-1][0] += wall
+            nested[-1][1] += cpu
+
+        record = self._metrics.stages.setdefault(self._name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+        record['wall'] += wall - nested_wall
+        record['cpu'] += cpu - nested_cpu
+        record['calls'] += 1
+        return False
+
+
+class Metrics:
+    """
+    Счетчики событий исправления и (если timing) время этапов
+
+    Счетчики увеличиваются на событиях уровня блоков и областей, а не строк,
+    поэтому их сбор почти ничего не стоит. Замеры времени включаются только
+    по запросу: без них stage() возвращает пустой контекст.
+    """
+
+    def __init__(self, timing=False):
+        self.timing = timing
+        self.stages = {}
+        self.counters = {}
+        self._nested = []
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def stage(self, name):
+        """Контекст замера этапа name (время и число вызовов суммируются)"""
+        if not self.timing:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def as_dict(self):
+        return {'stages': self.stages, 'counters': self.counters}
+
+
+def merge(total, data):
+    """Добавляет результаты as_dict() одного файла к сумме total (тот же формат)"""
+    for name, record in data.get('stages', {}).items():
+        target = total['stages'].setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+        for key in ('wall', 'cpu', 'calls'):
+            target[key] += record[key]
+    for name, value in data.get('counters', {}).items():
+        total['counters'][name] = total['counters'].get(name, 0) + value
+    return total
+
+
+def print_counters(counters, names):
+    """Печатает ненулевые счетчики из списка names"""
+    for name in names:
+        if counters.get(name):
+            print(f"- {COUNTER_LABELS.get(name, name)}: {counters[name]}")
+
+
+def print_table(data):
+    """Печатает время этапов и все счетчики таблицей"""
+    stages = data.get('stages', {})
+    if stages:
+        width = max(len('Этап'), *(len(name) for name in stages))
+        print(f"\n{'Этап':<{width}} {'Время, с':>10} {'CPU, с':>10} {'Вызовов':>8}")
+        for name, record in sorted(stages.items(), key=lambda item: -item[1]['wall']):
+            print(f"{name:<{width}} {record['wall']:>10.4f} {record['cpu']:>10.4f} {record['calls']:>8}")
+
+    counters = data.get('counters', {})
+    if counters:
+        print("\nСчетчики:")
+        order = {name: index for index, name in enumerate(COUNTER_LABELS)}
+        for name in sorted(counters, key=lambda name: (order.get(name, len(order)), name)):
+            print(f"- {COUNTER_LABELS.get(name, name)}: {counters[name]}")
+
+
+def write_json(data, path):
+    """Записывает результаты в JSON (path '-' - стандартный вывод)"""
+    if path == '-':
+        json.dump(data, sys.stdout, ensure_ascii=False, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
@@ -0,0 +1,244 @@
+"""
+Фильтр pandoc (JSON): исправление Mermaid диаграмм прямо в AST документа
+
+pandoc передает фильтру AST документа в JSON на stdin и читает измененный
+AST из stdout, поэтому Markdown не нужно исправлять на диске и разбирать
+заново. Фильтр смотрит только на блоки, которые могут быть частью
+диаграммы: CodeBlock с классом mermaid (или без классов, но с заголовком
+диаграммы в первой строке) и абзацы (Para, Plain), текст которых
+начинается с заголовка диаграммы или состоит из строк, похожих на ее
+части. Подряд идущие такие блоки собираются в Markdown (блоки кода - в
+```mermaid, абзацы - текстом через пустую строку) и исправляются той же
+функцией, что и файлы (mermaid_fixer.api.fix), а результат превращается
+обратно в блоки: части в ``` - в CodeBlock, остальной текст - в абзацы
+(неизмененные абзацы остаются прежними узлами). Остальные узлы не
+разбираются и выводятся как есть.
+
+Запуск: pandoc readme.md --filter fix_mermaid_pandoc.py -o документ.docx
+"""
+
+import collections
+import json
+import sys
+
+from mermaid_fixer import api
+from mermaid_fixer.classify import diagram_header
+from mermaid_fixer.flowchart import continues_diagram
+
+# Блоки со списком вложенных блоков, внутри которых ищутся диаграммы
+_CONTAINERS = {'BlockQuote': None, 'Div': 1}
+
+# Обратная замена типографики расширения smart (-- в тире и т.д.)
+_SMART = str.maketrans({'–': '--', '—': '---', '…': '...'})
+
+_QUOTES = {'DoubleQuote': '"', 'SingleQuote': "'"}
+
+
+def _inline_text(inlines, parts):
+    """
+    Добавляет в parts текст элементов абзаца; False, если в абзаце есть
+    оформление, которое в тексте не сохранить
+    """
+    for inline in inlines:
+        kind = inline['t']
+        if kind == 'Str':
+            parts.append(inline['c'].translate(_SMART))
+        elif kind == 'Space':
+            parts.append(' ')
+        elif kind in ('SoftBreak', 'LineBreak'):
+            parts.append('\n')
+        elif kind == 'Quoted':
+            quote = _QUOTES[inline['c'][0]['t']]
+            parts.append(quote)
+            if not _inline_text(inline['c'][1], parts):
+                return False
+            parts.append(quote)
+        elif kind == 'Code':
+            parts.append(inline['c'][1])
+        elif kind == 'RawInline':
+            parts.append(inline['c'][1])
+        else:
+            return False
+    return True
+
+
+def paragraph_text(block):
+    """Текст абзаца (Para, Plain) по строкам или None"""
+    parts = []
+    if not _inline_text(block['c'], parts):
+        return None
+    return ''.join(parts)
+
+
+def _is_diagram_text(text):
+    """Текст абзаца - диаграмма без блока кода или ее разрозненные части"""
+    lines = text.split('\n')
+    if diagram_header(lines[0].strip()):
+        return True
+    return all(continues_diagram(line.strip()) for line in lines)
+
+
+def _only_closes(markdown):
+    """
+    Абзац только из end: он закрывает subgraph диаграммы перед ним, но
+    диаграмму не начинает
+    """
+    return all(line.strip() == 'end' for line in markdown.split('\n'))
+
+
+def _candidate(block):
+    """
+    Markdown блока, если он может быть частью диаграммы, иначе None
+    """
+    kind = block['t']
+    if kind == 'CodeBlock':
+        (_, classes, _), code = block['c']
+        lines = code.split('\n')
+        if 'mermaid' not in classes:
+            # Блок без языка с диаграммой помечается как mermaid (как в
+            # basic.fix_existing_code_blocks)
+            if classes or not diagram_header(lines[0].strip()):
+                return None
+        if any(line.lstrip().startswith('```') for line in lines):
+            return None
+        return f"```mermaid\n{code}\n```"
+    if kind in ('Para', 'Plain'):
+        text = paragraph_text(block)
+        if text is not None and _is_diagram_text(text):
+            return text
+    return None
+
+
+def _paragraph(text):
+    """Новый абзац из текста: слова через Space, строки через SoftBreak"""
+    inlines = []
+    for number, line in enumerate(text.split('\n')):
+        if number:
+            inlines.append({'t': 'SoftBreak'})
+        for index, word in enumerate(line.split()):
+            if index:
+                inlines.append({'t': 'Space'})
+            inlines.append({'t': 'Str', 'c': word})
+    return {'t': 'Para', 'c': inlines}
+
+
+def _to_blocks(text, originals):
+    """
+    Блоки из исправленного Markdown: ``` - CodeBlock, остальное - абзацы
+
+    originals - исходные блоки участка; абзацы с тем же текстом сохраняют
+    свои узлы, блоки кода - атрибуты (по порядку, если первая строка
+    блока не изменилась).
+    """
+    paragraphs = {}
+    attributes = collections.deque()
+    for block, markdown in originals:
+        if block['t'] == 'CodeBlock':
+            attributes.append((block['c'][1].split('\n', 1)[0], block['c'][0]))
+        else:
+            paragraphs.setdefault(markdown, block)
+
+    lines = text.split('\n')
+
+    blocks = []
+    paragraph = []
+
+    def flush():
+        if paragraph:
+            joined = '\n'.join(line.strip() for line in paragraph)
+            blocks.append(paragraphs.get(joined) or _paragraph(joined))
+            paragraph.clear()
+
+    i = 0
+    while i < len(lines):
+        stripped = lines[i].strip()
+        if stripped.startswith('```'):
+            flush()
+            info = stripped[3:].strip()
+            end = i + 1
+            while end < len(lines) and lines[end].strip() != '```':
+                end += 1
+            first = lines[i + 1] if i + 1 < end else ''
+            if attributes and attributes[0][0] == first:
+                identifier, classes, values = attributes.popleft()[1]
+                if info and info not in classes:
+                    classes = [info] + classes
+            else:
+                identifier, classes, values = '', [info] if info else [], []
+            # Пустые строки в конце блока (исправление оставляет их перед
+            # закрывающими ```) pandoc в CodeBlock не хранит
+            code = lines[i + 1:end]
+            while code and not code[-1].strip():
+                code.pop()
+            blocks.append({'t': 'CodeBlock', 'c': [[identifier, classes, values], '\n'.join(code)]})
+            i = end + 1
+            continue
+        if stripped:
+            paragraph.append(lines[i])
+        else:
+            flush()
+        i += 1
+    flush()
+    return blocks
+
+
+def filter_blocks(blocks, strategy=api.DEFAULT_STRATEGY):
+    """
+    Исправляет диаграммы в списке блоков AST и возвращает новый список
+
+    Участки подряд идущих блоков-кандидатов исправляются стратегией
+    strategy; участок, который исправление не меняет, остается прежним.
+    Абзац из одного end участок не начинает.
+    """
+    result = []
+    run = []
+
+    def flush():
+        if not run:
+            return
+        text = '\n\n'.join(markdown for _, markdown in run)
+        fixed = api.fix(text, strategy).text
+        if fixed == text and all(block['t'] != 'CodeBlock' or 'mermaid' in block['c'][0][1] for block, _ in run):
+            result.extend(block for block, _ in run)
+        else:
+            result.extend(_to_blocks(fixed, run))
+        run.clear()
+
+    for block in blocks:
+        markdown = _candidate(block)
+        if markdown is not None and (run or not _only_closes(markdown)):
+            run.append((block, markdown))
+            continue
+        flush()
+        if block['t'] in _CONTAINERS:
+            position = _CONTAINERS[block['t']]
+            if position is None:
+                block['c'] = filter_blocks(block['c'], strategy)
+            else:
+                block['c'][position] = filter_blocks(block['c'][position], strategy)
+        result.append(block)
+    flush()
+    return result
+
+
+def filter_document(document, strategy=api.DEFAULT_STRATEGY):
+    """Исправляет диаграммы в AST документа pandoc (словарь из JSON) на месте"""
+    document['blocks'] = filter_blocks(document['blocks'], strategy)
+    return document
+
+
+def main():
+    """
+    Фильтр pandoc: AST в JSON со stdin, исправленный AST в stdout
+
+    pandoc передает фильтру первым аргументом формат результата; он не
+    влияет на исправление.
+    """
+    document = json.load(sys.stdin.buffer)
+    filter_document(document)
+    sys.stdout.buffer.write(json.dumps(document, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+    sys.stdout.buffer.flush()
+
+
+if __name__ == "__main__":
+    main()
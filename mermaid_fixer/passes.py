@@ -0,0 +1,384 @@
+"""
+Проходы исправления и планировщик, который запускает только нужные
+
+Каждый шаг стратегии (оборачивание диаграмм, исправление структуры
+блоков, сборка разрозненных частей, экранирование, восстановление по
+эталонам) - проход (Pass): функция над текстом и признаки текста, без
+которых она ничего не меняет. Признаки (FACTS) вычисляет один
+предварительный просмотр (Prescan): как быстрый путь по байтам, он одним
+регулярным выражением находит строки-кандидаты (```, заголовки, начала
+частей и операторов диаграмм) и разбирает только их. Стратегии basic,
+advanced и complete - наборы проходов (PRESETS), которые их модули
+регистрируют при импорте; проходы без своих признаков пропускаются,
+поэтому текст без диаграмм и текст с исправными диаграммами почти не
+обрабатываются.
+
+Признаки вычисляются по исходному тексту, поэтому они должны быть
+необходимыми условиями для текста после предыдущих проходов набора.
+Например, исправление структуры не создает строк, похожих на части
+диаграмм, а вне блоков их оставляет только там, где оно само что-то
+меняет, - поэтому сироты для сборки определяются по исходному тексту.
+"""
+
+import functools
+import re
+
+from mermaid_fixer.classify import DIAGRAM_KEYWORDS, diagram_header
+from mermaid_fixer.flowchart import STATEMENT_START
+from mermaid_fixer.reassemble import is_fragment
+
+# Признаки текста: имя -> описание
+FACTS = {
+    'fence': 'есть ``` (в начале строки или внутри нее)',
+    'loose_header': 'есть заголовок диаграммы без учета регистра не в начале блока ```mermaid',
+    'broken': 'есть заголовок вне блока ```mermaid или незакрытый блок ```mermaid',
+    'orphan': 'после исправления структуры вне блоков могут остаться части диаграмм',
+    'label': 'в блоках ```mermaid (или там, куда они могут попасть) есть " или <',
+    'part': 'есть заголовок, оператор или часть диаграммы или --> в тексте',
+}
+
+# Сколько строк назад от заголовка ищется ```mermaid: заголовок уже в
+# блоке, если ближайшая к нему из этих строк, которая начинается с ```,
+# начинается с ```mermaid (см. basic.fix_mermaid_diagrams)
+HEADER_LOOKBACK = 10
+
+# Признаки, которые вычисляются после просмотра строк, и признаки, от
+# которых они зависят
+_TEXT_FACTS = frozenset(('label',))
+_LABEL_DEPENDS = frozenset(('broken', 'orphan'))
+
+_KEYWORDS = '|'.join(sorted((re.escape(keyword) for keyword in DIAGRAM_KEYWORDS), key=len, reverse=True))
+_FIRST_CHARS = ''.join(sorted({keyword[0].lower() for keyword in DIAGRAM_KEYWORDS} |
+                              {keyword[0].upper() for keyword in DIAGRAM_KEYWORDS}))
+
+# Начала строк-кандидатов по видам строк: ```, ключевые слова заголовков
+# (точная проверка - diagram_header; без учета регистра - только первая
+# буква, как в diagram_header: шаблон без учета регистра в разы медленнее)
+# и начала операторов, которые разбирает flowchart.statement (и частей
+# диаграмм, reassemble.is_fragment)
+_LINE_KINDS = {
+    'fence': r'```',
+    'header': _KEYWORDS,
+    'loose_header': '[' + re.escape(_FIRST_CHARS) + ']',
+    'statement': STATEMENT_START,
+}
+
+# Виды строк, по которым вычисляется каждый признак
+_FACT_LINES = {
+    'fence': ('fence',),
+    'loose_header': ('fence', 'loose_header'),
+    'broken': ('fence', 'header'),
+    'orphan': ('fence', 'header', 'statement'),
+    'label': (),
+    'part': ('header', 'statement'),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _line_patterns(kinds):
+    """
+    Шаблоны первой и остальных строк-кандидатов видов kinds; второй
+    начинается с '\n', поэтому поиск идет быстрым сканированием литерала
+    """
+    body = r'[^\S\n]*(?:' + '|'.join(_LINE_KINDS[kind] for kind in sorted(kinds)) + ')'
+    return re.compile(body), re.compile('\n' + body)
+
+
+def _candidate_lines(text, kinds):
+    """Начала и концы строк-кандидатов видов kinds по порядку"""
+    if not kinds:
+        return
+    first_line, next_line = _line_patterns(kinds)
+    if first_line.match(text):
+        end = text.find('\n')
+        yield 0, len(text) if end == -1 else end
+    for match in next_line.finditer(text):
+        start = match.start() + 1
+        end = text.find('\n', match.end())
+        yield start, len(text) if end == -1 else end
+
+
+def _candidate_lines_of(lines, kinds, seen):
+    """
+    Номера строк-кандидатов видов kinds и сами строки из итерируемого
+    объекта строк без '\\n'; в seen добавляются '-->', '```' и '"<', если
+    такие символы есть в просмотренных строках
+    """
+    first_line = _line_patterns(kinds)[0] if kinds else None
+    for number, line in enumerate(lines):
+        if '-->' in line:
+            seen.add('-->')
+        if '```' in line:
+            seen.add('```')
+        if '"' in line or '<' in line:
+            seen.add('"<')
+        if first_line is not None and first_line.match(line):
+            yield number, line
+
+
+def _has_label_chars(text, start, end):
+    return text.find('"', start, end) != -1 or text.find('<', start, end) != -1
+
+
+class Prescan:
+    """
+    Признаки текста (FACTS), найденные одним просмотром
+
+    facts - множество выполненных признаков. Просматриваются только строки
+    тех видов, которые нужны признакам из wanted, и просмотр заканчивается,
+    как только все они выполнены, поэтому остальные признаки неточны; если
+    какого-то признака из wanted нет, просмотр дошел до конца текста.
+    mermaid_blocks - число блоков ```mermaid, как их считает исправление
+    структуры (точное, если нет признака broken).
+
+    Блоки отслеживаются так же, как их видят проходы: для сборки
+    (reassemble) блок открывает любая строка с ```, для исправления
+    структуры - только ```mermaid, а закрывает строка ```.
+
+    Вместо текста можно передать итерируемый объект его строк без '\\n'
+    (например, строки потока): тогда они читаются по одной, не собираясь в
+    текст, а признак label выполнен, если " или < есть в любой строке.
+    """
+
+    __slots__ = ('facts', 'mermaid_blocks')
+
+    def __init__(self, text, wanted=frozenset(FACTS)):
+        facts = set()
+        lines_wanted = wanted - _TEXT_FACTS
+        if 'label' in wanted:
+            lines_wanted |= _LABEL_DEPENDS
+        kinds = frozenset(kind for fact in lines_wanted for kind in _FACT_LINES[fact])
+        seen = set()
+        if isinstance(text, str):
+            if '-->' in text:
+                facts.add('part')
+            candidates = ((start, text[start:end]) for start, end in _candidate_lines(text, kinds))
+        else:
+            # Позиции строк - их номера
+            candidates = _candidate_lines_of(text, kinds, seen)
+            text = None
+        fence = False
+        mermaid = False
+        fragment = False
+        # Строки в блоках, которые еще не проверены на части диаграмм
+        pending = []
+        # Последняя строка с ``` для loose_header: (начало, начинается ли с
+        # ```mermaid)
+        last_fence = None
+        first_bare = None
+        self.mermaid_blocks = 0
+
+        for start, line in candidates:
+            if '-->' in seen:
+                facts.add('part')
+            if lines_wanted <= facts:
+                break
+            stripped = line.strip()
+
+            if stripped.startswith('```'):
+                facts.add('fence')
+                closing = stripped == '```'
+                fence = not closing if fence else True
+                if mermaid:
+                    mermaid = not closing
+                elif stripped == '```mermaid':
+                    mermaid = True
+                    self.mermaid_blocks += 1
+                last_fence = start, stripped.startswith('```mermaid')
+                continue
+
+            if diagram_header(stripped, ignore_case=True) is not None:
+                if not self._in_block(text, start, last_fence):
+                    facts.add('loose_header')
+                if diagram_header(stripped) is not None:
+                    facts.add('part')
+                    if not mermaid:
+                        facts.add('broken')
+                        if first_bare is None:
+                            first_bare = start
+                        fragment = fragment or self._any_fragment(pending, facts)
+                        if fragment:
+                            facts.add('orphan')
+
+            if not fence or 'broken' in facts or ('part' in lines_wanted and 'part' not in facts):
+                if is_fragment(stripped):
+                    fragment = True
+                    facts.add('part')
+                    if not fence or 'broken' in facts:
+                        facts.add('orphan')
+            elif not fragment:
+                # Часть диаграммы в блоке важна, только если дальше найдется
+                # заголовок вне блоков или незакрытый блок: до тех пор
+                # строки в блоках (например, код) не разбираются
+                pending.append(stripped)
+
+        if mermaid:
+            # Незакрытый блок исправление структуры обрежет, и часть его
+            # строк окажется вне блоков
+            facts.add('broken')
+            if fragment or self._any_fragment(pending, facts):
+                facts.add('orphan')
+
+        if text is None and 'label' in wanted:
+            # Просмотр мог закончиться раньше: " и < ищутся в остальных строках
+            for _ in candidates:
+                if '"<' in seen:
+                    break
+        if '-->' in seen:
+            facts.add('part')
+        if 'fence' in wanted and 'fence' not in facts and ('```' in seen if text is None else '```' in text):
+            # ``` внутри строки: после оборачивания диаграмм он может
+            # оказаться в начале строки (см. basic.fix_existing_code_blocks)
+            facts.add('fence')
+        if 'label' in wanted and ('"<' in seen if text is None else self._label(text, facts, first_bare)):
+            facts.add('label')
+        self.facts = frozenset(facts)
+
+    @staticmethod
+    def _in_block(text, start, last_fence):
+        """
+        Считает ли basic заголовок с позиции start уже находящимся в блоке:
+        последняя строка с ``` перед ним (last_fence) начинается с
+        ```mermaid и отстоит не больше чем на HEADER_LOOKBACK строк (без
+        текста позиции - номера строк)
+        """
+        if last_fence is None or not last_fence[1]:
+            return False
+        if text is None:
+            return last_fence[0] >= start - HEADER_LOOKBACK
+        limit = start
+        for _ in range(HEADER_LOOKBACK):
+            if not limit:
+                break
+            limit = text.rfind('\n', 0, limit - 1) + 1
+        return last_fence[0] >= limit
+
+    @staticmethod
+    def _any_fragment(pending, facts):
+        """Есть ли среди отложенных строк части диаграмм (список очищается)"""
+        found = any(map(is_fragment, pending))
+        pending.clear()
+        if found:
+            facts.add('part')
+        return found
+
+    @staticmethod
+    def _label(text, facts, first_bare):
+        """
+        Есть ли " или < там, где их может экранировать escape: в блоках
+        ```mermaid (незакрытый - до конца текста), после первого заголовка
+        вне блоков (его обернет исправление структуры) или где угодно, если
+        сборка может перенести в блоки строки вне них
+        """
+        if 'orphan' in facts:
+            return _has_label_chars(text, 0, len(text))
+        limit = len(text) if first_bare is None else first_bare
+        if limit < len(text) and _has_label_chars(text, limit, len(text)):
+            return True
+        position = 0
+        while True:
+            opening = text.find('```mermaid', position, limit)
+            if opening == -1:
+                return False
+            start = text.find('\n', opening)
+            if start == -1:
+                return False
+            end = text.find('\n```', start + 1)
+            if end == -1:
+                end = len(text)
+            if _has_label_chars(text, start, end):
+                return True
+            position = end + 1
+
+
+class Pass:
+    """
+    Проход исправления
+
+    name - имя (и имя этапа в замерах времени), function(text, metrics=...,
+    **options) - исправление текста, которое получает дополнительные
+    аргументы стратегии (cache, library); с lines функция получает и
+    возвращает итерируемый объект строк без '\\n', и подряд идущие такие
+    проходы обрабатывают строки потоково, не собирая текст между ними.
+    requires - признаки (FACTS), без любого из которых проход ничего не
+    меняет. skipped(prescan, metrics) - необязательный учет счетчиков,
+    которые проход посчитал бы, если бы запускался.
+    """
+
+    __slots__ = ('name', 'function', 'requires', 'skipped', 'lines')
+
+    def __init__(self, name, function, requires=(), skipped=None, lines=False):
+        unknown = set(requires) - FACTS.keys()
+        if unknown:
+            raise ValueError(f"Неизвестные признаки {', '.join(sorted(unknown))}, допустимые: {', '.join(FACTS)}")
+        self.name = name
+        self.function = function
+        self.requires = frozenset(requires)
+        self.skipped = skipped
+        self.lines = lines
+
+    def __repr__(self):
+        return f'Pass({self.name}, requires={sorted(self.requires)})'
+
+
+# Наборы проходов стратегий: имя -> кортеж Pass (заполняются модулями
+# стратегий при импорте)
+PRESETS = {}
+
+
+def preset(name, *passes):
+    """Регистрирует набор проходов name и возвращает его"""
+    PRESETS[name] = passes
+    return passes
+
+
+def run(passes, text, metrics=None, prescan=None, **options):
+    """
+    Выполняет над текстом проходы (кортеж Pass или имя набора из PRESETS),
+    признаки которых есть в тексте, и возвращает результат
+
+    Признаки вычисляются одним просмотром до первого прохода, если не
+    передан уже вычисленный prescan (Prescan). Вместо текста можно передать
+    итерируемый объект строк без '\\n' вместе с prescan: тогда результат -
+    итератор строк, и проходы с lines обрабатывают их потоково. metrics -
+    необязательный Metrics: время просмотра (этап prescan) и проходов и
+    счетчик пропущенных проходов (passes_skipped); если в нем включены
+    замеры времени, строки каждого прохода с lines собираются в список
+    внутри его этапа (иначе их время не разделить). options передаются
+    всем проходам.
+    """
+    if isinstance(passes, str):
+        passes = PRESETS[passes]
+    lines = not isinstance(text, str)
+    if prescan is None:
+        if lines:
+            raise ValueError("Для строк нужен уже вычисленный prescan")
+        wanted = frozenset().union(*(pass_.requires for pass_ in passes))
+        if metrics is None:
+            prescan = Prescan(text, wanted)
+        else:
+            with metrics.stage('prescan'):
+                prescan = Prescan(text, wanted)
+
+    result = text
+    returns_lines = lines
+    for pass_ in passes:
+        if not pass_.requires <= prescan.facts:
+            if metrics is not None:
+                metrics.count('passes_skipped')
+                if pass_.skipped is not None:
+                    pass_.skipped(prescan, metrics)
+            continue
+        if pass_.lines != lines:
+            result = result.split('\n') if pass_.lines else '\n'.join(result)
+            lines = pass_.lines
+        if metrics is None:
+            result = pass_.function(result, **options)
+            continue
+        with metrics.stage(pass_.name):
+            result = pass_.function(result, metrics=metrics, **options)
+            if lines and metrics.timing:
+                result = list(result)
+    if returns_lines:
+        return iter(result if lines else result.split('\n'))
+    return '\n'.join(result) if lines else result
@@ -0,0 +1,232 @@
+"""
+Сборка разрозненных частей диаграмм по идентификаторам узлов
+
+Строки вне блоков кода, которые разбираются как операторы flowchart
+диаграммы (A --> B, A[Лейбл], subgraph, classDef, class, %%; см.
+flowchart.continues_diagram), не удаляются, а возвращаются в диаграммы.
+Обычный текст, даже похожий на них (CRM -- это система..., API [см.
+ниже] возвращает...), оператором не разбирается и остается на месте.
+Сборка идет после исправления структуры (блоки уже закрыты):
+
+1. Один проход по строкам находит блоки ```mermaid и строки-сироты вне
+   блоков. Без сирот текст возвращается как есть, диаграммы не
+   разбираются.
+2. Сироты объединяются в группы системой непересекающихся множеств
+   (union-find): строки с общим идентификатором узла и соседние строки
+   (между ними только пустые) попадают в одну группу.
+3. Для идентификаторов сирот запоминается, в каких flowchart диаграммах
+   они встречаются. Группа переносится в конец ближайшей к ней диаграммы,
+   где есть ее узлы (ближайшая среди диаграмм каждого идентификатора
+   ищется двоичным поиском), а если такой нет и в группе есть связь -
+   в новый блок ```mermaid на месте первой строки группы. Группы без
+   узлов (classDef, %%) и группы из одних узлов без подходящей диаграммы
+   остаются на месте: по ним нельзя понять, к какой диаграмме они
+   относятся и диаграмма ли это вообще.
+
+Время почти линейно по числу строк: каждая строка просматривается один
+раз, диаграммы разбираются один раз и только при наличии сирот.
+"""
+
+import bisect
+import re
+
+from mermaid_fixer.classify import diagram_header
+from mermaid_fixer.flowchart import EDGE, STATEMENT_START, Flowchart, continues_diagram, statement
+
+# Быстрая проверка начала строки перед разбором
+_FRAGMENT_START = re.compile(STATEMENT_START)
+
+_MERMAID_OPENING = re.compile(r'```mermaid\s*$')
+_FENCE_CLOSING = re.compile(r'```\s*$')
+
+# Заголовок нового блока для группы, которую не к чему присоединить
+NEW_DIAGRAM_HEADER = 'graph TD'
+
+
+def is_fragment(stripped):
+    """Строка (без отступов) - часть flowchart диаграммы, если она вне блоков"""
+    return _FRAGMENT_START.match(stripped) is not None and continues_diagram(stripped)
+
+
+class _Groups:
+    """Непересекающиеся множества номеров 0..count-1 (union-find)"""
+
+    def __init__(self, count):
+        self.parent = list(range(count))
+
+    def find(self, item):
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            # Корень - меньший номер: корень группы - ее первая строка
+            if second < first:
+                first, second = second, first
+            self.parent[second] = first
+
+
+def _scan(lines):
+    """
+    Блоки ```mermaid (строка открытия, строка закрытия) и сироты - строки
+    вне блоков, которые разбираются как части диаграмм (is_fragment); для каждой сироты - связана ли
+    она с предыдущей (между ними только пустые строки)
+    """
+    diagrams = []
+    orphans = []
+    adjacent = []
+    fence = None
+    mermaid = False
+    previous = -1
+    last_orphan = -2
+    for index, line in enumerate(lines):
+        stripped = line.strip()
+        if fence is not None:
+            if _FENCE_CLOSING.match(stripped):
+                if mermaid:
+                    diagrams.append((fence, index))
+                fence = None
+            continue
+        if not stripped:
+            continue
+        if stripped.startswith('```'):
+            fence = index
+            mermaid = _MERMAID_OPENING.match(stripped) is not None
+        elif is_fragment(stripped):
+            orphans.append(index)
+            adjacent.append(previous == last_orphan)
+            last_orphan = index
+        previous = index
+    return diagrams, orphans, adjacent
+
+
+def _node_ids(chart):
+    return chart.ids + chart.subgraphs
+
+
+def _diagram_ids(lines, opening, closing):
+    """
+    Идентификаторы узлов flowchart диаграммы между строками opening и
+    closing или None для диаграмм других видов
+    """
+    chart = Flowchart()
+    header = True
+    for line in lines[opening + 1:closing]:
+        stripped = line.strip()
+        if not stripped or stripped.startswith('%%'):
+            continue
+        if header:
+            header = False
+            kind = diagram_header(stripped)
+            if kind is not None:
+                if kind != 'flowchart':
+                    return None
+                continue
+        statement(stripped, chart)
+    return _node_ids(chart)
+
+
+def _nearest(places, openings, closings, first, last):
+    """
+    Ближайшая к строкам first..last диаграмма из номеров places (по
+    возрастанию): (расстояние в строках, номер)
+    """
+    k = bisect.bisect_left(places, bisect.bisect_left(openings, first))
+    best = None
+    if k > 0:
+        before = places[k - 1]
+        best = (first - closings[before], before)
+    if k < len(places):
+        after = places[k]
+        candidate = (openings[after] - last, after)
+        if best is None or candidate < best:
+            best = candidate
+    return best
+
+
+def reassemble(lines, metrics=None):
+    """
+    Возвращает строки, в которых разрозненные части диаграмм вне блоков
+    перенесены в диаграммы с теми же узлами или в новые блоки ```mermaid
+
+    lines - список строк без '\\n' с исправленной структурой блоков;
+    если переносить нечего, возвращается он же. metrics - необязательный Metrics для
+    счетчиков fragments_reassembled и blocks_synthesized.
+    """
+    diagrams, orphans, adjacent = _scan(lines)
+    if not orphans:
+        return lines
+
+    groups = _Groups(len(orphans))
+    owners = {}
+    edges = set()
+    for number, index in enumerate(orphans):
+        if adjacent[number]:
+            groups.union(number - 1, number)
+        chart = Flowchart()
+        if statement(lines[index].strip(), chart) == EDGE:
+            edges.add(number)
+        for node_id in _node_ids(chart):
+            groups.union(owners.setdefault(node_id, number), number)
+
+    # Диаграммы, в которых встречается каждый идентификатор сирот, по
+    # порядку
+    places = {}
+    for number, (opening, closing) in enumerate(diagrams):
+        node_ids = _diagram_ids(lines, opening, closing)
+        if node_ids is None:
+            continue
+        for node_id in set(node_ids):
+            if node_id in owners:
+                places.setdefault(node_id, []).append(number)
+    openings = [opening for opening, _ in diagrams]
+    closings = [closing for _, closing in diagrams]
+
+    members = {}
+    for number in range(len(orphans)):
+        members.setdefault(groups.find(number), []).append(number)
+    group_ids = {}
+    for node_id, owner in owners.items():
+        group_ids.setdefault(groups.find(owner), []).append(node_id)
+
+    appended = {}
+    fenced = {}
+    skipped = set()
+    for root, numbers in members.items():
+        first, last = orphans[numbers[0]], orphans[numbers[-1]]
+        candidates = [places[node_id] for node_id in group_ids.get(root, ()) if node_id in places]
+        best = min((_nearest(places_of, openings, closings, first, last) for places_of in candidates),
+                   default=None)
+        if best is None and not any(number in edges for number in numbers):
+            continue
+        moved = [lines[orphans[number]] for number in numbers]
+        if best is None:
+            fenced[first] = moved
+        else:
+            appended.setdefault(closings[best[1]], []).extend(moved)
+        skipped.update(orphans[number] for number in numbers)
+
+    if not skipped:
+        return lines
+    if metrics is not None:
+        metrics.count('fragments_reassembled', len(skipped))
+        metrics.count('blocks_synthesized', len(fenced))
+
+    result = []
+    for index, line in enumerate(lines):
+        if index in appended:
+            result.extend(appended[index])
+        if index in skipped:
+            if index in fenced:
+                result.append('```mermaid')
+                result.append(NEW_DIAGRAM_HEADER)
+                result.extend(fenced[index])
+                result.append('```')
+            continue
+        result.append(line)
+    return result
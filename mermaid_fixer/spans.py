@@ -0,0 +1,298 @@
+"""
+Вывод исправления частями исходного буфера
+
+Исправленная область файла почти целиком состоит из строк, которые
+исправление не изменило. Поэтому вывод описывается правками (начало,
+конец, замена): байты data[начало:конец] заменяются байтами замены, а все
+между правками берется из исходного буфера (mmap или байты) срезами
+memoryview, без копирования. narrow сужает правку области до измененных
+строк, а SpanWriter записывает срезы и замены векторными вызовами
+(os.writev) по мере поступления правок, не собирая вывод в памяти.
+"""
+
+import os
+
+# Сколько строк вперед просматривается, чтобы найти, где исходные и
+# исправленные строки снова совпадают: сначала ближние, затем дальние
+_WINDOWS = (4, 32)
+
+# Наибольшая и наименьшая части, которыми сравниваются совпадающие
+# участки: после совпадения часть увеличивается вдвое, после несовпадения
+# уменьшается вдвое
+_CHUNK = 64 * 1024
+_MIN_CHUNK = 256
+
+# Сколько частей передается одному вызову os.writev и сколько байт замен
+# копится до записи
+try:
+    _IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = 1024
+_PENDING_BYTES = 1 << 20
+
+
+def _old_line(data, position, end):
+    """Строка исходных байт с position: (байты без '\\n', есть ли '\\n', следующая позиция)"""
+    newline = data.find(b'\n', position, end)
+    if newline == -1:
+        return data[position:end], False, None
+    return data[position:newline], True, newline + 1
+
+
+def _new_line(text, position):
+    """Строка исправленного текста с position: (байты без '\\n', есть ли '\\n', следующая позиция)"""
+    newline = text.find('\n', position)
+    if newline == -1:
+        return text[position:].encode('utf-8'), False, None
+    return text[position:newline].encode('utf-8'), True, newline + 1
+
+
+def _common_prefix(first, second):
+    """Длина общего начала байтов first и second (двоичный поиск)"""
+    low, high = 0, min(len(first), len(second))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if first[:middle] == second[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _common_suffix(first, second):
+    """Длина общего конца байтов first и second (двоичный поиск)"""
+    low, high = 0, min(len(first), len(second))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if first[len(first) - middle:] == second[len(second) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _skip_equal(data, old, end, text, new):
+    """
+    Пропускает совпадающие строки: частями от _MIN_CHUNK до _CHUNK, а в
+    несовпавшей части - до начала строки с первым отличием; строки без
+    '\\n' в пределах части - по одной. Позиции None - строки закончились.
+    """
+    size = _MIN_CHUNK
+    while old is not None and new is not None:
+        chunk_end = text.rfind('\n', new, new + size)
+        if chunk_end == -1:
+            if size >= _CHUNK:
+                break
+            size *= 2
+            continue
+        encoded = text[new:chunk_end + 1].encode('utf-8')
+        original = data[old:min(old + len(encoded), end)]
+        if original == encoded:
+            old += len(encoded)
+            new = chunk_end + 1
+            size = min(size * 2, _CHUNK)
+            continue
+        # Граница строк перед первым отличием - граница символов UTF-8
+        equal = encoded.rfind(b'\n', 0, _common_prefix(original, encoded)) + 1
+        old += equal
+        new += len(encoded[:equal].decode('utf-8'))
+        return old, new
+
+    while old is not None and new is not None:
+        old_line, old_newline, old_next = _old_line(data, old, end)
+        new_line, new_newline, new_next = _new_line(text, new)
+        if old_newline != new_newline or old_line != new_line:
+            break
+        old, new = old_next, new_next
+    return old, new
+
+
+def _equal_tail(data, old, end, text, new):
+    """
+    Начала общего конца data[old:end] и text[new:] из целых строк (в байтах и
+    символах): частями от конца, как в _skip_equal
+    """
+    old_end, new_end = end, len(text)
+    size = _MIN_CHUNK
+    while old_end > old and new_end > new:
+        chunk_start = max(new, new_end - size)
+        if chunk_start > new:
+            # Часть начинается с начала строки
+            chunk_start = text.find('\n', chunk_start, new_end - 1) + 1
+            if not chunk_start:
+                if size >= _CHUNK:
+                    break
+                size *= 2
+                continue
+        encoded = text[chunk_start:new_end].encode('utf-8')
+        original = data[max(old, old_end - len(encoded)):old_end]
+        if original == encoded:
+            old_end -= len(encoded)
+            new_end = chunk_start
+            size = min(size * 2, _CHUNK)
+            continue
+        # Общий конец - с начала строки после последнего отличия
+        equal = encoded.find(b'\n', len(encoded) - _common_suffix(original, encoded) - 1) + 1 or len(encoded)
+        old_end -= len(encoded) - equal
+        new_end = chunk_start + len(encoded[:equal].decode('utf-8'))
+        break
+    return old_end, new_end
+
+
+def _lines_ahead(read, position, count):
+    """До count строк с position: [(байты, есть ли '\\n', следующая позиция)]"""
+    lines = []
+    while position is not None and len(lines) < count:
+        line = read(position)
+        lines.append(line)
+        position = line[2]
+    return lines
+
+
+def _resync(old_lines, new_lines):
+    """
+    Сколько строк пропустить в исходных и исправленных строках, чтобы они
+    снова совпали (наименьшая сумма), или None
+    """
+    first = {}
+    for number, (line, newline, _) in enumerate(new_lines):
+        first.setdefault((line, newline), number)
+    best = None
+    for skipped, (line, newline, _) in enumerate(old_lines):
+        if best is not None and skipped >= sum(best):
+            break
+        inserted = first.get((line, newline))
+        if inserted is not None and (best is None or skipped + inserted < sum(best)):
+            best = (skipped, inserted)
+    return best
+
+
+def narrow(data, begin, end, text):
+    """
+    Генерирует правки (начало, конец, замена в байтах), которые превращают
+    data[begin:end] (байты UTF-8) в text
+
+    Строки сравниваются по порядку; на несовпадении ищется ближайшее место
+    (в пределах _WINDOWS строк), где они снова совпадают, и правка
+    охватывает только строки между ними; если все отличия в пределах
+    _CHUNK, правка одна. Смещения - от начала data. Текст не кодируется
+    целиком и не разбивается на строки, поэтому память не зависит от
+    размера области.
+    """
+    old, new = begin, 0
+    first = True
+    while True:
+        old, new = _skip_equal(data, old, end, text, new)
+        if old is None and new is None:
+            return
+        if first and old is not None and new is not None:
+            first = False
+            old_end, new_end = _equal_tail(data, old, end, text, new)
+            if old_end - old <= _CHUNK and new_end - new <= _CHUNK:
+                # Отличия недалеко друг от друга: одна правка
+                yield old, old_end, text[new:new_end].encode('utf-8')
+                return
+        start = end if old is None else old
+        replacement = []
+        while old is not None or new is not None:
+            for window in _WINDOWS:
+                old_lines = _lines_ahead(lambda position: _old_line(data, position, end), old, window + 1)
+                new_lines = _lines_ahead(lambda position: _new_line(text, position), new, window + 1)
+                skip = _resync(old_lines, new_lines)
+                if skip is not None:
+                    break
+            found = skip is not None
+            if not found:
+                # Совпадения рядом нет: строки заменяются по одной, пока оно
+                # не найдется (если строки с одной стороны закончились -
+                # все просмотренные с другой)
+                if old_lines and new_lines:
+                    skip = (1, 1)
+                else:
+                    skip = (len(old_lines), len(new_lines))
+            for line, newline, _ in new_lines[:skip[1]]:
+                replacement.append(line + b'\n' if newline else line)
+            if skip[0]:
+                old = old_lines[skip[0] - 1][2]
+            if skip[1]:
+                new = new_lines[skip[1] - 1][2]
+            if found:
+                break
+        yield start, end if old is None else old, b''.join(replacement)
+
+
+class SpanWriter:
+    """
+    Запись данных data с правками в двоичный файл векторными вызовами
+
+    edit() принимает правки по порядку, close() дописывает данные после
+    последней, discard() освобождает данные без записи (до закрытия mmap
+    нужен один из них). Части копятся до _IOV_MAX штук (или _PENDING_BYTES
+    байт замен) и записываются одним os.writev; без os.writev (Windows) -
+    обычной записью по частям. Файл до close() напрямую не используется.
+    copied и replaced - сколько байт записано из data и из замен.
+    """
+
+    def __init__(self, file, data):
+        file.flush()
+        self._file = file
+        self._view = memoryview(data)
+        self._position = 0
+        self._parts = []
+        self._pending = 0
+        self.copied = 0
+        self.replaced = 0
+
+    def edit(self, start, end, replacement):
+        """Заменяет байты data[start:end] на replacement"""
+        if start > self._position:
+            self._add(self._view[self._position:start])
+            self.copied += start - self._position
+        if replacement:
+            self._add(replacement)
+            self.replaced += len(replacement)
+            self._pending += len(replacement)
+        self._position = end
+
+    def close(self):
+        """Дописывает данные после последней правки и освобождает их"""
+        try:
+            if self._position < len(self._view):
+                self._add(self._view[self._position:])
+                self.copied += len(self._view) - self._position
+                self._position = len(self._view)
+            self._flush()
+        finally:
+            self.discard()
+
+    def discard(self):
+        """Отбрасывает незаписанные части и освобождает данные"""
+        self._parts.clear()
+        self._view.release()
+
+    def _add(self, part):
+        self._parts.append(part)
+        if len(self._parts) >= _IOV_MAX or self._pending >= _PENDING_BYTES:
+            self._flush()
+
+    def _flush(self):
+        parts = self._parts
+        if not hasattr(os, 'writev'):
+            for part in parts:
+                self._file.write(part)
+            parts.clear()
+            self._pending = 0
+            return
+        fd = self._file.fileno()
+        while parts:
+            written = os.writev(fd, parts)
+            # Запись могла быть частичной: записанные части отбрасываются,
+            # от недописанной остается хвост
+            done = 0
+            while done < len(parts) and written >= len(parts[done]):
+                written -= len(parts[done])
+                done += 1
+            del parts[:done]
+            if written:
+                parts[0] = memoryview(parts[0])[written:]
+        self._pending = 0
@@ -0,0 +1,10 @@
+"""
+Общие настройки тестов: пакет mermaid_fixer импортируется из корня
+репозитория, как в бенчмарках
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
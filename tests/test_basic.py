@@ -0,0 +1,34 @@
+"""
+Тесты базовой стратегии (mermaid_fixer.basic): поиск ```mermaid перед
+заголовком диаграммы
+"""
+
+import pytest
+
+from mermaid_fixer import basic
+
+
+@pytest.mark.parametrize('text', [
+    # Заголовок после закрытого блока кода, над которым в пределах
+    # _LOOKBACK строк есть ```mermaid
+    '```mermaid\ngraph TD\n    A --> B\n```\n\n```python\nx = 1\n```\n\ngraph LR\n    C --> D\n',
+    '```mermaid\npie\n```\ngraph TD\n    A --> B\n',
+])
+def test_header_after_closed_block_is_wrapped(text):
+    fixed = basic.fix_mermaid_diagrams(text)
+    assert fixed.count('```mermaid') == text.count('```mermaid') + 1
+
+
+@pytest.mark.parametrize('text', [
+    '```mermaid\ngraph TD\n    A --> B\n```\n',
+    '```mermaid\n%% комментарий\n\ngraph TD\n    A --> B\n```\n',
+    # Блок ```mermaid сразу после закрытого блока кода
+    '```python\nx = 1\n```\n\n```mermaid\ngraph TD\n    A --> B\n```\n',
+])
+def test_header_in_mermaid_block_is_not_wrapped(text):
+    assert basic.fix_mermaid_diagrams(text) == text
+
+
+def test_header_far_below_mermaid_opening_is_wrapped():
+    text = '```mermaid\n' + 'Текст\n' * basic._LOOKBACK + 'graph TD\n    A --> B\n'
+    assert basic.fix_mermaid_diagrams(text).count('```mermaid') == 2
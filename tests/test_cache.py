@@ -0,0 +1,98 @@
+"""
+Тесты постоянного кэша блоков (mermaid_fixer.cache): попадания в памяти
+и между запусками, пространства имен и вытеснение по LRU
+"""
+
+import types
+
+import pytest
+
+from mermaid_fixer import advanced, cache
+from mermaid_fixer.cache import BlockCache
+
+# Размер записи: ключ (64 hex-символа) и значение
+VALUE_SIZE = 100
+ENTRY_SIZE = 64 + VALUE_SIZE
+
+
+class Compute:
+    """Функция вычисления, которая запоминает свои вызовы"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, text):
+        self.calls.append(text)
+        return text.upper().ljust(VALUE_SIZE, '.')
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(cache, 'time', types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_lookup_hits_in_memory_and_across_runs(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    compute = Compute()
+    first = BlockCache(path, 'tool:1')
+    value = first.lookup('graph td', compute)
+    assert first.lookup('graph td', compute) == value
+    assert (first.hits, first.misses) == (1, 1)
+    first.close()
+
+    second = BlockCache(path, 'tool:1')
+    assert second.lookup('graph td', compute) == value
+    assert (second.hits, second.misses) == (1, 0)
+    assert compute.calls == ['graph td']
+    second.close()
+
+
+def test_namespaces_are_separate(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    compute = Compute()
+    with_old_version = BlockCache(path, 'tool:1')
+    with_old_version.lookup('graph td', compute)
+    with_old_version.close()
+
+    with_new_version = BlockCache(path, 'tool:2')
+    with_new_version.lookup('graph td', compute)
+    assert with_new_version.misses == 1
+    assert compute.calls == ['graph td', 'graph td']
+    with_new_version.close()
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    path = str(tmp_path / 'cache.sqlite')
+    compute = Compute()
+    blocks = BlockCache(path, 'tool:1', max_bytes=3 * ENTRY_SIZE)
+    for now, text in enumerate(('a', 'b', 'c'), 1):
+        clock[0] = now
+        blocks.lookup(text, compute)
+        blocks.flush()
+
+    # Четвертая запись превышает лимит: вытесняются давно не использованные
+    # записи (b и c), пока размер не станет меньше доли лимита
+    clock[0] = 4
+    blocks.lookup('a', compute)
+    blocks.lookup('d', compute)
+    blocks.close()
+
+    compute.calls.clear()
+    reopened = BlockCache(path, 'tool:1', max_bytes=3 * ENTRY_SIZE)
+    for text in ('a', 'b', 'c', 'd'):
+        reopened.lookup(text, compute)
+    assert compute.calls == ['b', 'c']
+    reopened.close()
+
+
+def test_fix_content_with_cache_matches_without(tmp_path):
+    content = '```mermaid\ngraph TD\n    A["a<b"] --> B[/"<"/]\n```\n'
+    blocks = advanced.open_cache(str(tmp_path / 'cache.sqlite'))
+    try:
+        assert advanced.fix_content(content, cache=blocks) == advanced.fix_content(content)
+        assert advanced.fix_content(content, cache=blocks) == advanced.fix_content(content)
+        assert blocks.hits >= 1
+    finally:
+        blocks.close()
@@ -0,0 +1,120 @@
+"""
+Тесты исправления документов Word (mermaid_fixer.docx): меняется только
+word/document.xml, остальные элементы архива копируются байт в байт, а
+повторное исправление ничего не меняет
+"""
+
+import os
+import struct
+import zipfile
+from xml.sax.saxutils import escape
+
+from mermaid_fixer import advanced, basic, docx
+
+NAMESPACE = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+PARAGRAPHS = (
+    'Процесс обработки заявки',
+    'graph TD',
+    '    A[Начало] --> B{Условие}',
+    '    B -->|да| C',
+    '',
+    'Текст после диаграммы.',
+)
+
+# Другие элементы архива: сжатые и несжатые, с данными, которые похожи на диаграмму
+MEMBERS = (
+    ('[Content_Types].xml', b'<?xml version="1.0"?><Types/>', zipfile.ZIP_DEFLATED),
+    ('word/styles.xml', b'<w:styles>graph TD</w:styles>' * 50, zipfile.ZIP_DEFLATED),
+    ('word/media/image1.png', bytes(range(256)) * 64, zipfile.ZIP_STORED),
+)
+
+_LOCAL_HEADER = struct.Struct('<4s5H3I2H')
+
+
+def paragraph(text):
+    if not text:
+        return '<w:p/>'
+    # Текст первой строки разбит на два фрагмента с разным оформлением
+    runs = [text[:4], text[4:]] if text.startswith('grap') else [text]
+    return '<w:p>' + ''.join(f'<w:r><w:rPr><w:b/></w:rPr><w:t xml:space="preserve">{escape(run)}</w:t></w:r>'
+                             for run in runs) + '</w:p>'
+
+
+def make_docx(path, paragraphs=PARAGRAPHS):
+    document = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                f'<w:document xmlns:w="{NAMESPACE}"><w:body>'
+                + ''.join(paragraph(text) for text in paragraphs) +
+                '<w:sectPr/></w:body></w:document>')
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr(MEMBERS[0][0], MEMBERS[0][1], MEMBERS[0][2])
+        archive.writestr(docx.DOCUMENT_PART, document, zipfile.ZIP_DEFLATED)
+        for name, data, compression in MEMBERS[1:]:
+            archive.writestr(name, data, compression)
+
+
+def raw_members(path):
+    """Локальный заголовок и сжатые данные каждого элемента архива, кроме document.xml"""
+    members = {}
+    with open(path, 'rb') as f, zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.filename == docx.DOCUMENT_PART:
+                continue
+            f.seek(info.header_offset)
+            header = f.read(_LOCAL_HEADER.size)
+            fields = _LOCAL_HEADER.unpack(header)
+            members[info.filename] = header + f.read(fields[-2] + fields[-1] + info.compress_size)
+    return members
+
+
+def test_fix_docx_changes_only_document_text(tmp_path):
+    path = str(tmp_path / 'document.docx')
+    make_docx(path)
+    before = raw_members(path)
+    text = docx.document_text(path)
+
+    result = docx.fix_docx(path, basic.fix_content)
+    assert result['changed']
+    assert result['mermaid_after'] == 1
+    assert docx.document_text(path) == basic.fix_content(text)
+    assert raw_members(path) == before
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        assert [info.filename for info in archive.infolist()] == [
+            MEMBERS[0][0], docx.DOCUMENT_PART] + [name for name, _, _ in MEMBERS[1:]]
+        for name, data, _ in MEMBERS:
+            assert archive.read(name) == data
+
+
+def test_fix_docx_is_idempotent(tmp_path):
+    path = str(tmp_path / 'document.docx')
+    make_docx(path)
+    docx.fix_docx(path, advanced.fix_content)
+    with open(path, 'rb') as f:
+        fixed = f.read()
+
+    result = docx.fix_docx(path, advanced.fix_content)
+    assert not result['changed']
+    with open(path, 'rb') as f:
+        assert f.read() == fixed
+
+
+def test_clean_docx_is_not_rewritten(tmp_path):
+    path = str(tmp_path / 'document.docx')
+    make_docx(path, ('Текст без диаграмм', '', 'Еще абзац'))
+    mtime = os.stat(path).st_mtime_ns
+    with open(path, 'rb') as f:
+        original = f.read()
+
+    assert not docx.fix_docx(path, basic.fix_content)['changed']
+    assert os.stat(path).st_mtime_ns == mtime
+    with open(path, 'rb') as f:
+        assert f.read() == original
+
+
+def test_fix_file_dispatches_docx(tmp_path):
+    path = str(tmp_path / 'document.docx')
+    make_docx(path)
+    text = docx.document_text(path)
+    assert advanced.fix_file(path)['changed']
+    assert docx.document_text(path) == advanced.fix_content(text)
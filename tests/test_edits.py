@@ -0,0 +1,148 @@
+"""
+Тесты режимов без записи (mermaid_fixer.edits и cli): правки --edits и
+unified diff --diff, примененные к исходному файлу, дают исправленный файл
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+from mermaid_fixer import advanced, basic, complete, edits
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STRATEGIES = (
+    (basic, 'fix_mermaid.py'),
+    (advanced, 'fix_mermaid_advanced.py'),
+    (complete, 'fix_mermaid_complete.py'),
+)
+
+DOCUMENT = '''# Процесс
+
+Текст перед диаграммой, с кириллицей.
+
+graph TD
+    A[Начало] --> B{Условие}
+    B -->|да| C["a<b"]
+
+Текст между диаграммами.
+
+```
+flowchart LR
+    X --> Y
+```
+
+```mermaid
+graph TD
+    A --> B
+```
+
+```mermaid
+sequenceDiagram
+    A->>B: Привет'''
+
+_HUNK = re.compile(r'@@ -(\d+)(?:,(\d+))? \+\d+(?:,\d+)? @@')
+
+
+def apply_spans(data, spans):
+    """Применяет правки [смещение, длина, замена] к байтам data"""
+    for offset, length, replacement in reversed(spans):
+        data = data[:offset] + replacement.encode('utf-8') + data[offset + length:]
+    return data
+
+
+def apply_diff(text, diff):
+    """Применяет unified diff одного файла к тексту"""
+    old = text.splitlines(True)
+    new = []
+    position = 0
+    mark = None
+    for line in diff.splitlines(True)[2:]:
+        hunk = _HUNK.match(line)
+        if hunk:
+            start = int(hunk.group(1)) - (hunk.group(2) != '0')
+            new.extend(old[position:start])
+            position = start
+            continue
+        if line.startswith('\\'):
+            # Без перевода строки в конце - предыдущая строка
+            if mark != '-':
+                new[-1] = new[-1].rstrip('\n')
+            continue
+        mark = line[0]
+        if mark in ' -':
+            assert old[position].rstrip('\n') == line[1:].rstrip('\n')
+            position += 1
+            if mark == ' ':
+                new.append(line[1:])
+        else:
+            new.append(line[1:])
+    new.extend(old[position:])
+    return ''.join(new)
+
+
+def write(path, content):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+
+
+def run(script, *args):
+    return subprocess.run((sys.executable, os.path.join(ROOT, script)) + args,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding='utf-8')
+
+
+@pytest.mark.parametrize('module', [module for module, _ in STRATEGIES],
+                         ids=lambda module: module.__name__.rsplit('.', 1)[-1])
+@pytest.mark.parametrize('content', [DOCUMENT, DOCUMENT + '\n', 'Текст\n' * 40 + DOCUMENT + '\n' + 'Текст\n' * 40],
+                         ids=('document', 'newline', 'surrounded'))
+def test_changes_round_trip(module, tmp_path, content):
+    path = str(tmp_path / 'document.md')
+    write(path, content)
+    expected = module.fix_content(content)
+    assert expected != content
+
+    spans = [span for change in module.file_changes(path) for span in change.spans()]
+    assert apply_spans(content.encode('utf-8'), spans) == expected.encode('utf-8')
+
+    shift = 0
+    diff = '--- a\n+++ a\n'
+    for change in module.file_changes(path, context=edits.CONTEXT):
+        diff += ''.join(change.hunks(shift))
+        shift += change.line_delta
+    assert apply_diff(content, diff) == expected
+
+
+@pytest.mark.parametrize('module,script', STRATEGIES, ids=[script for _, script in STRATEGIES])
+def test_cli_edits_and_diff_round_trip(module, script, tmp_path):
+    path = str(tmp_path / 'document.md')
+    write(path, DOCUMENT)
+    expected = module.fix_content(DOCUMENT)
+
+    result = run(script, '--edits', path)
+    assert result.returncode == 1
+    spans = json.loads(result.stdout)[path]
+    assert apply_spans(DOCUMENT.encode('utf-8'), spans) == expected.encode('utf-8')
+
+    result = run(script, '--diff', path)
+    assert result.returncode == 1
+    assert result.stdout.startswith(f'--- {path}\n+++ {path}\n')
+    assert apply_diff(DOCUMENT, result.stdout) == expected
+
+    # Файл не изменился, а исправленный файл изменений не требует
+    with open(path, encoding='utf-8', newline='') as f:
+        assert f.read() == DOCUMENT
+    write(path, expected)
+    assert run(script, '--check', path).returncode == 0
+
+
+def test_write_changes_matches_fix_content(tmp_path):
+    path = str(tmp_path / 'document.md')
+    write(path, DOCUMENT)
+    data = DOCUMENT.encode('utf-8')
+    edits.write_changes(path, data, basic.file_changes(path, data=data))
+    with open(path, encoding='utf-8', newline='') as f:
+        assert f.read() == basic.fix_content(DOCUMENT)
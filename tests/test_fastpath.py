@@ -0,0 +1,69 @@
+"""
+Тесты быстрого пути (mermaid_fixer.fastpath): исправление файла по
+областям, в том числе пулом процессов (jobs), совпадает с исправлением
+текста целиком
+"""
+
+import random
+
+import pytest
+
+from mermaid_fixer import advanced, basic, complete, fastpath
+
+STRATEGIES = (basic, advanced, complete)
+
+BLOCKS = (
+    '# Раздел\n\nОбычный текст без диаграмм.\n',
+    '```python\nprint("graph TD")\n```\n',
+    '```mermaid\ngraph TD\n    A --> B\n```\n',
+    'graph TD\n    A[Начало] --> B{Условие}\n    B -->|да| C\n',
+    '```\nflowchart LR\n    X --> Y\n```\n',
+    '```mermaid\nsequenceDiagram\n    A->>B: Привет\n',
+    '```mermaid\ngraph TD\n    A["a<b"] --> B[/Трапеция\\]\n```\n',
+    '- пункт списка\n- еще пункт\n',
+)
+
+
+def make_document(seed, blocks=60):
+    rng = random.Random(seed)
+    return '\n'.join(rng.choice(BLOCKS) for _ in range(blocks))
+
+
+def fix_file(module, tmp_path, content, **options):
+    path = str(tmp_path / 'document.md')
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+    module.fix_file(path, **options)
+    with open(path, encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('module', STRATEGIES, ids=lambda module: module.__name__.rsplit('.', 1)[-1])
+@pytest.mark.parametrize('seed', range(20))
+def test_fix_file_matches_fix_content(module, tmp_path, seed):
+    content = make_document(seed)
+    assert fix_file(module, tmp_path, content) == module.fix_content(content)
+
+
+@pytest.mark.parametrize('module', STRATEGIES, ids=lambda module: module.__name__.rsplit('.', 1)[-1])
+def test_parallel_regions_match_fix_content(module, tmp_path, monkeypatch):
+    # Пул процессов включается и на небольшом файле, по заданию на область
+    monkeypatch.setattr(fastpath, '_PARALLEL_MIN_BYTES', 0)
+    monkeypatch.setattr(fastpath, '_TASK_BYTES', 1)
+    content = make_document(0, blocks=200)
+    assert fix_file(module, tmp_path, content, jobs=2) == module.fix_content(content)
+
+
+@pytest.mark.parametrize('module', STRATEGIES, ids=lambda module: module.__name__.rsplit('.', 1)[-1])
+def test_carriage_returns_fall_back_to_text(module, tmp_path):
+    content = make_document(1).replace('\n', '\r\n')
+    expected = module.fix_content(content.replace('\r\n', '\n'))
+    assert fix_file(module, tmp_path, content) == expected
+
+
+def test_complete_region_continues_unclosed_mermaid_block(tmp_path):
+    # Блок ```mermaid без закрывающих ``` до следующих ``` через несколько
+    # областей: complete оставляет все до них как есть
+    content = ('```mermaid\nsequenceDiagram\n    A->>B: Привет\n\nТекст.\n\n'
+               'graph TD\n    A[Начало] --> B\n\n- пункт\n\n```\nflowchart LR\n```\n')
+    assert fix_file(complete, tmp_path, content) == complete.fix_content(content)
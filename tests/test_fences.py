@@ -0,0 +1,91 @@
+"""
+Тесты индекса блоков кода (mermaid_fixer.fences): FenceIndex.blocks
+сравнивается с поиском блоков регулярным выражением, которое он заменил
+"""
+
+import random
+import re
+
+import pytest
+
+from mermaid_fixer.fences import FENCE, FenceIndex
+
+# Строки, из которых собираются случайные тексты: незакрытые и вложенные
+# ```, ``` в середине строки, с отступом и ~~~
+LINES = (
+    '```', '```mermaid', '```python', '````', '`````mermaid', '  ```', ' ```mermaid',
+    'текст ``` в строке', 'код `` ``` `` в строке', 'x```mermaid', '```mermaid```',
+    '~~~', '~~~mermaid', 'graph TD', 'A --> B', '', 'Обычный текст',
+)
+
+
+def reference_blocks(text, opening, lookahead=''):
+    """
+    Блоки, как их находил поиск re.finditer(opening + r'\\n(.*?)\\n```'):
+    (пары позиций конца открывающей строки и начала закрывающих ```,
+    позиция конца незакрытой открывающей строки или None)
+    """
+    pattern = re.compile(re.escape(opening) + r'\n' + lookahead + r'(.*?)\n' + FENCE, re.DOTALL)
+    pairs = []
+    scan = 0
+    for match in pattern.finditer(text):
+        pairs.append((match.start() + len(opening), match.end() - len(FENCE)))
+        scan = match.end()
+    unclosed = re.compile(re.escape(opening) + r'(?=\n' + lookahead + r'|\Z)')
+    for match in unclosed.finditer(text, scan):
+        if lookahead and match.end() == len(text):
+            continue
+        return pairs, match.end()
+    return pairs, None
+
+
+def index_blocks(text, opening, accept=None):
+    """FenceIndex.blocks в тех же позициях, что и reference_blocks"""
+    fences = FenceIndex(text)
+    pairs, unclosed = fences.blocks(opening, None if accept is None else lambda k: accept(fences, k))
+    return ([(fences.ends[k], fences.positions[close]) for k, close in pairs],
+            None if unclosed is None else fences.ends[unclosed])
+
+
+def _graph_follows(fences, k):
+    """Проверка открывающей строки: следующая строка начинается с graph"""
+    return fences.text.startswith('graph', fences.ends[k] + 1)
+
+
+@pytest.mark.parametrize('text', [
+    '',
+    'Текст без блоков',
+    '```mermaid\ngraph TD\n    A --> B\n```\n',
+    '```mermaid\n```\n',
+    '```mermaid\n\n```',
+    '```mermaid\ngraph TD\n    A --> B\n',
+    '```mermaid',
+    '````\n```mermaid\ngraph TD\n```\n````\n',
+    '~~~\n```mermaid\n~~~\ngraph TD\n```\n',
+    'текст ```mermaid\ngraph TD\n  ```\n```\n',
+    '```mermaid\ngraph TD\n```mermaid\ngraph LR\n```\n```mermaid\n',
+])
+@pytest.mark.parametrize('opening', ['```', '```mermaid'])
+def test_blocks_match_regex_search(text, opening):
+    assert index_blocks(text, opening) == reference_blocks(text, opening)
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_blocks_match_regex_search_on_random_text(seed):
+    rng = random.Random(seed)
+    text = '\n'.join(rng.choice(LINES) for _ in range(rng.randint(0, 40)))
+    if rng.random() < 0.5:
+        text += '\n'
+    for opening in ('```', '```mermaid'):
+        assert index_blocks(text, opening) == reference_blocks(text, opening)
+        assert (index_blocks(text, opening, _graph_follows) ==
+                reference_blocks(text, opening, lookahead='(?=graph)'))
+
+
+def test_unclosed_opening_is_reported_once():
+    text = '```mermaid\ngraph TD\n' * 1000
+    pairs, unclosed = FenceIndex(text).blocks('```mermaid')
+    assert pairs == [(k, k + 1) for k in range(0, 1000, 2)]
+    assert unclosed is None
+    pairs, unclosed = FenceIndex(text + '```mermaid\nA --> B\n').blocks('```mermaid')
+    assert unclosed == 1000
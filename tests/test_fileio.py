@@ -0,0 +1,183 @@
+"""
+Тесты записи файлов (mermaid_fixer.fileio): блокировка, резервная копия
+и ее запасные способы, атомарная замена и права файла
+"""
+
+import os
+import shutil
+import stat
+import threading
+import time
+
+import pytest
+
+from mermaid_fixer import fileio
+from mermaid_fixer.fileio import AtomicFile, ChangeWriter, file_lock, make_backup, write_if_changed
+
+needs_fcntl = pytest.mark.skipif(fileio.fcntl is None, reason='нет fcntl')
+
+
+def write(path, content):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+
+
+def read(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+def leftovers(directory):
+    return [name for name in os.listdir(directory) if name.endswith('.tmp')]
+
+
+@pytest.fixture
+def document(tmp_path):
+    path = str(tmp_path / 'document.md')
+    write(path, 'исходный текст\n')
+    return path
+
+
+@needs_fcntl
+def test_concurrent_writers_are_serialized(document):
+    # Каждый писатель заменяет файл новым (новый inode), поэтому ждущие
+    # блокировку берут ее заново уже на новом файле
+    write(document, '0')
+
+    def increment():
+        for _ in range(10):
+            with file_lock(document):
+                value = int(read(document))
+                time.sleep(0.001)
+                write_if_changed(document, str(value), str(value + 1))
+
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert read(document) == '40'
+
+
+@needs_fcntl
+def test_lock_follows_replaced_file(document):
+    locked = threading.Event()
+    release = threading.Event()
+
+    def waiter():
+        with file_lock(document):
+            locked.set()
+            release.wait()
+
+    with file_lock(document):
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        time.sleep(0.05)
+        assert not locked.is_set()
+        write_if_changed(document, 'исходный текст\n', 'новый текст\n')
+    assert locked.wait(5)
+
+    # Ждавший держит блокировку уже нового файла, а не замененного
+    fd = os.open(document, os.O_RDONLY)
+    try:
+        with pytest.raises(BlockingIOError):
+            fileio.fcntl.flock(fd, fileio.fcntl.LOCK_EX | fileio.fcntl.LOCK_NB)
+    finally:
+        os.close(fd)
+        release.set()
+        thread.join()
+
+
+def test_backup_keeps_original_contents(document):
+    backup = document + '.backup'
+    assert write_if_changed(document, 'исходный текст\n', 'новый текст\n', backup)
+    assert read(document) == 'новый текст\n'
+    assert read(backup) == 'исходный текст\n'
+
+    # Следующее исправление заменяет резервную копию предыдущей версией
+    assert write_if_changed(document, 'новый текст\n', 'третий текст\n', backup)
+    assert read(backup) == 'новый текст\n'
+    assert leftovers(os.path.dirname(document)) == []
+
+
+def failing(*args):
+    raise OSError('недоступно')
+
+
+@pytest.mark.parametrize('broken', [('link',), ('link', 'reflink')])
+def test_backup_falls_back_to_reflink_and_copy(document, monkeypatch, broken):
+    used = []
+
+    def record(name, function):
+        def method(src, dst):
+            used.append(name)
+            return function(src, dst)
+        return method
+
+    monkeypatch.setattr(os, 'link', record('link', failing if 'link' in broken else os.link))
+    # reflink поддерживается не везде: здесь он либо не работает, либо копирует
+    monkeypatch.setattr(fileio, '_reflink', record('reflink', failing if 'reflink' in broken else shutil.copyfile))
+    monkeypatch.setattr(shutil, 'copy2', record('copy2', shutil.copy2))
+
+    backup = document + '.backup'
+    make_backup(document, backup)
+    assert read(backup) == 'исходный текст\n'
+    assert used == ['link', 'reflink'] + (['copy2'] if 'reflink' in broken else [])
+    assert not os.path.samefile(document, backup)
+    assert leftovers(os.path.dirname(document)) == []
+
+
+def test_backup_fails_when_every_method_fails(document, monkeypatch):
+    monkeypatch.setattr(os, 'link', failing)
+    monkeypatch.setattr(fileio, '_reflink', failing)
+    monkeypatch.setattr(shutil, 'copy2', failing)
+    with pytest.raises(OSError):
+        write_if_changed(document, 'исходный текст\n', 'новый текст\n', document + '.backup')
+    assert read(document) == 'исходный текст\n'
+    assert not os.path.exists(document + '.backup')
+    assert leftovers(os.path.dirname(document)) == []
+
+
+def test_failed_stream_write_leaves_original(document):
+    writer = ChangeWriter(document)
+    writer.write('исходный')
+    writer.write(' другой текст')
+    # Сбой посреди записи: close не вызывается
+    writer.discard()
+    assert read(document) == 'исходный текст\n'
+    assert leftovers(os.path.dirname(document)) == []
+
+
+def test_atomic_file_discard_leaves_original(document):
+    target = AtomicFile(document)
+    target.file.write('частично записанный')
+    target.discard()
+    assert read(document) == 'исходный текст\n'
+    assert leftovers(os.path.dirname(document)) == []
+
+
+@pytest.mark.parametrize('new', ['исходный текст\n', 'исходный', 'исходный текст\nи продолжение\n', 'другой\n'])
+def test_change_writer(document, new):
+    inode = os.stat(document).st_ino
+    writer = ChangeWriter(document)
+    for start in range(0, len(new), 3):
+        writer.write(new[start:start + 3])
+    changed = writer.close(document + '.backup')
+    assert changed == (new != 'исходный текст\n')
+    assert read(document) == new
+    # Без изменений файл не заменяется и резервная копия не создается
+    assert (os.stat(document).st_ino == inode) == (not changed)
+    assert os.path.exists(document + '.backup') == changed
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='права POSIX')
+def test_file_mode_is_preserved(document):
+    os.chmod(document, 0o640)
+    write_if_changed(document, 'исходный текст\n', 'новый текст\n', document + '.backup')
+    assert stat.S_IMODE(os.stat(document).st_mode) == 0o640
+
+    os.chmod(document, 0o604)
+    writer = ChangeWriter(document)
+    writer.write('третий текст\n')
+    writer.close()
+    assert stat.S_IMODE(os.stat(document).st_mode) == 0o604
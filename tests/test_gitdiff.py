@@ -0,0 +1,112 @@
+"""
+Тесты режимов --staged и --since (mermaid_fixer.gitdiff и cli) во
+временном репозитории git
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from mermaid_fixer import basic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, 'fix_mermaid.py')
+
+CLEAN = '# Документ\n\nТекст\n'
+BROKEN = '# Документ\n\nТекст\n\ngraph TD\n    A --> B\n'
+# Исправление только измененных строк совпадает с исправлением файла целиком
+FIXED = basic.fix_content(BROKEN)
+
+pytestmark = pytest.mark.skipif(shutil.which('git') is None, reason='нет git')
+
+
+def git(directory, *args):
+    return subprocess.run(('git', '-c', 'user.name=test', '-c', 'user.email=test@localhost') + args,
+                          cwd=directory, check=True, stdout=subprocess.PIPE, text=True).stdout
+
+
+def fix(directory, *args):
+    return subprocess.run((sys.executable, SCRIPT) + args, cwd=directory,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def write(directory, name, content):
+    with open(os.path.join(directory, name), 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+
+
+def read(directory, name):
+    with open(os.path.join(directory, name), encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+@pytest.fixture
+def repo(tmp_path):
+    directory = str(tmp_path)
+    git(directory, 'init', '-q')
+    write(directory, 'doc.md', CLEAN)
+    write(directory, 'other.md', BROKEN)
+    git(directory, 'add', '-A')
+    git(directory, 'commit', '-q', '-m', 'init')
+    return directory
+
+
+def test_staged_fix_exits_non_zero_and_leaves_index(repo):
+    write(repo, 'doc.md', BROKEN)
+    git(repo, 'add', 'doc.md')
+    result = fix(repo, '--staged')
+    assert result.returncode == 1, result.stdout + result.stderr
+    assert read(repo, 'doc.md') == FIXED
+    # Исправление не добавлено в индекс; файл вне индекса не тронут
+    assert git(repo, 'show', ':doc.md') == BROKEN
+    assert read(repo, 'other.md') == BROKEN
+
+    git(repo, 'add', 'doc.md')
+    result = fix(repo, '--staged')
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert read(repo, 'doc.md') == FIXED
+
+
+def test_staged_without_changes_exits_zero(repo):
+    result = fix(repo, '--staged')
+    assert result.returncode == 0
+    assert read(repo, 'other.md') == BROKEN
+
+
+def test_staged_check_reports_without_writing(repo):
+    write(repo, 'doc.md', BROKEN)
+    git(repo, 'add', 'doc.md')
+    result = fix(repo, '--staged', '--check')
+    assert result.returncode == 1
+    assert read(repo, 'doc.md') == BROKEN
+
+
+def test_staged_skips_dirty_working_copy(repo):
+    write(repo, 'doc.md', BROKEN)
+    git(repo, 'add', 'doc.md')
+    write(repo, 'doc.md', BROKEN + '\nЕще текст\n')
+    result = fix(repo, '--staged')
+    assert result.returncode == 0
+    assert 'пропущен' in result.stderr
+    assert read(repo, 'doc.md') == BROKEN + '\nЕще текст\n'
+
+
+def test_since_fixes_only_changed_files(repo):
+    write(repo, 'doc.md', BROKEN)
+    git(repo, 'commit', '-q', '-am', 'broken')
+    result = fix(repo, '--since', 'HEAD~1')
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert read(repo, 'doc.md') == FIXED
+    assert read(repo, 'other.md') == BROKEN
+
+
+def test_since_diff_prints_changes(repo):
+    write(repo, 'doc.md', BROKEN)
+    git(repo, 'commit', '-q', '-am', 'broken')
+    result = fix(repo, '--since', 'HEAD~1', '--diff')
+    assert result.returncode == 1
+    assert '+```mermaid' in result.stdout
+    assert read(repo, 'doc.md') == BROKEN
@@ -0,0 +1,39 @@
+"""
+Тесты экранирования лейблов flowchart/graph диаграмм (mermaid_fixer.labels)
+"""
+
+import pytest
+
+from mermaid_fixer.labels import escape_block, escape_line
+
+
+@pytest.mark.parametrize('line, expected', [
+    ('A["a<b"] --> B', 'A["a&lt;b"] --> B'),
+    ('A[a<b] --> B', 'A[a&lt;b] --> B'),
+    ('A[/a<b/] --> B', 'A[/a&lt;b/] --> B'),
+    # Лейблы в кавычках у трапеций и параллелограммов: кавычки - ограничители
+    ('A[/"<"/]', 'A[/"&lt;"/]'),
+    ('A[\\"<"\\]', 'A[\\"&lt;"\\]'),
+    ('A[/"a<b"\\] --> B[\\"c>d"/]', 'A[/"a&lt;b"\\] --> B[\\"c&gt;d"/]'),
+    ('A[/"say "hi""/]', 'A[/"say &quot;hi&quot;"/]'),
+    ('A -- "a<b" --> B', 'A -- "a&lt;b" --> B'),
+    ('A -->|"x<y"| B', 'A -->|"x&lt;y"| B'),
+    ('A["line<br>next"]', 'A["line<br>next"]'),
+    ('click A "https://example.com" "a<b"', 'click A "https://example.com" "a<b"'),
+])
+def test_escape_line(line, expected):
+    assert escape_line(line) == expected
+
+
+@pytest.mark.parametrize('line', [
+    'A[/"<"/]', 'A[\\"<b>"\\] --> B[/"x"\\]', 'A["a<b"]', 'A -- "q" --> B', 'A(("<"))',
+])
+def test_escape_line_is_idempotent(line):
+    escaped = escape_line(line)
+    assert escape_line(escaped) == escaped
+
+
+def test_escape_block_skips_other_diagrams():
+    content = 'sequenceDiagram\n    A->>B: "a<b"'
+    assert escape_block(content) == content
+    assert escape_block('graph TD\n    A[/"<"/] --> B') == 'graph TD\n    A[/"&lt;"/] --> B'
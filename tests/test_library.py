@@ -0,0 +1,45 @@
+"""
+Тесты сопоставления фрагментов с библиотекой эталонов (mermaid_fixer.library)
+и стратегии complete
+"""
+
+from mermaid_fixer import api
+from mermaid_fixer.library import DiagramLibrary, diagram_features, get_library
+
+SHORT_DIAGRAM = ['graph TD', '    A[Login] --> B[Check password] --> C[Done]']
+
+
+def test_short_diagram_with_common_ids_is_not_matched():
+    """Все узлы A, B, C есть в эталоне flowchart_td, но диаграмма другая"""
+    assert get_library().match(diagram_features(SHORT_DIAGRAM)) is None
+
+
+def test_match_requires_common_nodes_and_jaccard():
+    library = DiagramLibrary()
+    library.add('big', '\n'.join(['graph TD'] + [f'    N{k} --> N{k + 1}' for k in range(10)]))
+    # Узлы фрагмента целиком в эталоне, но их слишком мало
+    assert library.match(diagram_features(['graph TD', '    N1 --> N2'])) is None
+    assert library.match(diagram_features(['graph TD'] + [f'    N{k} --> N{k + 1}' for k in range(8)])) == 'big'
+
+
+def test_intact_block_is_not_replaced():
+    text = 'Текст\n\n```mermaid\n' + '\n'.join(SHORT_DIAGRAM) + '\n```\n\nЕще текст\n'
+    result = api.fix(text, 'complete')
+    assert result.text == text
+    assert not result.changed
+
+
+def test_intact_block_with_unknown_nodes_is_kept():
+    text = '```mermaid\ngraph TD\n    X[Login] --> Y[Check password]\n```\n'
+    assert api.fix(text, 'complete').text == text
+
+
+def test_block_closed_too_early_is_restored():
+    """Блок закрыт после первой связи, остальные связи - после него"""
+    reference = get_library().text('flowchart_td').split('\n')
+    statements = [line for line in reference[1:] if line.strip()]
+    text = '\n'.join(['```mermaid', reference[0], statements[0], '```', ''] + statements[1:] + ['', 'Текст'])
+    result = api.fix(text, 'complete')
+    assert result.metrics.counters.get('diagrams_restored') == 1
+    assert get_library().text('flowchart_td') in result.text
+    assert result.text.rstrip().endswith('Текст')
@@ -0,0 +1,102 @@
+"""
+Тесты проверки flowchart диаграмм (mermaid_fixer.lint): каждое правило
+на диаграмме с проблемой и без нее, номера строк в тексте документа
+"""
+
+import pytest
+
+from mermaid_fixer import lint
+from mermaid_fixer.lint import Linter
+
+# Правило, диаграмма с проблемой, (номер строки, код) проблем и та же
+# диаграмма без проблемы
+CASES = (
+    (lint.InvalidStatement,
+     'graph TD\n    A --> B\n    это не оператор\n',
+     [(2, 'invalid-statement')],
+     'graph TD\n    A --> B\n    %% комментарий\n'),
+    (lint.UnclosedSubgraph,
+     'graph TD\n    subgraph S\n        A --> B\n    C --> D\n',
+     [(1, 'unclosed-subgraph')],
+     'graph TD\n    subgraph S\n        A --> B\n    end\n    C --> D\n'),
+    (lint.UnclosedSubgraph,
+     'graph TD\n    A --> B\n    end\n',
+     [(2, 'unclosed-subgraph')],
+     'graph TD\n    A --> B\n'),
+    (lint.UndefinedClass,
+     'graph TD\n    A --> B\n    class A warning\n',
+     [(2, 'undefined-class')],
+     'graph TD\n    A --> B\n    class A warning\n    classDef warning fill:#f96\n'),
+    (lint.UndefinedClass,
+     'graph TD\n    A:::warning --> B\n',
+     [(1, 'undefined-class')],
+     'graph TD\n    classDef warning fill:#f96\n    A:::warning --> B\n'),
+    (lint.UndefinedNode,
+     'graph TD\n    A --> B\n    style C fill:#f96\n',
+     [(2, 'undefined-node')],
+     'graph TD\n    A --> B\n    style B fill:#f96\n'),
+    (lint.DanglingEdge,
+     'graph TD\n    A[Начало] --> B[Конец]\n    B --> Bb\n',
+     [(2, 'dangling-edge')],
+     'graph TD\n    A[Начало] --> B[Конец]\n    B --> A\n'),
+    (lint.ConflictingLabel,
+     'graph TD\n    A[Начало] --> B[Б]\n    A[Старт] --> C[В]\n',
+     [(2, 'conflicting-label')],
+     'graph TD\n    A[Начало] --> B[Б]\n    A[Начало] --> C[В]\n    A --> B\n'),
+)
+
+IDS = [rule.__name__ for rule, *_ in CASES]
+
+
+def found(diagnostics):
+    return [(line, code) for line, code, _ in diagnostics]
+
+
+@pytest.mark.parametrize('rule,broken,expected,clean', CASES, ids=IDS)
+def test_rule_reports_problem(rule, broken, expected, clean):
+    assert found(Linter((rule,)).lint_lines(broken.split('\n'))) == expected
+
+
+@pytest.mark.parametrize('rule,broken,expected,clean', CASES, ids=IDS)
+def test_rule_accepts_clean_diagram(rule, broken, expected, clean):
+    assert Linter((rule,)).lint_lines(clean.split('\n')) == []
+
+
+@pytest.mark.parametrize('rule,broken,expected,clean', CASES, ids=IDS)
+def test_all_rules_accept_clean_diagram(rule, broken, expected, clean):
+    assert Linter().lint_lines(clean.split('\n')) == []
+
+
+def test_dangling_edge_needs_described_nodes():
+    # В диаграмме без описанных узлов любой узел может встречаться один раз
+    assert Linter((lint.DanglingEdge,)).lint_lines(['graph TD', 'A --> B', 'B --> C']) == []
+
+
+def test_rules_run_in_one_traversal_per_diagram():
+    text = 'graph TD\n    subgraph S\n    A[Начало] --> B[Б]\n    A[Старт] --> C[В]\n    class B warning\n    ???\n'
+    assert found(Linter().lint_lines(text.split('\n'))) == [
+        (1, 'unclosed-subgraph'), (3, 'conflicting-label'), (4, 'undefined-class'), (5, 'invalid-statement')]
+
+
+def test_line_numbers_deep_in_document():
+    prefix = ''.join(f'Строка {number}\n' for number in range(500))
+    text = (prefix +
+            '```python\nx = 1\n```\n\n'
+            '```mermaid\nsequenceDiagram\n    A->>B: ???\n```\n\n'
+            '```mermaid\ngraph TD\n    A --> B\n    ???\n```\n\n'
+            'Текст\n\n'
+            '```mermaid\n%% комментарий\nflowchart LR\n    X[Один] --> Y[У]\n    X[Два] --> Z[З]\n```\n')
+    lines = text.split('\n')
+    diagnostics = found(Linter().lint_text(text))
+    assert diagnostics == [(lines.index('    ???'), 'invalid-statement'),
+                           (lines.index('    X[Два] --> Z[З]'), 'conflicting-label')]
+    assert diagnostics[0][0] == 500 + 4 + 5 + 3
+
+
+def test_lint_file_reports_one_based_lines(tmp_path, capsys):
+    path = tmp_path / 'document.md'
+    path.write_text('Текст\n\n```mermaid\ngraph TD\n    A --> B\n    ???\n```\n', encoding='utf-8')
+    with pytest.raises(SystemExit) as exit_info:
+        lint.main([str(path)])
+    assert exit_info.value.code == 1
+    assert capsys.readouterr().out == f'{path}:6: invalid-statement: Строка не разбирается как оператор flowchart\n'
@@ -0,0 +1,201 @@
+"""
+Тесты сервера LSP (mermaid_fixer.lsp): инкрементальные правки дают те же
+строки и диагностики, что новый документ, быстрые исправления убирают
+диагностики, обмен JSON-RPC и коды выхода
+"""
+
+import io
+import json
+import random
+
+import pytest
+
+from mermaid_fixer import lsp
+from mermaid_fixer.lsp import Document, Server
+
+TEXT = '''# Документ
+
+graph TD
+    A[Начало] --> B
+
+```
+flowchart LR
+    X --> Y
+```
+
+```mermaid
+graph TD
+    A["a<b"] --> B
+```
+
+Текст 😀 с символом вне BMP.
+
+```mermaid
+sequenceDiagram
+    A->>B: Привет'''
+
+PIECES = ('', '\n', '```', '```mermaid', '\ngraph TD\n', '    A --> B', 'A["<"]', '😀', 'Текст', '\n\n', 'x')
+
+
+def units(line):
+    return lsp._to_units(line, len(line))
+
+
+def random_position(rng, lines):
+    line = rng.randrange(len(lines))
+    return {'line': line, 'character': rng.randint(0, units(lines[line]))}
+
+
+def random_change(rng, lines):
+    start = random_position(rng, lines)
+    end = random_position(rng, lines)
+    if (end['line'], end['character']) < (start['line'], start['character']):
+        start, end = end, start
+    text = ''.join(rng.choice(PIECES) for _ in range(rng.randint(0, 3)))
+    return {'range': {'start': start, 'end': end}, 'text': text}
+
+
+def edit_text(lines, change):
+    """Правка текста напрямую, без Document: ожидаемый результат"""
+    start, end = change['range']['start'], change['range']['end']
+    first = lines[start['line']]
+    last = lines[end['line']]
+    text = (first[:lsp._to_index(first, start['character'])] + change['text'] +
+            last[lsp._to_index(last, end['character']):])
+    return lines[:start['line']] + text.split('\n') + lines[end['line'] + 1:]
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_apply_change_matches_new_document(seed):
+    rng = random.Random(seed)
+    document = Document(TEXT)
+    expected = TEXT.split('\n')
+    for _ in range(40):
+        change = random_change(rng, document.lines)
+        expected = edit_text(expected, change)
+        document.apply_change(change)
+        assert document.lines == expected
+        assert document.diagnostics() == Document(document.text).diagnostics()
+
+
+def test_full_change_replaces_document():
+    document = Document(TEXT)
+    document.apply_change({'text': 'graph TD\n    A --> B'})
+    assert document.diagnostics() == Document('graph TD\n    A --> B').diagnostics()
+
+
+@pytest.mark.parametrize('change', [
+    {'range': {'start': {'line': 100, 'character': 0}, 'end': {'line': 100, 'character': 0}}, 'text': 'x'},
+    {'range': {'start': {'line': 2, 'character': 3}, 'end': {'line': 1, 'character': 0}}, 'text': 'x'},
+])
+def test_out_of_range_change_leaves_document(change):
+    document = Document(TEXT)
+    diagnostics = document.diagnostics()
+    with pytest.raises(ValueError):
+        document.apply_change(change)
+    assert document.text == TEXT
+    assert document.diagnostics() == diagnostics
+
+
+def apply_edits(document, edits):
+    """Применяет TextEdit быстрого исправления (с конца документа)"""
+    for edit in sorted(edits, key=lambda edit: (edit['range']['start']['line'],
+                                                edit['range']['start']['character']), reverse=True):
+        document.apply_change({'range': edit['range'], 'text': edit['newText']})
+
+
+def codes(document):
+    return [diagnostic['code'] for diagnostic in document.diagnostics()]
+
+
+@pytest.mark.parametrize('text,code', [
+    ('Текст\n\n```mermaid\ngraph TD\n    A --> B', lsp.UNCLOSED_FENCE),
+    ('```\ngraph TD\n    A --> B\n```', lsp.UNTAGGED_FENCE),
+    ('Текст\n\ngraph TD\n    A --> B\n\nТекст', lsp.DIAGRAM_OUTSIDE_FENCE),
+    ('Текст\n\nA[Начало] --> B[Конец]\n\nТекст', lsp.STRAY_DIAGRAM_LINE),
+    ('```mermaid\ngraph TD\n    A["a<b"] --> B\n```', lsp.UNESCAPED_LABEL),
+])
+def test_quick_fix_removes_diagnostic(text, code):
+    document = Document(text)
+    diagnostic, = [diagnostic for diagnostic in document.diagnostics() if diagnostic['code'] == code]
+    edits = document.quick_fix(diagnostic['range']['start']['line'], code)
+    assert edits
+    apply_edits(document, edits)
+    assert code not in codes(document)
+    assert codes(document) == codes(Document(document.text))
+
+
+def frame(message):
+    body = json.dumps(message).encode('utf-8')
+    return b'Content-Length: %d\r\n\r\n' % len(body) + body
+
+
+def read_messages(data):
+    messages = []
+    stream = io.BytesIO(data)
+    while True:
+        header = stream.readline()
+        if not header:
+            return messages
+        assert header.startswith(b'Content-Length: ')
+        length = int(header.split(b':')[1])
+        assert stream.readline() == b'\r\n'
+        messages.append(json.loads(stream.read(length).decode('utf-8')))
+
+
+def serve(*messages):
+    output = io.BytesIO()
+    code = Server(io.BytesIO(b''.join(map(frame, messages))), output).serve()
+    return code, read_messages(output.getvalue())
+
+
+OPEN = {'jsonrpc': '2.0', 'method': 'textDocument/didOpen',
+        'params': {'textDocument': {'uri': 'file:///a.md', 'text': TEXT}}}
+
+
+def test_session_framing_and_shutdown():
+    code, messages = serve(
+        {'jsonrpc': '2.0', 'id': 1, 'method': 'initialize', 'params': {}},
+        OPEN,
+        {'jsonrpc': '2.0', 'id': 2, 'method': 'textDocument/codeAction',
+         'params': {'textDocument': {'uri': 'file:///a.md'}, 'range': {'start': {'line': 0, 'character': 0},
+                                                                       'end': {'line': 30, 'character': 0}}}},
+        {'jsonrpc': '2.0', 'id': 3, 'method': 'unknown'},
+        {'jsonrpc': '2.0', 'id': 4, 'method': 'shutdown'},
+        {'jsonrpc': '2.0', 'method': 'exit'},
+    )
+    assert code == 0
+    initialize, published, actions, unknown, shutdown = messages
+    assert initialize['id'] == 1 and initialize['result']['capabilities']['textDocumentSync']['change'] == 2
+    assert published['method'] == 'textDocument/publishDiagnostics'
+    assert published['params']['diagnostics'] == Document(TEXT).diagnostics()
+    assert {action['kind'] for action in actions['result']} == {'quickfix', 'source.fixAll'}
+    assert unknown['error']['code'] == -32601
+    assert shutdown == {'jsonrpc': '2.0', 'id': 4, 'result': None}
+
+
+@pytest.mark.parametrize('messages', [
+    # exit без shutdown и конец ввода без exit
+    ({'jsonrpc': '2.0', 'method': 'exit'},),
+    (OPEN,),
+])
+def test_exit_without_shutdown_is_an_error(messages):
+    assert serve(*messages)[0] == 1
+
+
+def test_failed_notification_is_logged_and_server_continues():
+    bad_change = {'jsonrpc': '2.0', 'method': 'textDocument/didChange',
+                  'params': {'textDocument': {'uri': 'file:///a.md'},
+                             'contentChanges': [{'range': {'start': {'line': 100, 'character': 0},
+                                                           'end': {'line': 100, 'character': 0}},
+                                                 'text': 'x'}]}}
+    good_change = dict(bad_change, params={'textDocument': {'uri': 'file:///a.md'},
+                                           'contentChanges': [{'text': 'graph TD\n    A --> B'}]})
+    code, messages = serve(OPEN, bad_change, good_change, {'jsonrpc': '2.0', 'id': 1, 'method': 'shutdown'},
+                           {'jsonrpc': '2.0', 'method': 'exit'})
+    assert code == 0
+    _, log, published, _ = messages
+    assert log['method'] == 'window/logMessage'
+    assert log['params']['type'] == lsp.LOG_ERROR
+    assert 'ValueError' in log['params']['message']
+    assert published['params']['diagnostics'] == Document('graph TD\n    A --> B').diagnostics()
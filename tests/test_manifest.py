@@ -0,0 +1,82 @@
+"""
+Тесты манифеста запусков (mermaid_fixer.manifest): файл считается
+неизменным после touch и изменившимся после правки, даже того же размера
+и с тем же mtime
+"""
+
+import os
+
+import pytest
+
+from mermaid_fixer import manifest as manifest_module
+from mermaid_fixer.manifest import Manifest
+
+# mtime в прошлом: запись в манифест не считается ненадежной (racy)
+OLD_MTIME_NS = 1_600_000_000 * 10**9
+
+
+def write(path, content, mtime_ns=OLD_MTIME_NS):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def document(tmp_path):
+    path = str(tmp_path / 'document.md')
+    write(path, 'graph TD\n    A --> B\n')
+    return path
+
+
+@pytest.fixture
+def manifest(tmp_path, document):
+    manifest = Manifest(str(tmp_path / 'manifest.json'), 'fix_mermaid', 1)
+    manifest.record(document)
+    return manifest
+
+
+def test_recorded_file_is_fresh(manifest, document):
+    assert manifest.is_fresh(document)
+
+
+def test_touched_file_is_fresh_without_rehashing(manifest, document, monkeypatch):
+    os.utime(document, ns=(OLD_MTIME_NS + 10**9, OLD_MTIME_NS + 10**9))
+    assert manifest.is_fresh(document)
+
+    # Новый mtime запомнен: следующая проверка обходится без чтения файла
+    def fail(path):
+        raise AssertionError('файл прочитан повторно')
+    monkeypatch.setattr(manifest_module, 'file_sha256', fail)
+    assert manifest.is_fresh(document)
+
+
+def test_edited_file_is_not_fresh(manifest, document):
+    write(document, 'graph TD\n    A --> C\n', OLD_MTIME_NS + 10**9)
+    assert not manifest.is_fresh(document)
+
+
+def test_racy_entry_compares_content(tmp_path):
+    path = str(tmp_path / 'document.md')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('graph TD\n    A --> B\n')
+    manifest = Manifest(str(tmp_path / 'manifest.json'), 'fix_mermaid', 1)
+    manifest.record(path)
+    mtime_ns = os.stat(path).st_mtime_ns
+
+    # Правка того же размера в тот же квант времени не меняет mtime
+    write(path, 'graph TD\n    A --> C\n', mtime_ns)
+    assert not manifest.is_fresh(path)
+
+
+def test_other_version_or_tool_is_not_fresh(tmp_path, manifest, document):
+    manifest.save()
+    assert Manifest.load(manifest.path, 'fix_mermaid', 1).is_fresh(document)
+    assert not Manifest.load(manifest.path, 'fix_mermaid', 2).is_fresh(document)
+    assert not Manifest.load(manifest.path, 'fix_mermaid_advanced', 1).is_fresh(document)
+
+
+def test_damaged_manifest_starts_empty(tmp_path, document):
+    path = str(tmp_path / 'manifest.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{')
+    assert not Manifest.load(path, 'fix_mermaid', 1).is_fresh(document)
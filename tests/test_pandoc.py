@@ -0,0 +1,98 @@
+"""
+Тесты фильтра pandoc (mermaid_fixer.pandoc): AST в JSON без диаграмм для
+исправления возвращается байт в байт, разорванные диаграммы собираются
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from mermaid_fixer import pandoc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, 'fix_mermaid_pandoc.py')
+
+
+def para(text):
+    return pandoc._paragraph(text)
+
+
+def code(text, classes=(), identifier=''):
+    return {'t': 'CodeBlock', 'c': [[identifier, list(classes), []], text]}
+
+
+def document(*blocks):
+    return {'pandoc-api-version': [1, 23, 1], 'meta': {}, 'blocks': list(blocks)}
+
+
+def dump(value):
+    # Как pandoc и main: компактный JSON без экранирования не-ASCII
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def run_filter(data):
+    result = subprocess.run((sys.executable, SCRIPT, 'docx'), input=data, stdout=subprocess.PIPE, check=True)
+    return result.stdout
+
+
+def texts(blocks):
+    return [(block['t'], block['c'][1] if block['t'] == 'CodeBlock' else pandoc.paragraph_text(block))
+            for block in blocks]
+
+
+UNTOUCHED = (
+    document(para('Текст без диаграмм.')),
+    document(para('Введение'),
+             code('graph TD\n    A --> B', ['mermaid'], 'fig'),
+             {'t': 'BlockQuote', 'c': [para('Цитата'), code('print(1)', ['python'])]},
+             {'t': 'Header', 'c': [1, ['h', [], []], [{'t': 'Str', 'c': 'Раздел'}]]},
+             para('end')),
+    document({'t': 'Div', 'c': [['d', [], []], [code('sequenceDiagram\n    A->>B: Привет', ['mermaid'])]]}),
+)
+
+
+@pytest.mark.parametrize('ast', UNTOUCHED)
+def test_untouched_document_is_byte_identical(ast):
+    data = dump(ast)
+    assert run_filter(data) == data
+
+
+def test_broken_diagram_is_merged():
+    ast = document(para('Текст'), para('graph TD\nA --> B'), para('B --> C\nC --> D'), para('Конец.'))
+    fixed = json.loads(run_filter(dump(ast)))
+    assert texts(fixed['blocks']) == [
+        ('Para', 'Текст'),
+        ('CodeBlock', 'graph TD\nA --> B\n\nB --> C\nC --> D'),
+        ('Para', 'Конец.'),
+    ]
+    assert fixed['blocks'][1]['c'][0][1] == ['mermaid']
+    # Неизмененные абзацы - прежние узлы
+    assert fixed['blocks'][0] == ast['blocks'][0]
+
+
+def test_untagged_code_block_keeps_attributes():
+    blocks = pandoc.filter_blocks([code('graph TD\n    A --> B', identifier='fig')])
+    assert blocks == [code('graph TD\n    A --> B', ['mermaid'], 'fig')]
+
+
+def test_merged_code_block_has_no_trailing_blank_lines():
+    blocks = pandoc.filter_blocks([para('graph TD\nA --> B'), code('flowchart LR', ['mermaid']),
+                                   para('flowchart LR\nX --> Y\nY --> Z'), para('%% c')])
+    assert blocks
+    for block in blocks:
+        assert block['t'] == 'CodeBlock'
+        assert block['c'][1] == block['c'][1].rstrip()
+
+
+def test_lone_end_does_not_start_diagram():
+    blocks = pandoc.filter_blocks([para('end'), para('B --> C\nC --> D')])
+    assert texts(blocks)[0] == ('Para', 'end')
+    assert all('end' not in block['c'][1] for block in blocks if block['t'] == 'CodeBlock')
+
+
+def test_end_closes_subgraph_of_previous_diagram():
+    blocks = pandoc.filter_blocks([para('graph TD\nsubgraph S\nA --> B'), para('end')])
+    assert texts(blocks) == [('CodeBlock', 'graph TD\nsubgraph S\nA --> B\n\nend')]
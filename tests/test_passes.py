@@ -0,0 +1,63 @@
+"""
+Тесты предварительного просмотра и планировщика проходов (mermaid_fixer.passes)
+"""
+
+import pytest
+
+from mermaid_fixer import basic
+from mermaid_fixer.metrics import Metrics
+from mermaid_fixer.passes import HEADER_LOOKBACK, Prescan
+
+CODE_THEN_DIAGRAM = '```python\nx = 1\n```\n\nТекст.\n\n```mermaid\ngraph TD\n    A --> B\n```\n'
+
+
+def loose_header(text):
+    return 'loose_header' in Prescan(text, frozenset(('loose_header',))).facts
+
+
+@pytest.mark.parametrize('text', [
+    '```mermaid\ngraph TD\n    A --> B\n```\n',
+    CODE_THEN_DIAGRAM,
+    'Текст без диаграмм\n',
+])
+def test_headers_in_mermaid_blocks_are_not_loose(text):
+    assert not loose_header(text)
+
+
+@pytest.mark.parametrize('text', [
+    'graph TD\n    A --> B\n',
+    'GRAPH td\n    A --> B\n',
+    '```python\ngraph TD\n```\n',
+    '```mermaid\n' + '\n' * HEADER_LOOKBACK + 'graph TD\n```\n',
+])
+def test_headers_outside_mermaid_blocks_are_loose(text):
+    assert loose_header(text)
+
+
+def test_basic_skips_wrapping_on_clean_document():
+    metrics = Metrics()
+    assert basic.fix_content(CODE_THEN_DIAGRAM, metrics=metrics) == CODE_THEN_DIAGRAM
+    assert metrics.counters['passes_skipped'] == 1
+
+
+def test_header_is_wrapped_only_outside_blocks():
+    text = '```mermaid\n' + '\n' * HEADER_LOOKBACK + 'graph TD\n```\n'
+    assert basic.fix_mermaid_diagrams(text) != text
+    assert basic.fix_mermaid_diagrams(CODE_THEN_DIAGRAM) == CODE_THEN_DIAGRAM
+
+
+def run_all(module, text):
+    """Все проходы стратегии подряд, без предварительного просмотра"""
+    for pass_ in module.PASSES:
+        text = pass_.function(text)
+    return text
+
+
+@pytest.mark.parametrize('text', [
+    'graph LR\nA --> B\nx ```\nsequenceDiagram',
+    'Текст ```\ngraph TD\n    A --> B\n```\n',
+])
+def test_fence_inside_line_is_a_fence(text):
+    assert 'fence' in Prescan(text, frozenset(('fence',))).facts
+    assert 'fence' in Prescan(text.split('\n'), frozenset(('fence',))).facts
+    assert basic.fix_content(text) == run_all(basic, text)
@@ -0,0 +1,65 @@
+"""
+Тесты сборки разрозненных частей диаграмм (mermaid_fixer.reassemble) и
+стратегии advanced
+"""
+
+import pytest
+
+from mermaid_fixer import api
+from mermaid_fixer.metrics import Metrics
+from mermaid_fixer.reassemble import is_fragment, reassemble
+
+DIAGRAM = ['```mermaid', 'graph TD', '    A[Начало] --> B[Конец]', '```']
+
+# Обычный текст, похожий на части диаграмм
+PROSE = [
+    'CRM -- это система управления клиентами.',
+    'API [см. ниже] возвращает JSON.',
+    'class diagrams are useful.',
+    'ID [1] и описание',
+    'NOTE: важное замечание',
+]
+
+
+@pytest.mark.parametrize('line', PROSE)
+def test_prose_is_not_fragment(line):
+    assert not is_fragment(line)
+
+
+@pytest.mark.parametrize('line', [
+    'A --> B', 'node1 --> node2', 'A[Лейбл]', 'A -- текст --> B', '%% комментарий',
+    'classDef red fill:#f00', 'class A,B red', 'subgraph S',
+])
+def test_statement_is_fragment(line):
+    assert is_fragment(line)
+
+
+def test_prose_is_left_in_place():
+    text = '\n'.join(['# Система', ''] + [line for prose in PROSE for line in (prose, '')] + DIAGRAM) + '\n'
+    assert api.fix(text, 'advanced').text == text
+
+
+def test_prose_is_not_wrapped_into_new_block():
+    lines = ['Текст', '', 'CRM -- это система управления клиентами.', '', 'class diagrams are useful.']
+    assert reassemble(lines) is lines
+
+
+def test_fragment_is_moved_to_diagram_with_its_nodes():
+    lines = DIAGRAM + ['', 'Текст.', '', 'B --> C[Дальше]']
+    metrics = Metrics()
+    assert reassemble(lines, metrics) == DIAGRAM[:3] + ['B --> C[Дальше]', '```', '', 'Текст.', '']
+    assert metrics.counters['fragments_reassembled'] == 1
+
+
+def test_edge_without_diagram_gets_own_block():
+    lines = ['Текст.', '', 'X --> Y']
+    metrics = Metrics()
+    assert reassemble(lines, metrics) == ['Текст.', '', '```mermaid', 'graph TD', 'X --> Y', '```']
+    assert metrics.counters['blocks_synthesized'] == 1
+
+
+@pytest.mark.parametrize('orphan', ['classDef red fill:#f00', '%% комментарий', 'Z[Узел без диаграммы]'])
+def test_group_without_matching_diagram_and_edges_stays(orphan):
+    """Группу без узлов или из одних узлов не к чему однозначно присоединить"""
+    lines = DIAGRAM + ['', 'Текст.', '', orphan]
+    assert reassemble(lines) is lines
@@ -0,0 +1,197 @@
+"""
+Тесты вывода частями исходного буфера (mermaid_fixer.spans): правки narrow
+превращают исходные байты в исправленный текст, SpanWriter пишет то же,
+что простая склейка частей, в том числе при частичной записи os.writev
+"""
+
+import os
+import random
+
+import pytest
+
+from mermaid_fixer import spans
+from mermaid_fixer.spans import SpanWriter, narrow
+
+LINES = ('graph TD', '    A --> B', '    A["a<b"] --> B', 'Текст 😀', '```mermaid', '```', '', 'x' * 300)
+
+
+def apply(data, edits):
+    """Склейка: data с правками (начало, конец, замена) по порядку"""
+    parts = []
+    position = 0
+    for start, end, replacement in edits:
+        assert position <= start <= end <= len(data)
+        parts.append(data[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(data[position:])
+    return b''.join(parts)
+
+
+def random_edits(rng, data, count):
+    points = sorted(rng.randint(0, len(data)) for _ in range(2 * count))
+    edits = []
+    for start, end in zip(points[::2], points[1::2]):
+        # Пустые замены, удаления, вставки и правки вплотную друг к другу
+        if rng.random() < 0.3:
+            end = start
+        replacement = rng.choice((b'', b'-', 'замена\n'.encode('utf-8'), bytes(rng.randrange(50))))
+        edits.append((start, end, replacement))
+    return edits
+
+
+def write_spans(tmp_path, data, edits):
+    path = tmp_path / 'output'
+    with open(path, 'wb') as file:
+        file.write(b'prefix:')
+        writer = SpanWriter(file, data)
+        for edit in edits:
+            writer.edit(*edit)
+        writer.close()
+    with open(path, 'rb') as file:
+        output = file.read()
+    assert output.startswith(b'prefix:')
+    return output[len(b'prefix:'):], writer
+
+
+def random_data(rng, size=2000):
+    return bytes(rng.randrange(256) for _ in range(size))
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_span_writer_matches_concatenation(tmp_path, seed):
+    rng = random.Random(seed)
+    data = random_data(rng)
+    edits = random_edits(rng, data, rng.randint(0, 40))
+    output, writer = write_spans(tmp_path, data, edits)
+    assert output == apply(data, edits)
+    assert writer.replaced == sum(len(replacement) for _, _, replacement in edits)
+    assert writer.copied + writer.replaced == len(output)
+
+
+@pytest.mark.parametrize('edits', [
+    [],
+    [(0, 0, b'')],
+    [(0, 10, b'')],
+    [(10, 10, b'abc')],
+    [(0, 5, b'a'), (5, 5, b'b'), (5, 8, b''), (8, 10, b'c')],
+    [(20, 30, b'x'), (30, 40, b'y'), (40, 40, b'')],
+])
+def test_span_writer_edge_edits(tmp_path, edits):
+    data = bytes(range(40))
+    assert write_spans(tmp_path, data, edits)[0] == apply(data, edits)
+
+
+def short_writev(fd, parts):
+    """os.writev, который записывает не больше 7 байт за вызов"""
+    return os.write(fd, b''.join(bytes(part) for part in parts)[:7])
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_more_parts_than_iov_max_with_short_writes(tmp_path, monkeypatch, seed):
+    monkeypatch.setattr(spans, '_IOV_MAX', 4)
+    monkeypatch.setattr(os, 'writev', short_writev)
+    rng = random.Random(seed)
+    data = random_data(rng, 500)
+    edits = random_edits(rng, data, 60)
+    assert write_spans(tmp_path, data, edits)[0] == apply(data, edits)
+
+
+def test_pending_bytes_flush(tmp_path, monkeypatch):
+    calls = []
+    writev = os.writev
+
+    def counting_writev(fd, parts):
+        calls.append(len(parts))
+        return writev(fd, parts)
+
+    monkeypatch.setattr(spans, '_PENDING_BYTES', 100)
+    monkeypatch.setattr(os, 'writev', counting_writev)
+    data = bytes(1000)
+    edits = [(start, start + 1, b'z' * 30) for start in range(0, 1000, 50)]
+    assert write_spans(tmp_path, data, edits)[0] == apply(data, edits)
+    # Замены копятся не больше чем до _PENDING_BYTES
+    assert len(calls) > 1 and max(calls) <= 8
+
+
+def test_without_writev(tmp_path, monkeypatch):
+    monkeypatch.delattr(os, 'writev', raising=False)
+    rng = random.Random(0)
+    data = random_data(rng)
+    edits = random_edits(rng, data, 30)
+    assert write_spans(tmp_path, data, edits)[0] == apply(data, edits)
+
+
+def test_discard_writes_nothing(tmp_path):
+    path = tmp_path / 'output'
+    with open(path, 'wb') as file:
+        writer = SpanWriter(file, b'data')
+        writer.edit(0, 1, b'D')
+        writer.discard()
+    assert path.read_bytes() == b''
+
+
+def random_text(rng, count):
+    return '\n'.join(rng.choice(LINES) for _ in range(count)) + rng.choice(('', '\n'))
+
+
+def mutate(rng, text):
+    lines = text.split('\n')
+    for _ in range(rng.randint(0, 6)):
+        position = rng.randrange(len(lines) + 1)
+        action = rng.randrange(3)
+        if action == 0:
+            lines.insert(position, rng.choice(LINES))
+        elif lines and position < len(lines):
+            if action == 1:
+                del lines[position]
+            else:
+                lines[position] = rng.choice(LINES) + '!'
+    return '\n'.join(lines)
+
+
+def check_narrow(data, begin, end, text):
+    edits = list(narrow(data, begin, end, text))
+    for (_, previous_end, _), (start, _, _) in zip(edits, edits[1:]):
+        assert previous_end <= start
+    assert all(begin <= start <= stop <= end for start, stop, _ in edits)
+    assert apply(data, edits) == data[:begin] + text.encode('utf-8') + data[end:]
+    return edits
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_narrow_edits_give_text(seed):
+    rng = random.Random(seed)
+    before, old, after = random_text(rng, 5) + '\n', random_text(rng, rng.randint(0, 40)), '\n' + random_text(rng, 5)
+    new = mutate(rng, old)
+    data = (before + old + after).encode('utf-8')
+    begin = len(before.encode('utf-8'))
+    check_narrow(data, begin, begin + len(old.encode('utf-8')), new)
+
+
+@pytest.mark.parametrize('seed', range(30))
+def test_narrow_far_apart_changes(monkeypatch, seed):
+    # Маленькие части: отличия дальше _CHUNK друг от друга - отдельные правки
+    monkeypatch.setattr(spans, '_CHUNK', 64)
+    monkeypatch.setattr(spans, '_MIN_CHUNK', 16)
+    rng = random.Random(seed)
+    old = random_text(rng, 200)
+    new = mutate(rng, old)
+    data = old.encode('utf-8')
+    check_narrow(data, 0, len(data), new)
+
+
+def test_narrow_unchanged_region_has_no_edits():
+    data = 'graph TD\n    A --> B\n'.encode('utf-8')
+    assert list(narrow(data, 0, len(data), data.decode('utf-8'))) == []
+
+
+def test_narrow_touches_only_changed_lines(monkeypatch):
+    monkeypatch.setattr(spans, '_CHUNK', 64)
+    monkeypatch.setattr(spans, '_MIN_CHUNK', 16)
+    lines = [f'    A{number} --> B{number}' for number in range(100)]
+    data = '\n'.join(lines).encode('utf-8')
+    lines[10] = '    A10 --> C'
+    lines[90] = '    A90 --> C'
+    edits = check_narrow(data, 0, len(data), '\n'.join(lines))
+    assert [replacement for _, _, replacement in edits] == [b'    A10 --> C\n', b'    A90 --> C\n']
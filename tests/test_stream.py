@@ -0,0 +1,95 @@
+"""
+Тесты потокового исправления (advanced.fix_mermaid_stream, api.fix_stream)
+"""
+
+import glob
+import io
+import os
+import sys
+import tracemalloc
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from corpus import make_document
+from mermaid_fixer import advanced, api
+from mermaid_fixer.passes import FACTS, Prescan
+
+# readme.md исправлять нечего, кроме экранирования (потоковый путь), в
+# резервных копиях есть части диаграмм вне блоков (сборка всего текста)
+FIXTURES = sorted(glob.glob(os.path.join(ROOT, 'readme.md*')))
+
+TEXTS = [
+    '',
+    'Текст без диаграмм',
+    '```mermaid\ngraph TD\n    A["a<b"] --> B\n```\n',
+    'graph TD\n    A --> B\n\nТекст\n',
+    '```mermaid\ngraph TD\n    A --> B\n```\n\nТекст.\n\nB --> C[Дальше]\n',
+    '```mermaid\ngraph TD\n    A --> B\n',
+    'строка\rс возвратом каретки\r\nи еще\n',
+]
+
+
+@pytest.mark.parametrize('text', TEXTS)
+@pytest.mark.parametrize('strategy', ['basic', 'advanced', 'complete'])
+def test_stream_matches_text(text, strategy):
+    fixed = api.fix_stream(iter(text.split('\n')), strategy)
+    assert '\n'.join(fixed) == api.fix(text, strategy).text
+
+
+def read_fixture(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+def multi_pass(content):
+    """Прежнее исправление: три шага по очереди над всем текстом"""
+    fixed = advanced.fix_mermaid_diagrams(content)
+    fixed = advanced.clean_broken_diagrams(fixed)
+    return advanced.escape_mermaid_content(fixed)
+
+
+@pytest.mark.parametrize('path', FIXTURES, ids=os.path.basename)
+def test_stream_matches_multi_pass_on_fixtures(path):
+    content = read_fixture(path)
+    expected = multi_pass(content)
+    assert '\n'.join(advanced.fix_mermaid_stream(iter(content.split('\n')))) == expected
+    fixed = io.StringIO()
+    advanced.fix_mermaid_file(io.StringIO(content, newline=''), fixed)
+    assert fixed.getvalue() == expected
+
+
+def test_fixtures_cover_both_stream_paths():
+    facts = [Prescan(read_fixture(path)).facts for path in FIXTURES]
+    assert any('orphan' in fact for fact in facts)
+    assert any('orphan' not in fact for fact in facts)
+
+
+@pytest.mark.parametrize('text', TEXTS + [make_document(200000, diagrams=20, broken=0.5, seed=1)])
+def test_prescan_of_lines_matches_text(text):
+    facts = Prescan(text).facts
+    line_facts = Prescan(iter(text.split('\n'))).facts
+    assert facts - {'label'} == line_facts - {'label'}
+    assert 'label' not in facts or 'label' in line_facts
+
+
+def test_stream_without_fragments_uses_bounded_memory():
+    """Без частей диаграмм вне блоков строки не собираются в текст"""
+    content = make_document(8 * 1024 * 1024, diagrams=200, broken=0.0, seed=1)
+    assert 'orphan' not in Prescan(content).facts
+    source = io.StringIO(content)
+    written = io.StringIO()
+    tracemalloc.start()
+    try:
+        for line in advanced.fix_mermaid_stream(advanced.iter_text_lines(source)):
+            written.write(line)
+            written.write('\n')
+            written.truncate(0)
+            written.seek(0)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # Копия потока в памяти и текущая диаграмма
+    assert peak < 2 * advanced._SPOOL_BYTES < len(content) / 2